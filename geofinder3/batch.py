@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Batch geocoding engine and command line tool on top of GeoFinder.
+Streams CSV / GeoPackage rows, geocodes them with bounded concurrency and rate
+limiting, checkpoints progress to resume interrupted runs and writes a point
+layer (GeoPackage or CSV). Runs headless (without QGIS)
+
+Usage:
+    python -m geofinder3.batch input.csv output.gpkg --column address --epsg 25831
+    python -m geofinder3.batch input.gpkg output.csv --template "{street} {number}, {town}"
+*******************************************************************************
+"""
+
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from importlib import reload
+from osgeo import ogr, osr
+
+from . import geofinder
+reload(geofinder)
+from .geofinder import GeoFinder
+from . import cache
+reload(cache)
+from .cache import ResponseCache
+from . import gazetteer
+reload(gazetteer)
+from .gazetteer import Gazetteer
+
+
+class RateLimiter(object):
+    """ Limits the number of operations per second shared between threads
+        (used by geocoder clients before each request to servers) """
+
+    def __init__(self, max_per_second=None):
+        self.interval = (1.0 / max_per_second) if max_per_second else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """ Waits until next operation is allowed """
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_seconds = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+
+class BatchGeoFinder(object):
+    """ Batch geocoding of table rows with GeoFinder.find_data """
+
+    # Result fields added to output layer
+    result_fields_list = ["geo_status", "geo_name", "geo_type", "geo_municipality", "geo_county", "geo_count"]
+
+    def __init__(self, geofinder=None, max_workers=4, max_requests_per_second=10, logger=None, session=None, cache=None, gazetteer=None):
+        """ geofinder: optional GeoFinder instance (else a new one is created with session, cache and gazetteer)
+            max_workers: max concurrent queries
+            max_requests_per_second: rate limit of requests to servers, cached responses are not limited (None for unlimited) """
+        if logger:
+            self.log = logger
+        else:
+            # Default is dummy logger
+            self.log = logging.getLogger('dummy')
+            self.log.addHandler(logging.NullHandler())
+        # Les consultes de text o de coordenades poden fer diverses peticions, limitem cada petició
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+        self.geofinder = geofinder if geofinder else GeoFinder(self.log, session, cache, gazetteer)
+        self.geofinder.set_rate_limiter(self.rate_limiter)
+        self.max_workers = max_workers
+
+    ###########################################################################
+    # Input
+
+    def iter_rows(self, input_pathname, layer_name=None):
+        """ Returns a generator of (row_id, fields_dict) from a CSV or vector (GeoPackage, ...) file """
+        if os.path.splitext(input_pathname)[1].lower() in (".csv", ".txt"):
+            with open(input_pathname, "r", encoding="utf-8-sig", newline="") as csv_file:
+                # Detectem el separador (, ;)
+                dialect = csv.Sniffer().sniff(csv_file.read(4096), delimiters=",;\t")
+                csv_file.seek(0)
+                for row_id, row_dict in enumerate(csv.DictReader(csv_file, dialect=dialect)):
+                    yield row_id, row_dict
+        else:
+            dataset = ogr.Open(input_pathname)
+            if not dataset:
+                raise Exception("Can't open input file: %s" % input_pathname)
+            layer = dataset.GetLayerByName(layer_name) if layer_name else dataset.GetLayer(0)
+            for row_id, feature in enumerate(layer):
+                yield row_id, {key: ("" if value is None else str(value)) for key, value in feature.items().items()}
+
+    def get_row_text(self, row_dict, column=None, template=None):
+        """ Returns text to geocode of a row, from a column or a template "{field1} {field2}..." """
+        if template:
+            return template.format(**row_dict).strip()
+        return (row_dict.get(column) or "").strip()
+
+    ###########################################################################
+    # Checkpoint
+
+    def get_checkpoint_pathname(self, output_pathname):
+        """ Returns checkpoint file pathname associated to an output file """
+        return output_pathname + ".checkpoint.jsonl"
+
+    def read_checkpoint(self, checkpoint_pathname):
+        """ Returns dict {row_id: result_dict} with already processed rows (rows with errors are excluded) """
+        results_dict = {}
+        if not os.path.exists(checkpoint_pathname):
+            return results_dict
+        with open(checkpoint_pathname, "r", encoding="utf-8") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    entry_dict = json.loads(line)
+                except ValueError:
+                    # Última línia a mitges (procés interromput), la tornarem a processar
+                    continue
+                # Les files amb error (xarxa, timeout...) es tornen a processar
+                if entry_dict["result"].get("geo_status") != "error":
+                    results_dict[entry_dict["row"]] = entry_dict["result"]
+        return results_dict
+
+    ###########################################################################
+    # Geocoding
+
+    def geocode_text(self, text, epsg):
+        """ Geocodes a text and returns a result dict with status, best candidate and coordinates on epsg """
+        if not text:
+            return {"geo_status": "empty"}
+        try:
+            dict_list = self.geofinder.find_data(text, epsg)
+        except Exception as e:
+            return {"geo_status": "error", "geo_name": str(e)}
+        # Descartem entrades sense coordenades
+        dict_list = [data_dict for data_dict in dict_list if data_dict.get("x") is not None and data_dict.get("y") is not None]
+        if not dict_list:
+            return {"geo_status": "not_found", "geo_count": 0}
+        data_dict = dict_list[0]
+        x, y = data_dict["x"], data_dict["y"]
+        if data_dict.get("epsg") and str(data_dict["epsg"]) != str(epsg):
+            x, y = self.geofinder.transform_point(x, y, int(data_dict["epsg"]), int(epsg))
+        return {
+            "geo_status": "ok",
+            "geo_name": data_dict.get("nom", ""),
+            "geo_type": data_dict.get("nomTipus", ""),
+            "geo_municipality": data_dict.get("nomMunicipi", ""),
+            "geo_county": data_dict.get("nomComarca", ""),
+            "geo_count": len(dict_list),
+            "x": x,
+            "y": y,
+            }
+
+    def run(self, input_pathname, output_pathname, column=None, template=None, epsg=25831, \
+        layer_name=None, resume=True, progress_callback=None):
+        """ Geocodes all input rows and writes output point layer.
+            Processed rows are stored on a checkpoint file, if resume is True an interrupted run
+            continues from the checkpoint. progress_callback(processed_count, total_processed_count)
+            Returns dict with counts by status """
+        if not column and not template:
+            raise Exception("A column or a template is required")
+        checkpoint_pathname = self.get_checkpoint_pathname(output_pathname)
+        results_dict = self.read_checkpoint(checkpoint_pathname) if resume else {}
+        self.log.info("Batch geocoding: %s -> %s (resumed rows: %s)", input_pathname, output_pathname, len(results_dict))
+
+        # Geocodifiquem les files pendents amb un nombre limitat de peticions en curs
+        # (la lectura de l'entrada és en streaming)
+        processed_count = 0
+        with open(checkpoint_pathname, "a" if resume else "w", encoding="utf-8") as checkpoint_file, \
+            ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch_geofinder") as executor:
+            pending_dict = {}
+            def process_done(futures_set):
+                nonlocal processed_count
+                for future in futures_set:
+                    row_id = pending_dict.pop(future)
+                    results_dict[row_id] = future.result()
+                    checkpoint_file.write(json.dumps({"row": row_id, "result": results_dict[row_id]}) + "\n")
+                    processed_count += 1
+                checkpoint_file.flush()
+                if progress_callback:
+                    progress_callback(processed_count, len(results_dict))
+
+            for row_id, row_dict in self.iter_rows(input_pathname, layer_name):
+                if row_id in results_dict:
+                    continue
+                text = self.get_row_text(row_dict, column, template)
+                pending_dict[executor.submit(self.geocode_text, text, epsg)] = row_id
+                if len(pending_dict) >= self.max_workers * 4:
+                    done_set, _pending_set = wait(list(pending_dict.keys()), return_when=FIRST_COMPLETED)
+                    process_done(done_set)
+            done_set, _pending_set = wait(list(pending_dict.keys()))
+            process_done(done_set)
+
+        # Escrivim la capa de sortida (tornant a llegir l'entrada en streaming)
+        status_count_dict = self.write_output(input_pathname, output_pathname, results_dict, epsg, layer_name)
+        self.log.info("Batch geocoding finished: %s processed: %s %s", output_pathname, processed_count, status_count_dict)
+        return status_count_dict
+
+    ###########################################################################
+    # Output
+
+    def write_output(self, input_pathname, output_pathname, results_dict, epsg, layer_name=None):
+        """ Writes output point layer (CSV with x, y columns or vector file) with input fields and
+            geocoding results. Returns dict with counts by status """
+        status_count_dict = {}
+        rows_iterator = self.iter_rows(input_pathname, layer_name)
+        is_csv = os.path.splitext(output_pathname)[1].lower() == ".csv"
+        if is_csv:
+            csv_file = open(output_pathname, "w", encoding="utf-8", newline="")
+            writer = None
+        else:
+            driver = ogr.GetDriverByName("GPKG" if output_pathname.lower().endswith(".gpkg") else "ESRI Shapefile")
+            if os.path.exists(output_pathname):
+                driver.DeleteDataSource(output_pathname)
+            dataset = driver.CreateDataSource(output_pathname)
+            spatial_reference = osr.SpatialReference()
+            spatial_reference.ImportFromEPSG(int(epsg))
+            layer = dataset.CreateLayer(os.path.splitext(os.path.basename(output_pathname))[0], spatial_reference, ogr.wkbPoint)
+            fields_list = None
+        try:
+            for row_id, row_dict in rows_iterator:
+                result_dict = results_dict.get(row_id, {"geo_status": "pending"})
+                status_count_dict[result_dict["geo_status"]] = status_count_dict.get(result_dict["geo_status"], 0) + 1
+                values_dict = dict(row_dict)
+                values_dict.update({field: result_dict.get(field, "") for field in self.result_fields_list})
+                if is_csv:
+                    values_dict.update({"x": result_dict.get("x", ""), "y": result_dict.get("y", "")})
+                    if not writer:
+                        writer = csv.DictWriter(csv_file, fieldnames=list(values_dict.keys()))
+                        writer.writeheader()
+                    writer.writerow(values_dict)
+                else:
+                    if fields_list is None:
+                        fields_list = list(values_dict.keys())
+                        for field in fields_list:
+                            layer.CreateField(ogr.FieldDefn(field, ogr.OFTInteger if field == "geo_count" else ogr.OFTString))
+                        layer.StartTransaction()
+                    feature = ogr.Feature(layer.GetLayerDefn())
+                    for field in fields_list:
+                        value = values_dict.get(field, "")
+                        if value != "" and value is not None:
+                            feature.SetField(field, value)
+                    if result_dict.get("x") is not None and result_dict.get("y") is not None:
+                        point = ogr.Geometry(ogr.wkbPoint)
+                        point.AddPoint_2D(float(result_dict["x"]), float(result_dict["y"]))
+                        feature.SetGeometry(point)
+                    layer.CreateFeature(feature)
+            if not is_csv and fields_list is not None:
+                layer.CommitTransaction()
+        finally:
+            if is_csv:
+                csv_file.close()
+            else:
+                dataset = None
+        return status_count_dict
+
+
+def main(args_list=None):
+    """ Command line tool """
+    import argparse
+    parser = argparse.ArgumentParser(description="Batch geocoding with ICGC GeoFinder")
+    parser.add_argument("input", help="Input CSV or vector file (GeoPackage, Shapefile, ...)")
+    parser.add_argument("output", help="Output point layer (.gpkg, .shp or .csv)")
+    parser.add_argument("--column", help="Column with text to geocode")
+    parser.add_argument("--template", help="Text template to geocode with input fields: \"{street} {number}, {town}\"")
+    parser.add_argument("--layer", help="Input layer name (vector files)")
+    parser.add_argument("--epsg", type=int, default=25831, help="Output and default input coordinates EPSG (default 25831)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent queries (default 4)")
+    parser.add_argument("--rate", type=float, default=10, help="Max requests per second (default 10, 0 unlimited)")
+    parser.add_argument("--restart", action="store_true", help="Ignore previous checkpoint")
+    parser.add_argument("--cache", help="SQLite file to cache geocoder responses between runs")
+    parser.add_argument("--gazetteer", help="Offline gazetteer file to find place names without network access")
+    args = parser.parse_args(args_list)
+    if not args.column and not args.template:
+        parser.error("--column or --template is required")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    log = logging.getLogger("batch_geofinder")
+    response_cache = ResponseCache(max_entries=10000, db_pathname=args.cache) if args.cache else None
+    local_gazetteer = Gazetteer(args.gazetteer, logger=log) if args.gazetteer else None
+    batch = BatchGeoFinder(max_workers=args.workers, max_requests_per_second=args.rate or None, logger=log,
+        cache=response_cache, gazetteer=local_gazetteer)
+    last_log_time = [0]
+    def log_progress(processed_count, total_count):
+        if time.monotonic() - last_log_time[0] > 5:
+            last_log_time[0] = time.monotonic()
+            log.info("Processed rows: %s (total with checkpoint: %s)", processed_count, total_count)
+    status_count_dict = batch.run(args.input, args.output, args.column, args.template, args.epsg, \
+        args.layer, not args.restart, log_progress)
+    print(json.dumps(status_count_dict))
+
+
+if __name__ == "__main__":
+    main()
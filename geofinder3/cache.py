@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import time
+import sqlite3
+import threading
+import collections
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+class ResponseCache:
+    """ Bounded LRU + TTL cache of geocoder responses keyed by normalised request URL,
+        with an optional SQLite persistence tier shared between sessions """
+
+    def __init__(self, max_entries=1000, ttl_seconds=24*3600, db_pathname=None):
+        """ max_entries: max responses in memory (least recently used are discarded)
+            ttl_seconds: responses time to live
+            db_pathname: optional SQLite file to persist responses """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries_dict = collections.OrderedDict() # key: (timestamp, response_text)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if db_pathname:
+            self.open_db(db_pathname)
+
+    def open_db(self, db_pathname):
+        """ Opens (or creates) SQLite persistence file and removes expired responses """
+        # La connexió es comparteix entre fils (protegida amb el lock)
+        self.db = sqlite3.connect(db_pathname, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, timestamp REAL, response TEXT)")
+            self.db.execute("DELETE FROM responses WHERE timestamp < ?", (time.time() - self.ttl_seconds,))
+
+    def close(self):
+        """ Closes SQLite persistence file """
+        with self.lock:
+            if self.db:
+                self.db.close()
+                self.db = None
+
+    @staticmethod
+    def get_key(url):
+        """ Returns normalised URL (lowercase scheme and host, sorted query params) """
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+    def get(self, url):
+        """ Returns cached response text of URL or None """
+        key = self.get_key(url)
+        now = time.time()
+        with self.lock:
+            entry = self.entries_dict.get(key)
+            if entry and now - entry[0] < self.ttl_seconds:
+                self.entries_dict.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self.entries_dict[key]
+            if self.db:
+                row = self.db.execute("SELECT timestamp, response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and now - row[0] < self.ttl_seconds:
+                    self.__set_memory(key, row[0], row[1])
+                    self.hits += 1
+                    return row[1]
+            self.misses += 1
+        return None
+
+    def set(self, url, response_text):
+        """ Stores response text of URL """
+        key = self.get_key(url)
+        now = time.time()
+        with self.lock:
+            self.__set_memory(key, now, response_text)
+            if self.db:
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO responses (key, timestamp, response) VALUES (?, ?, ?)", (key, now, response_text))
+
+    def __set_memory(self, key, timestamp, response_text):
+        """ Stores an entry on memory tier discarding least recently used entries (lock required) """
+        self.entries_dict[key] = (timestamp, response_text)
+        self.entries_dict.move_to_end(key)
+        while len(self.entries_dict) > self.max_entries:
+            self.entries_dict.popitem(last=False)
+
+    def clear(self):
+        """ Removes all cached responses """
+        with self.lock:
+            self.entries_dict.clear()
+            if self.db:
+                with self.db:
+                    self.db.execute("DELETE FROM responses")
@@ -8,10 +8,16 @@ class CatastroClient:
     """ Catastro client for rest services class
         Doc: https://www.catastro.hacienda.gob.es/ws/Webservices_Libres.pdf
         """
-    def __init__(self, url="http://ovc.catastro.meh.es/OVCServWeb/OVCWcfCallejero/", timeout=5):
-        """ Configure server connection and calls """
+    def __init__(self, url="http://ovc.catastro.meh.es/OVCServWeb/OVCWcfCallejero/", timeout=5, session=None, cache=None, rate_limiter=None):
+        """ Configure server connection and calls.
+            session: optional shared requests.Session (connection pools, keep-alive and retries)
+            cache: optional ResponseCache (repeated queries are not sent to server)
+            rate_limiter: optional object with a wait() method called before each request to server """
         self.url = url + ("" if url.endswith("/") else "/")
         self.timeout = timeout # Segons
+        self.session = session if session else requests
+        self.cache = cache
+        self.rate_limiter = rate_limiter
         self.last_request = None
 
     def Consulta_CPMRC(self, ref_cad, **extra_params_dict):
@@ -45,15 +51,28 @@ class CatastroClient:
         # Fem la petició al servidor amb tots els paràmetres indicats
         # Atenció en alguns equips dóna error de certificat al fer la consulta!!
         # ... se li pot especificar que no validi el certificat del servidor amb verify=False
-        self.last_request = self.url + call_name + "?" + \
+        # La URL és local a la crida (es poden fer crides en paral·lel amb el mateix client),
+        # last_request només es guarda per informar al log
+        request_url = self.url + call_name + "?" + \
             "&".join([f"{key}={quote_plus(value) if value_encode else value}" \
             for key, value in params_dict.items() if value is not None])
+        self.last_request = request_url
+        # Si tenim la resposta a la cache local no fem la petició
+        response_data = self.cache.get(request_url) if self.cache else None
+        if response_data is not None:
+            return json.loads(response_data)
+        if self.rate_limiter:
+            self.rate_limiter.wait()
         try:
-            response_data = requests.get(self.last_request, verify=True, timeout=self.timeout).text
+            response = self.session.get(request_url, verify=True, timeout=self.timeout)
+            response_data = response.text
             response_json = json.loads(response_data)
         except Exception as e:
             response_json = None
             raise e
+        # Només guardem a la cache les respostes correctes
+        if self.cache and response.ok:
+            self.cache.set(request_url, response_data)
         return response_json
 
     def last_sent(self):
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Offline gazetteer: local SQLite index of toponyms (municipalities, counties...)
+built from ICGC open data, that answers place names searches with the same
+schema of GeoFinder.get_icgc_generalized_response without network access
+
+Usage:
+    python -m geofinder3.gazetteer gazetteer.sqlite
+    python -m geofinder3.gazetteer gazetteer.sqlite --source places.gpkg NAME 11 Indret
+*******************************************************************************
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+import unicodedata
+
+
+GAZETTEER_URLBASE = "/vsicurl/https://datacloud.icgc.cat/datacloud/divisions-administratives/vigent/fgb_unzip_EPSG25831"
+# ICGC open data sources of the default gazetteer:
+# [(OGR source, name field, type id, type name, municipality field, county field), ...]
+# (type ids are the ICGC geocoder ones, see GeoFinderDialog.TOPOICONS_DICT)
+GAZETTEER_SOURCES_LIST = [
+    (GAZETTEER_URLBASE + "/divisions-administratives-caps-municipi.fgb", "NOMCAP", 1, "Cap de municipi", "CODIMUNI", "CODICOMAR"),
+    (GAZETTEER_URLBASE + "/divisions-administratives-municipis-5000.fgb", "NOMMUNI", 2, "Municipi", "CODIMUNI", "CODICOMAR"),
+    (GAZETTEER_URLBASE + "/divisions-administratives-comarques-5000.fgb", "NOMCOMAR", 17, "Comarca", None, "NOMCOMAR"),
+    ]
+# ICGC open data sources of names of the code fields (ICGC delimitations have municipality and county codes)
+# [(OGR source, code field, name field), ...]
+GAZETTEER_CODES_LIST = [
+    (GAZETTEER_URLBASE + "/divisions-administratives-municipis-5000.fgb", "CODIMUNI", "NOMMUNI"),
+    (GAZETTEER_URLBASE + "/divisions-administratives-comarques-5000.fgb", "CODICOMAR", "NOMCOMAR"),
+    ]
+
+
+class Gazetteer(object):
+    """ Local toponyms index on a SQLite file. Names are searched by a normalised key
+        (lowercase, without accents) and by word prefixes with a FTS5 full text index
+        (if SQLite has not FTS5 support, prefixes are searched on the key index) """
+
+    epsg = 4326
+
+    def __init__(self, db_pathname, logger=None):
+        """ db_pathname: SQLite file (it is created if it not exists) """
+        # Initializer class logger
+        if logger:
+            self.log = logger
+        else:
+            # Default is dummy logger
+            self.log = logging.getLogger('dummy')
+            self.log.addHandler(logging.NullHandler())
+
+        # La connexió es comparteix entre fils (protegida amb el lock)
+        self.db_pathname = db_pathname
+        self.db = sqlite3.connect(db_pathname, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.fts = False
+        with self.lock, self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS toponyms (id INTEGER PRIMARY KEY, key TEXT, name TEXT,
+                type_id INTEGER, type_name TEXT, municipality TEXT, county TEXT, x REAL, y REAL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS toponyms_key ON toponyms (key)")
+            try:
+                self.db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS toponyms_fts USING fts5 (key,
+                    content='toponyms', content_rowid='id', tokenize='unicode61')""")
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                self.log.warning("Gazetteer without full text index (%s): %s", e, db_pathname)
+
+    def close(self):
+        """ Closes SQLite file """
+        with self.lock:
+            if self.db:
+                self.db.close()
+                self.db = None
+
+    @staticmethod
+    def get_key(text):
+        """ Returns normalised name (lowercase, without accents and repeated spaces) """
+        text = unicodedata.normalize("NFKD", text.replace("’", "'").lower())
+        return " ".join("".join([char for char in text if not unicodedata.combining(char)]).split())
+
+    def count(self):
+        """ Returns number of toponyms """
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM toponyms").fetchone()[0]
+
+    def clear(self):
+        """ Removes all toponyms """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM toponyms")
+            if self.fts:
+                self.db.execute("INSERT INTO toponyms_fts (toponyms_fts) VALUES ('rebuild')")
+
+    def add(self, dict_list):
+        """ Adds toponyms with GeoFinder generalized schema (nom, idTipus, nomTipus, nomMunicipi,
+            nomComarca, x, y) and coordinates in EPSG:4326. Returns number of added toponyms """
+        rows_list = [(self.get_key(data_dict['nom']), data_dict['nom'], data_dict.get('idTipus'),
+            data_dict.get('nomTipus'), data_dict.get('nomMunicipi'), data_dict.get('nomComarca'),
+            data_dict['x'], data_dict['y']) for data_dict in dict_list]
+        with self.lock, self.db:
+            for row in rows_list:
+                cursor = self.db.execute("""INSERT INTO toponyms (key, name, type_id, type_name, municipality, county, x, y)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", row)
+                if self.fts:
+                    self.db.execute("INSERT INTO toponyms_fts (rowid, key) VALUES (?, ?)", (cursor.lastrowid, row[0]))
+        return len(rows_list)
+
+    def add_ogr_layer(self, source, name_field, type_id, type_name, municipality_field=None, county_field=None, codes_dict={}):
+        """ Adds the toponyms of an OGR source (points or a point on surface of polygons).
+            codes_dict translates code fields values to names: {field: {code: name}}
+            Returns number of added toponyms """
+        from osgeo import ogr, osr
+
+        dataset = ogr.Open(source)
+        if not dataset:
+            raise Exception("Can't open gazetteer source: %s" % source)
+        layer = dataset.GetLayer(0)
+        destination_crs = osr.SpatialReference()
+        destination_crs.ImportFromEPSG(self.epsg)
+        destination_crs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        source_crs = layer.GetSpatialRef()
+        if source_crs:
+            source_crs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transformation = osr.CoordinateTransformation(source_crs, destination_crs) if source_crs else None
+
+        dict_list = []
+        for feature in layer:
+            geometry = feature.GetGeometryRef()
+            name = feature.GetField(name_field)
+            if not geometry or not name:
+                continue
+            point = geometry.PointOnSurface() if geometry.GetDimension() > 0 else geometry.Clone()
+            if transformation:
+                point.Transform(transformation)
+            dict_list.append({
+                'nom': name,
+                'idTipus': type_id,
+                'nomTipus': type_name,
+                'nomMunicipi': self.get_field_name(feature, municipality_field, codes_dict),
+                'nomComarca': self.get_field_name(feature, county_field, codes_dict),
+                'x': point.GetX(),
+                'y': point.GetY(),
+                })
+        self.log.info("Gazetteer source %s: %s toponyms", source, len(dict_list))
+        return self.add(dict_list)
+
+    @staticmethod
+    def get_field_name(feature, field, codes_dict={}):
+        """ Returns feature field value translated with codes_dict ({field: {code: name}}) if it is a code """
+        if not field:
+            return None
+        value = feature.GetField(field)
+        return codes_dict.get(field, {}).get(value, value)
+
+    @staticmethod
+    def get_ogr_codes_dict(source, code_field, name_field):
+        """ Returns dict {code: name} of an OGR source """
+        from osgeo import ogr
+
+        dataset = ogr.Open(source)
+        if not dataset:
+            raise Exception("Can't open gazetteer source: %s" % source)
+        return {feature.GetField(code_field): feature.GetField(name_field) for feature in dataset.GetLayer(0)}
+
+    def get_generalized_response(self, rows_list):
+        """ Returns rows with GeoFinder generalized schema """
+        return [{
+            'nom': name,
+            'idTipus': type_id,
+            'nomTipus': type_name,
+            'nomMunicipi': municipality,
+            'nomComarca': county,
+            'x': x,
+            'y': y,
+            'epsg': self.epsg
+            } for name, type_id, type_name, municipality, county, x, y in rows_list]
+
+    def find(self, text, limit=20):
+        """ Returns a list of dictionaries with the toponyms with the indicated name (without case and accents) """
+        key = self.get_key(text)
+        if not key:
+            return []
+        with self.lock:
+            rows_list = self.db.execute("""SELECT name, type_id, type_name, municipality, county, x, y
+                FROM toponyms WHERE key = ? ORDER BY type_id, name LIMIT ?""", (key, limit)).fetchall()
+        return self.get_generalized_response(rows_list)
+
+    def search(self, text, limit=10):
+        """ Returns a list of dictionaries with the toponyms whose words start with the indicated words """
+        key = self.get_key(text)
+        if not key:
+            return []
+        with self.lock:
+            if self.fts:
+                # Tots els mots han de coincidir, l'últim com a prefix (text a mig escriure)
+                query = " ".join('"%s"' % word.replace('"', '""') for word in key.split()) + "*"
+                rows_list = self.db.execute("""SELECT name, type_id, type_name, municipality, county, x, y
+                    FROM toponyms_fts JOIN toponyms ON toponyms.id = toponyms_fts.rowid
+                    WHERE toponyms_fts MATCH ? ORDER BY toponyms.key != ?, length(toponyms.key), type_id LIMIT ?""",
+                    (query, key, limit)).fetchall()
+            else:
+                rows_list = self.db.execute("""SELECT name, type_id, type_name, municipality, county, x, y
+                    FROM toponyms WHERE key >= ? AND key < ? ORDER BY length(key), type_id LIMIT ?""",
+                    (key, key + "\uffff", limit)).fetchall()
+        return self.get_generalized_response(rows_list)
+
+
+def build(db_pathname, sources_list=GAZETTEER_SOURCES_LIST, codes_list=GAZETTEER_CODES_LIST, logger=None):
+    """ Builds a gazetteer file from OGR sources:
+        [(OGR source, name field, type id, type name, municipality field, county field), ...]
+        translating code fields with OGR names sources: [(OGR source, code field, name field), ...] """
+    codes_dict = {code_field: Gazetteer.get_ogr_codes_dict(source, code_field, name_field) \
+        for source, code_field, name_field in codes_list}
+    gazetteer = Gazetteer(db_pathname + ".tmp", logger=logger)
+    gazetteer.clear()
+    for source_args in sources_list:
+        gazetteer.add_ogr_layer(*source_args, codes_dict=codes_dict)
+    with gazetteer.lock, gazetteer.db:
+        if gazetteer.fts:
+            gazetteer.db.execute("INSERT INTO toponyms_fts (toponyms_fts) VALUES ('optimize')")
+    count = gazetteer.count()
+    gazetteer.close()
+    # Substituïm l'arxiu sencer per no deixar arxius a mitges
+    os.replace(db_pathname + ".tmp", db_pathname)
+    return count
+
+
+def main(args_list=None):
+    """ Command line tool """
+    import argparse
+    parser = argparse.ArgumentParser(description="Builds an offline gazetteer file for GeoFinder from ICGC open data (or other OGR sources)")
+    parser.add_argument("output", help="Gazetteer SQLite file")
+    parser.add_argument("--source", nargs="+", action="append", metavar="ARG",
+        help="OGR source: source name_field type_id type_name [municipality_field [county_field]] (repeatable, default ICGC municipalities and counties)")
+    args = parser.parse_args(args_list)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sources_list = [(source_args[0], source_args[1], int(source_args[2]), source_args[3], *source_args[4:6]) \
+        for source_args in args.source] if args.source else GAZETTEER_SOURCES_LIST
+    codes_list = [] if args.source else GAZETTEER_CODES_LIST
+    count = build(args.output, sources_list, codes_list, logger=logging.getLogger())
+    logging.getLogger().info("Gazetteer built: %s (%s toponyms)", args.output, count)
+
+
+if __name__ == "__main__":
+    main()
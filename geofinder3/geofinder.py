@@ -5,8 +5,13 @@
 """
 
 import re
+import time
 import logging
 import math
+import functools
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from importlib import reload
 from osgeo import osr
 
@@ -21,34 +26,107 @@ reload(catastro)
 from .catastro import CatastroClient
 
 
+@functools.lru_cache(maxsize=32)
+def get_coordinate_transformation(source_epsg, destination_epsg, crs84_output):
+    """ Returns a cached coordinate transformation object (building a PROJ pipeline is expensive)
+        crs84_output: uses CRS84 (lon, lat) axis order for a geographic output """
+    # Definim els sistemes de coordenades a utilitzar
+    source_crs = osr.SpatialReference()
+    source_crs.ImportFromEPSG(int(source_epsg))
+    destination_crs = osr.SpatialReference()
+    destination_crs.ImportFromEPSG(int(destination_epsg))
+    # EN GDAL 3 al convertir una coordenada a 4326 gira x<->y per evitar-ho canviar WGS84 per CRS84!!
+    # La sintaxis "normal" de 4326 és lat, lon, primer la y i després la x
+    # per tant els paràmetres venen girats x=lat i y=lon. Per arreglar-ho convertim la sortida
+    # a CRS84 en format x=lon, y=lat
+    if crs84_output:
+        destination_crs.SetWellKnownGeogCS("CRS84")
+    return osr.CoordinateTransformation(source_crs, destination_crs)
+
+
 class GeoFinder(object):
     """ Plugin for accessing open data published by ICGC """
 
     ###########################################################################
     # Service management
     timeout = 5 # seconds
+    point_deadline = 6 # seconds, combined deadline of parallel point queries
+    cancel_check_interval = 0.1 # seconds, interval to check cancellation while waiting point queries
+    autocomplete_min_chars = 3
+    autocomplete_size = 10
+    autocomplete_max_entries = 500 # cached prefixes
+    # Cached transformation objects are not thread safe
+    transform_lock = threading.Lock()
     geoencoder_epsg = 4326
     cadastral_epsg = 25381
 
+    # Clients are created on first use, maybe from several query threads at the same time
+    clients_lock = threading.Lock()
+
     cadastral_coordinates_client = None
     def get_cadastral_coordinates_client(self):
         """ Gets API rest Catastro client """
-        if not self.cadastral_coordinates_client:
-            self.cadastral_coordinates_client = CatastroClient(timeout=self.timeout)
+        with self.clients_lock:
+            if not self.cadastral_coordinates_client:
+                self.cadastral_coordinates_client = CatastroClient(timeout=self.timeout, session=self.session, cache=self.cache, rate_limiter=self.rate_limiter)
         return self.cadastral_coordinates_client
 
     icgc_geoencoder_client = None
     def get_icgc_geoencoder_client(self):
         """ Gets API rest ICGC's GeoEncoder (Pelias) client """
-        if not self.icgc_geoencoder_client:
-            self.icgc_geoencoder_client = PeliasClient(
-                "https://eines.icgc.cat/geocodificador", self.timeout, \
-                default_search_call="cerca", default_reverse_call="invers", \
-                default_autocomplete_call="autocompletar")
+        with self.clients_lock:
+            if not self.icgc_geoencoder_client:
+                self.icgc_geoencoder_client = PeliasClient(
+                    "https://eines.icgc.cat/geocodificador", self.timeout, \
+                    default_search_call="cerca", default_reverse_call="invers", \
+                    default_autocomplete_call="autocompletar", session=self.session, cache=self.cache, \
+                    rate_limiter=self.rate_limiter)
         return self.icgc_geoencoder_client
 
+    def set_rate_limiter(self, rate_limiter):
+        """ Sets requests rate limiter of geofinder and its clients """
+        self.rate_limiter = rate_limiter
+        for client in (self.cadastral_coordinates_client, self.icgc_geoencoder_client):
+            if client:
+                client.rate_limiter = rate_limiter
+
+    executor = None
+    def get_executor(self):
+        """ Gets thread pool to run geoencoder queries in parallel """
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geofinder")
+        return self.executor
+
+    point_executor = None
+    def get_point_executor(self):
+        """ Gets thread pool to run point queries in parallel (on its own pool, point queries out of
+            deadline can not be stopped and they must not block text searches and autocomplete) """
+        if not self.point_executor:
+            self.point_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="geofinder_point")
+        return self.point_executor
+
+    def shutdown(self):
+        """ Releases thread pools without waiting for running queries (they end on background) """
+        for executor in (self.executor, self.point_executor):
+            if executor:
+                executor.shutdown(wait=False)
+        self.executor = None
+        self.point_executor = None
+
+
+    def __init__(self, logger=None, session=None, cache=None, gazetteer=None, rate_limiter=None):
+        # Shared HTTP session (optional, else every request opens a new connection)
+        self.session = session
+        # Geocoder responses cache (optional ResponseCache, else every query is sent to servers)
+        self.cache = cache
+        # Requests rate limiter (optional object with a wait() method called before each request to servers)
+        self.rate_limiter = rate_limiter
+        # Local toponyms index (optional Gazetteer, answers common place names without network access)
+        self.gazetteer = gazetteer
+        # Autocomplete results by prefix (LRU), answers repeated prefixes without parsing responses again
+        self.autocomplete_dict = collections.OrderedDict()
+        self.autocomplete_lock = threading.Lock()
 
-    def __init__(self, logger=None):
         # Initializer class logger
         if logger:
             self.log = logger
@@ -61,31 +139,39 @@ class GeoFinder(object):
     ###########################################################################
     # Search implementation
 
-    def find(self, user_text, default_epsg):
+    def find(self, user_text, default_epsg, partial_callback=None, cancel_event=None):
         """ Find the text indicated in the different web services available.
-            Show results in a dialog and center the map on the item selected by the user """
+            Show results in a dialog and center the map on the item selected by the user.
+            Optional partial_callback(dict_list) receives partial results as each service answers
+            and optional cancel_event (threading.Event) stops the wait of multiple services queries """
         # Find text and return a list of dictionaries with results
         self.log.info("Geoencoder find text: %s", user_text)
-        dict_list = self.find_data(user_text, default_epsg)
+        dict_list = self.find_data(user_text, default_epsg, partial_callback, cancel_event)
         self.log.debug("Geoencoder found %d: %s %s", len(dict_list), ", ".join([data_dict['nom'] for data_dict in dict_list[:10]]), "..." if len(dict_list) > 10 else "")
         return dict_list
 
-    def find_data(self, text, default_epsg):
-        """ Returns a list of dictionaries with the sites found from the indicated text """
+    def find_data(self, text, default_epsg, partial_callback=None, cancel_event=None):
+        """ Returns a list of dictionaries with the sites found from the indicated text
+            (optional partial_callback(dict_list) receives partial results of multiple services queries
+            and optional cancel_event (threading.Event) stops their wait) """
+
+        # We detect the query type in a single pass
+        query_type, values = self.classify(text)
 
         # Let's see if we pass a ground rectangle
-        west, north, east, south, epsg = self.get_rectangle_coordinate(text)
-        if west and north and east and south:
+        if query_type == "rectangle":
+            west, north, east, south, epsg = values
             return self.find_rectangle_coordinates(west, north, east, south, epsg if epsg else default_epsg)
 
         # We detect if we pass a ground coordinate
-        x, y, epsg = self.get_point_coordinate(text)
-        if x and y:
-            return self.find_point_coordinate(x, y, epsg if epsg else default_epsg)
+        if query_type == "point":
+            x, y, epsg = values
+            return self.find_point_coordinate(x, y, epsg if epsg else default_epsg,
+                partial_callback=partial_callback, cancel_event=cancel_event)
 
         # Let's see if we pass a road
-        road, km = self.get_road(text)
-        if road and km:
+        if query_type == "road":
+            road, km = values
             return self.find_road(road, km)
 
         # # Let's see if we pass a crossroads
@@ -94,18 +180,66 @@ class GeoFinder(object):
         #     return self.find_crossing(municipality, type1, name1, type2, name2, find_all)
 
 	    # Let's see if we pass an address
-        municipality, adress_type, name, number = self.get_address(text)
-        if municipality and name and number:
+        if query_type == "address":
+            municipality, adress_type, name, number = values
             return self.find_address(municipality, adress_type, name, number)
 
 	    # We detect if we pass a cadastral reference
-        cadastral_ref = self.get_cadastral_ref(text)
-        if cadastral_ref:
+        if query_type == "cadastral_ref":
+            cadastral_ref, = values
             return self.find_cadastral_ref(cadastral_ref);
 
         # If you do not meet any of the above, we are looking for a place name
         return self.find_placename(text)
 
+    # Precompiled query types expressions
+    # [EPSG:<int>] <real> <real> <real> <real> [EPSG:<int>]
+    rectangle_regex = re.compile(r"^\s*(?:EPSG:(\d+)\s+)?([+-]?[0-9]*[.,]?[0-9]+)\s([+-]?[0-9]*[.,]?[0-9]+)\s([+-]?[0-9]*[.,]?[0-9]+)\s([+-]?[0-9]*[.,]?[0-9]+)\s*(?:\s+EPSG:(\d+))?\s*$", re.IGNORECASE)
+    # [EPSG:<int>] <real> <real> [EPSG:<int>]
+    point_regex = re.compile(r"^\s*(?:EPSG:(\d+)\s+)?([+-]?[0-9]*[.,]?[0-9]+)\s*([+-]?[0-9]*[.,]?[0-9]+)(?:\s+EPSG:(\d+))?\s*$", re.IGNORECASE)
+    # <road> [km|,] <int>
+    road_regex = re.compile(r'^\s*([A-Za-b]+)-*(\d+)\s*(?:(?:km)|,|\s)\s*(\d+)\s*$', re.IGNORECASE)
+    # [<municipality>, [street_type] <street> [nº] <number> | [street_type] <street> [nº] <number>, <municipality>]
+    address_regex = re.compile(r"^\s*(?:([\D\s]+)\s*,)?\s*([\w]+[./])?\s*([\D\s]+)\s+(?:nº)?\s*,*([\d-]+)\s*(?:[,.]\s*([\D\s]+[\D]))?\s*$", re.IGNORECASE)
+    cadastral_ref_regex = re.compile(r'(\w+)')
+    # Quick screening of the text before trying the query types expressions:
+    # all query types except place names need numbers (or "-" of address numbers range)...
+    query_number_regex = re.compile(r"[\d-]")
+    # ... and coordinates only have numbers, separators and up to 2 EPSG codes
+    query_coordinates_regex = re.compile(r"^[\s0-9.,+-]*(?:EPSG:\d+[\s0-9.,+-]*){0,2}$", re.IGNORECASE)
+    # Query types in detection order: (query type, detection function name, detected values validation)
+    query_types_list = [
+        ("rectangle", "get_rectangle_coordinate", lambda values: all(values[:4])),
+        ("point", "get_point_coordinate", lambda values: all(values[:2])),
+        ("road", "get_road", all),
+        ("address", "get_address", lambda values: values[0] and values[2] and values[3]),
+        ("cadastral_ref", "get_cadastral_ref", all),
+        ]
+
+    @classmethod
+    def classify(self, text):
+        """ Detects the query type of the text in one pass and returns parsed values
+            (same detection order and validations than the individual detection functions)
+            return query_type, values
+                rectangle: (west, north, east, south, epsg)
+                point: (x, y, epsg)
+                road: (road, km)
+                address: (municipality, type, street, number)
+                cadastral_ref: (cadastral_ref,)
+                placename: (text,) """
+        # Texts without numbers are place names (most of searches and all autocomplete prefixes)
+        if not self.query_number_regex.search(text):
+            return "placename", (text,)
+        # Only texts with coordinates characters need coordinates expressions
+        first_index = 0 if self.query_coordinates_regex.match(text) else 2
+        for query_type, function_name, validation in self.query_types_list[first_index:]:
+            values = getattr(self, function_name)(text)
+            if type(values) is not tuple:
+                values = (values,)
+            if validation(values):
+                return query_type, values
+        return "placename", (text,)
+
     @classmethod
     def get_rectangle_coordinate(self, text):
         """ Detects a coordinate rectangle from the text
@@ -116,9 +250,7 @@ class GeoFinder(object):
             Return west, north, east, south, epsg """
 
         # We detect 4 reals (and EPSG code) with a regular expression
-        # [EPSG:<int>] <real> <real> <real> <real> [EPSG:<int>]
-        expression = r"^\s*(?:EPSG:(\d+)\s+)?([+-]?[0-9]*[.,]?[0-9]+)\s([+-]?[0-9]*[.,]?[0-9]+)\s([+-]?[0-9]*[.,]?[0-9]+)\s([+-]?[0-9]*[.,]?[0-9]+)\s*(?:\s+EPSG:(\d+))?\s*$"
-        found = re.search(expression, text, re.IGNORECASE)
+        found = self.rectangle_regex.search(text)
         if found:
             epsg1, west, north, east, south, epsg2 = found.groups()
             west = float(west.replace(',', '.'))
@@ -142,9 +274,7 @@ class GeoFinder(object):
             return x, y, epsg """
 
         # We detect 2 reals (and EPSG code) with a regular expression
-        # [EPSG:<int>] <real> <real> [EPSG:<int>]
-        expression = r"^\s*(?:EPSG:(\d+)\s+)?([+-]?[0-9]*[.,]?[0-9]+)\s*([+-]?[0-9]*[.,]?[0-9]+)(?:\s+EPSG:(\d+))?\s*$"
-        found = re.search(expression, text, re.IGNORECASE)
+        found = self.point_regex.search(text)
         if found:
             epsg1, x, y, epsg2 = found.groups()
             epsg = int(epsg1) if epsg1 else int(epsg2) if epsg2 else None
@@ -165,9 +295,7 @@ class GeoFinder(object):
             return road, km """
 
         # We use regular expression
-        # <road> [km|,] <int>
-        expression = r'^\s*([A-Za-b]+)-*(\d+)\s*(?:(?:km)|,|\s)\s*(\d+)\s*$'
-        found = re.search(expression, text, re.IGNORECASE)
+        found = self.road_regex.search(text)
         if found:
             road, road_number, km = found.groups()
             road = f"{road}-{road_number}"
@@ -206,10 +334,7 @@ class GeoFinder(object):
             return municipality, type, name, number """
 
         # We use regular expression
-        # [<municipality>, [street_type] <street> [nº] <number> | [street_type] <street> [nº] <number>, <municipality>]
-        # To accept accents I use the range: \ u00C0- \ u017F
-        expression = r"^\s*(?:([\D\s]+)\s*,)?\s*([\w]+[./])?\s*([\D\s]+)\s+(?:nº)?\s*,*([\d-]+)\s*(?:[,.]\s*([\D\s]+[\D]))?\s*$" # [ciutat,] [C/] <carrer> <numero> [, ciutat]
-        found = re.search(expression, text, re.IGNORECASE)
+        found = self.address_regex.search(text)
         if found:
             municipality1, type, street, number, municipality2 = found.groups()
             municipality = municipality1 if municipality1 else municipality2
@@ -235,8 +360,7 @@ class GeoFinder(object):
         if len([char for char in cleaned_text if char in "0123456789"]) < 8:
             return None
         # Validate that it do not have symbols with a regular expression
-        expression = r'(\w+)'
-        found = re.search(expression, cleaned_text, re.IGNORECASE)
+        found = self.cadastral_ref_regex.search(cleaned_text)
         if found:
             cadastral_ref = found.groups()[0]
         else:
@@ -279,24 +403,59 @@ class GeoFinder(object):
         return dict_list
 
     def find_point_coordinate(self, x, y, epsg, \
-        search_icgc=True, search_cadastral_ref=True, add_point_to_res=True, show_log=True):
-        """ Returns a list of dictionaries with the sites found at the indicated point """
+        search_icgc=True, search_cadastral_ref=True, add_point_to_res=True, show_log=True, partial_callback=None,
+        cancel_event=None):
+        """ Returns a list of dictionaries with the sites found at the indicated point
+            (optional partial_callback(dict_list) receives each service results as it answers).
+            If optional cancel_event (threading.Event) is set, pending queries are cancelled and
+            an empty list is returned """
         if show_log:
             self.log.info("Geoencoder find coordinate: %s %s EPSG:%s", x, y, epsg)
-        dict_list = []
 
-        # Search ICGC geocoder on point
+        # Prepare queries on point (results are merged in this order)
+        queries_list = []
         if search_icgc:
             # First search streets and roads
-            dict_list += self.find_point_coordinate_icgc(x, y, epsg, \
-                layers="address,pk", search_radious_km=0.05, size=1)
+            queries_list.append(lambda: self.find_point_coordinate_icgc(x, y, epsg, \
+                layers="address,pk", search_radious_km=0.05, size=1))
             # Second generic placements
-            dict_list += self.find_point_coordinate_icgc(x, y, epsg, \
-                layers="tops", search_radious_km=None, size=9)
-
-            # Search cadastral ref on point
+            queries_list.append(lambda: self.find_point_coordinate_icgc(x, y, epsg, \
+                layers="tops", search_radious_km=None, size=9))
         if search_cadastral_ref:
-            dict_list += self.find_point_coordinate_catastro(x, y, epsg)
+            # Search cadastral ref on point
+            queries_list.append(lambda: self.find_point_coordinate_catastro(x, y, epsg))
+
+        # Run all queries in parallel with a combined deadline, the slowest provider sets the latency.
+        # Providers with errors or out of deadline are ignored
+        futures_list = [self.get_point_executor().submit(query) for query in queries_list]
+        # We wait in short intervals to attend the cancellation
+        deadline_time = time.monotonic() + self.point_deadline
+        pending_set = set(futures_list)
+        while pending_set and time.monotonic() < deadline_time:
+            if cancel_event and cancel_event.is_set():
+                for future in pending_set:
+                    future.cancel()
+                return []
+            done_set, pending_set = wait(pending_set, return_when=FIRST_COMPLETED,
+                timeout=min(self.cancel_check_interval, max(0, deadline_time - time.monotonic())))
+            if partial_callback:
+                for future in done_set:
+                    if not future.exception():
+                        partial_callback(future.result())
+        dict_list = []
+        errors_list = []
+        for future in futures_list:
+            if not future.done():
+                future.cancel()
+                self.log.warning("Geoencoder timeout on point query (%ss)", self.point_deadline)
+                errors_list.append(TimeoutError("Geoencoder timeout on point query (%ss)" % self.point_deadline))
+            elif future.exception():
+                errors_list.append(future.exception())
+            else:
+                dict_list += future.result()
+        # Without point entry, if all queries fail we report the error
+        if errors_list and len(errors_list) == len(futures_list) and not add_point_to_res:
+            raise errors_list[0]
 
         # Add coordinate point entry
         if add_point_to_res:
@@ -365,24 +524,27 @@ class GeoFinder(object):
         """ Converteix un punt d'un EPSG a un altre """
         if str(source_epsg) == str(destination_epsg) and str(destination_epsg) != "4326":
             return x, y
-        # Definim els sistemes de coordenades a utilitzar
-        source_crs = osr.SpatialReference()
-        source_crs.ImportFromEPSG(int(source_epsg))
-        destination_crs = osr.SpatialReference()
-        destination_crs.ImportFromEPSG(int(destination_epsg))
-        # EN GDAL 3 al convertir una coordenada a 4326 gira x<->y per evitar-ho canviar WGS84 per CRS84!!
-        # La sintaxis "normal" de 4326 és lat, lon, primer la y i després la x
-        # per tant els paràmetres venen girats x=lat i y=lon. Per arreglar-ho convertim la sortida
-        # a CRS84 en format x=lon, y=lat
-        if destination_epsg == 4326:
-            destination_crs.SetWellKnownGeogCS("CRS84")
         # Convertim les coordenades
-        ct = osr.CoordinateTransformation(source_crs, destination_crs)
-        destination_x, destination_y, _h = ct.TransformPoint(x, y)
+        ct = get_coordinate_transformation(int(source_epsg), int(destination_epsg), destination_epsg == 4326)
+        with self.transform_lock:
+            destination_x, destination_y, _h = ct.TransformPoint(x, y)
         destination_x = None if math.isinf(destination_x) else destination_x
         destination_y = None if math.isinf(destination_y) else destination_y
         return destination_x, destination_y
 
+    def transform_points(self, points, source_epsg, destination_epsg):
+        """ Converteix una llista o array NumPy de punts (N x 2) d'un EPSG a un altre amb una sola crida
+            Retorna un array NumPy (N x 2), amb NaN per als punts no convertibles """
+        import numpy
+        points_array = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        if (str(source_epsg) == str(destination_epsg) and str(destination_epsg) != "4326") or not len(points_array):
+            return points_array.copy()
+        ct = get_coordinate_transformation(int(source_epsg), int(destination_epsg), destination_epsg == 4326)
+        with self.transform_lock:
+            destination_array = numpy.array(ct.TransformPoints(points_array.tolist()), dtype=float)[:, 0:2]
+        destination_array[numpy.isinf(destination_array)] = numpy.nan
+        return destination_array
+
     def find_road(self, road, km):
         """ Returns a list of dictionaries with the roads found with the indicated nomenclature """
 
@@ -510,6 +672,11 @@ class GeoFinder(object):
 
         self.log.info("Geoencoder find placement: %s", text)
 
+        # Local gazetteer answers first, only unknown names are sent to the geoencoder
+        dict_list = self.find_gazetteer(text)
+        if dict_list:
+            return dict_list
+
         # We execute the query
         self.log.debug("Geoencoder URL: %s", self.get_icgc_geoencoder_client().url)
         try:
@@ -522,6 +689,53 @@ class GeoFinder(object):
         # We convert the result to a unique format
         return self.get_icgc_generalized_response(res_dict)
 
+    def find_gazetteer(self, text, prefix=False, size=None):
+        """ Returns a list of dictionaries with the toponyms found on local gazetteer (by name or by words prefix) """
+        if not self.gazetteer:
+            return []
+        try:
+            dict_list = self.gazetteer.search(text, size) if prefix else self.gazetteer.find(text)
+        except Exception as e:
+            self.log.warning("Gazetteer error: %s", e)
+            return []
+        if dict_list:
+            self.log.debug("Gazetteer found %d: %s", len(dict_list), ", ".join([data_dict['nom'] for data_dict in dict_list]))
+        return dict_list
+
+    def autocomplete(self, text, size=None):
+        """ Returns a list of dictionaries with the toponyms suggested for a partial text.
+            Coordinates, rectangles and roads have no suggestions. Results are cached by prefix """
+        prefix = " ".join(text.split()).lower()
+        if len(prefix) < self.autocomplete_min_chars:
+            return []
+        size = size or self.autocomplete_size
+        key = (prefix, size)
+        with self.autocomplete_lock:
+            dict_list = self.autocomplete_dict.get(key)
+            if dict_list is not None:
+                self.autocomplete_dict.move_to_end(key)
+                return dict_list
+
+        # Only place names and addresses have suggestions (checked with the same classifier than find_data)
+        if self.classify(text)[0] not in ("placename", "address"):
+            dict_list = []
+        else:
+            # Local gazetteer suggestions are instant, only unknown prefixes are sent to the geoencoder
+            dict_list = self.find_gazetteer(prefix, prefix=True, size=size)
+            if not dict_list:
+                try:
+                    res_dict = self.get_icgc_geoencoder_client().autocomplete(prefix, size=str(size))
+                except Exception as e:
+                    self.log.warning("Geoencoder autocomplete error: %s Request: %s", e, self.get_icgc_geoencoder_client().last_sent())
+                    return []
+                dict_list = self.get_icgc_generalized_response(res_dict)
+
+        with self.autocomplete_lock:
+            self.autocomplete_dict[key] = dict_list
+            while len(self.autocomplete_dict) > self.autocomplete_max_entries:
+                self.autocomplete_dict.popitem(last=False)
+        return dict_list
+
     def get_icgc_generalized_response(self, res_dict, default_type=None):
         """ Returns standard response for ICGC geocoder queries """
         dict_list = [{
@@ -573,4 +787,50 @@ class GeoFinder(object):
             """
         name = dict_list[selection]['nom']
 
-        return name
\ No newline at end of file
+        return name
+
+if __name__ == "__main__":
+    # Query type detection benchmark: individual detection functions one after another
+    # (as find_data did) vs one pass classifier (run: python -m geofinder3.geofinder [repetitions])
+    import sys
+    import timeit
+
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # Real user queries (plugin search help examples and usual place names)
+    queries_list = [
+        "Barcelona, Aribau 86", "Aribau 86, Barcelona", "Barcelona, C/ Aribau 86", "Barcelona, Avd. Diagonal nº 86",
+        "Girona, C/ Nou 12", "C32 km 10", "C32, 10", "B-23 10", "Barcelona", "Collserola", "Institut Cartografic",
+        "Sant Cugat del Vallès", "Vielha e Mijaran", "Pica d'Estats", "Montserrat", "Riu Ter", "Estació de Sants",
+        "429394.751 4580170.875", "429394,751 4580170,875", "429394.751 4580170.875 EPSG:25831",
+        "EPSG:4326 1.9767050 41.3297270", "427708.277 4582385.829 429808.277 4580285.829",
+        "427708.277 4582385.829 429808.277 4580285.829 EPSG:25831", "EPSG:25831 427708.277 4582385.829 429808.277 4580285.829",
+        "9503802DF2890D0001TE", "9872023 VH5797S 0001 WX", "13 077 A 018 00039 0000 FP",
+        ]
+
+    def sequential_classify(text):
+        west, north, east, south, epsg = GeoFinder.get_rectangle_coordinate(text)
+        if west and north and east and south:
+            return "rectangle"
+        x, y, epsg = GeoFinder.get_point_coordinate(text)
+        if x and y:
+            return "point"
+        road, km = GeoFinder.get_road(text)
+        if road and km:
+            return "road"
+        municipality, adress_type, name, number = GeoFinder.get_address(text)
+        if municipality and name and number:
+            return "address"
+        if GeoFinder.get_cadastral_ref(text):
+            return "cadastral_ref"
+        return "placename"
+
+    # Both detections must agree
+    for text in queries_list:
+        assert sequential_classify(text) == GeoFinder.classify(text)[0], text
+
+    queries_count = len(queries_list) * repetitions
+    sequential_time = timeit.timeit(lambda: [sequential_classify(text) for text in queries_list], number=repetitions)
+    combined_time = timeit.timeit(lambda: [GeoFinder.classify(text) for text in queries_list], number=repetitions)
+    print("Queries: %s (%s x %s)" % (queries_count, len(queries_list), repetitions))
+    print("Sequential: %.3fs (%.2f us/query)" % (sequential_time, sequential_time / queries_count * 1000000))
+    print("Classify:   %.3fs (%.2f us/query)" % (combined_time, combined_time / queries_count * 1000000))
@@ -1968,6 +1968,91 @@ Actualitza la teva versió de QGIS si és possible.</translation>
         <source>[MS] Satellite NDVI</source>
         <translation>[SM] NDVI satèl·lit</translation>
     </message>
+    <message>
+        <location filename="../openicgc.py" line="1327"/>
+        <source>Add municipality and county to point layer features</source>
+        <translation>Afegir municipi i comarca als elements d&apos;una capa de punts</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4025"/>
+        <source>Municipality and county</source>
+        <translation>Municipi i comarca</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4029"/>
+        <source>You must select a point layer</source>
+        <translation>S&apos;ha de seleccionar una capa de punts</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4033"/>
+        <source>Layer attributes can not be modified</source>
+        <translation>No es poden modificar els atributs de la capa</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4037"/>
+        <source>Loading municipalities ...</source>
+        <translation>Carregant municipis ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4038"/>
+        <source>Elapsed %s. Remaining %s</source>
+        <translation>Transcorregut %s. Restant %s</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4048"/>
+        <source>Reading points ...</source>
+        <translation>Llegint punts ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4066"/>
+        <source>Searching municipalities ...</source>
+        <translation>Cercant municipis ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4107"/>
+        <source>Writing attributes ...</source>
+        <translation>Escrivint atributs ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4140"/>
+        <source>%s points updated (%s locations, %s resolved by the geocoder)</source>
+        <translation>%s punts actualitzats (%s ubicacions, %s resoltes pel geocodificador)</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2145"/>
+        <source>Resources profiling</source>
+        <translation>Perfilat de recursos</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2147"/>
+        <source>Show resources profiling</source>
+        <translation>Mostrar el perfilat de recursos</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2149"/>
+        <source>Export resources profiling (JSON)</source>
+        <translation>Exportar el perfilat de recursos (JSON)</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2151"/>
+        <source>Export resources profiling (Chrome trace)</source>
+        <translation>Exportar el perfilat de recursos (traça Chrome)</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="3419"/>
+        <source>Save</source>
+        <translation>Guardar</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="3419"/>
+        <source>Copy to clipboard</source>
+        <translation>Copiar al porta-retalls</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="3429"/>
+        <source>JSON file (*.json)</source>
+        <translation>Fitxer JSON (*.json)</translation>
+    </message>
 </context>
 <context>
     <name>PhotoSearchSelectionDialog</name>
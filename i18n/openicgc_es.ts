@@ -1968,6 +1968,91 @@ Actualitza tu versión de QGIS si es posible.</translation>
         <source>[MS] Satellite NDVI</source>
         <translation>[SM] NDIV satélite</translation>
     </message>
+    <message>
+        <location filename="../openicgc.py" line="1327"/>
+        <source>Add municipality and county to point layer features</source>
+        <translation>Añadir municipio y comarca a los elementos de una capa de puntos</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4025"/>
+        <source>Municipality and county</source>
+        <translation>Municipio y comarca</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4029"/>
+        <source>You must select a point layer</source>
+        <translation>Se ha de seleccionar una capa de puntos</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4033"/>
+        <source>Layer attributes can not be modified</source>
+        <translation>No se pueden modificar los atributos de la capa</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4037"/>
+        <source>Loading municipalities ...</source>
+        <translation>Cargando municipios ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4038"/>
+        <source>Elapsed %s. Remaining %s</source>
+        <translation>Transcurrido %s. Restante %s</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4048"/>
+        <source>Reading points ...</source>
+        <translation>Leyendo puntos ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4066"/>
+        <source>Searching municipalities ...</source>
+        <translation>Buscando municipios ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4107"/>
+        <source>Writing attributes ...</source>
+        <translation>Escribiendo atributos ...</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="4140"/>
+        <source>%s points updated (%s locations, %s resolved by the geocoder)</source>
+        <translation>%s puntos actualizados (%s ubicaciones, %s resueltas por el geocodificador)</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2145"/>
+        <source>Resources profiling</source>
+        <translation>Perfilado de recursos</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2147"/>
+        <source>Show resources profiling</source>
+        <translation>Mostrar el perfilado de recursos</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2149"/>
+        <source>Export resources profiling (JSON)</source>
+        <translation>Exportar el perfilado de recursos (JSON)</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="2151"/>
+        <source>Export resources profiling (Chrome trace)</source>
+        <translation>Exportar el perfilado de recursos (traza Chrome)</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="3419"/>
+        <source>Save</source>
+        <translation>Guardar</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="3419"/>
+        <source>Copy to clipboard</source>
+        <translation>Copiar al portapapeles</translation>
+    </message>
+    <message>
+        <location filename="../openicgc.py" line="3429"/>
+        <source>JSON file (*.json)</source>
+        <translation>Archivo JSON (*.json)</translation>
+    </message>
 </context>
 <context>
     <name>PhotoSearchSelectionDialog</name>
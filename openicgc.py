@@ -29,17 +29,19 @@ import io
 import logging
 import json
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from urllib.parse import urljoin, quote
 from importlib import reload
 
 # Import QGIS libraries
 from qgis.core import QgsRasterLayer, QgsVectorLayer, QgsPointXY, QgsRectangle, QgsGeometry
-from qgis.core import Qgis, QgsProject, QgsWkbTypes, QgsField, QgsFeature
+from qgis.core import Qgis, QgsProject, QgsWkbTypes, QgsField, QgsFeature, QgsApplication
+from qgis.core import QgsPoint, QgsSpatialIndex, QgsFeatureRequest, QgsVectorDataProvider
 from qgis.gui import QgsMapTool, QgsRubberBand
 # Import the PyQt and QGIS libraries
-from PyQt5.QtCore import QSize, Qt, QPoint, QDateTime, QVariant, pyqtSignal
-from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import QApplication, QComboBox, QMessageBox, QStyle, QInputDialog
+from PyQt5.QtCore import QSize, Qt, QPoint, QDateTime, QVariant, QTimer, QStringListModel, QModelIndex, QEventLoop, pyqtSignal
+from PyQt5.QtGui import QColor, QFontDatabase
+from PyQt5.QtWidgets import QApplication, QComboBox, QMessageBox, QStyle, QInputDialog, QCompleter
 from PyQt5.QtWidgets import QLineEdit, QFileDialog, QWidgetAction
 
 # Initialize Qt resources from file resources_rc.py
@@ -53,9 +55,11 @@ if is_import_relative:
     # Import basic plugin functionalities
     from .qlib3.base.loginfodialog import LogInfoDialog
     from .qlib3.base.pluginbase import PluginBase, WaitCursor
-    from .qlib3.base.progressdialog import WorkingDialog
+    from .qlib3.base.progressdialog import WorkingDialog, ProgressDialog
     # Import geofinder dialog and class
     from .geofinder3.geofinder import GeoFinder
+    from .geofinder3.cache import ResponseCache
+    from .geofinder3.gazetteer import Gazetteer
     from .qlib3.geofinderdialog.geofinderdialog import GeoFinderDialog
     # Import photosearch dialog
     from .qlib3.photosearchselectiondialog.photosearchselectiondialog import PhotoSearchSelectionDialog
@@ -74,6 +78,8 @@ if is_import_relative:
     from .resources3.http import get_population_zones, get_coast_lidar_ref, get_coast_lidar_filename_dict
     from .resources3.http import get_dtm_ref, get_dtm_filename, get_dtms
     from .resources3 import http as http_resources, wms as wms_resources, fme as fme_resources
+    from .resources3 import cache as cache_resources, session as session_resources, profiling as profiling_resources
+    from .resources3 import snapshot as snapshot_resources
 else:
     # Import basic plugin functionalities
     import qlib3.base.pluginbase
@@ -84,7 +90,7 @@ else:
     from qlib3.base.loginfodialog import LogInfoDialog
     import qlib3.base.progressdialog
     reload(qlib3.base.progressdialog)
-    from qlib3.base.progressdialog import WorkingDialog
+    from qlib3.base.progressdialog import WorkingDialog, ProgressDialog
     # Import geofinder dialog and class
     import qlib3.geofinderdialog.geofinderdialog
     reload(qlib3.geofinderdialog.geofinderdialog)
@@ -92,6 +98,12 @@ else:
     import geofinder3.geofinder
     reload(geofinder3.geofinder)
     from geofinder3.geofinder import GeoFinder
+    import geofinder3.cache
+    reload(geofinder3.cache)
+    from geofinder3.cache import ResponseCache
+    import geofinder3.gazetteer
+    reload(geofinder3.gazetteer)
+    from geofinder3.gazetteer import Gazetteer
     # Import photosearch dialog
     import qlib3.photosearchselectiondialog.photosearchselectiondialog
     reload(qlib3.photosearchselectiondialog.photosearchselectiondialog)
@@ -119,6 +131,8 @@ else:
     from resources3.http import get_population_zones, get_coast_lidar_ref, get_coast_lidar_filename_dict
     from resources3.http import get_dtm_ref, get_dtm_filename, get_dtms
     from resources3 import http as http_resources, wms as wms_resources, fme as fme_resources
+    from resources3 import cache as cache_resources, session as session_resources, profiling as profiling_resources
+    from resources3 import snapshot as snapshot_resources
 
 # Global function to set HTML tags to apply fontsize to QInputDialog text
 set_html_font_size = lambda text, size=9: ('<html style="font-size:%spt;">%s</html>' % (size, text.replace("\n", "<br/>").replace(" ", "&nbsp;")))
@@ -254,6 +268,45 @@ class QgsMapToolPhotoSearch(QgsMapTool):
             self.callback(cpos.x(), cpos.y())
 
 
+class MunicipalitiesIndex:
+    """ Municipalities polygons with a spatial index and prepared geometries,
+        to get the municipality and county of points without network access """
+
+    def __init__(self, municipalities_source, counties_source):
+        """ Loads ICGC delimitations (municipalities have county code, counties have county name) """
+        counties_layer = QgsVectorLayer(counties_source, "counties", "ogr")
+        counties_dict = {feature["CODICOMAR"]: feature["NOMCOMAR"] for feature in counties_layer.getFeatures()} \
+            if counties_layer.isValid() else {}
+        municipalities_layer = QgsVectorLayer(municipalities_source, "municipalities", "ogr")
+        if not municipalities_layer.isValid():
+            raise Exception("Can't load municipalities: %s" % municipalities_source)
+        self.epsg = int(municipalities_layer.crs().authid().split(":")[-1])
+
+        self.index = QgsSpatialIndex()
+        self.municipalities_dict = {} # fid: (geometry, prepared geometry engine, municipality, county)
+        for feature in municipalities_layer.getFeatures():
+            geometry = feature.geometry()
+            if not geometry or geometry.isEmpty():
+                continue
+            # El motor preparat referencia la geometria, cal mantenir-la viva
+            engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+            engine.prepareGeometry()
+            self.municipalities_dict[feature.id()] = (geometry, engine, feature["NOMMUNI"], counties_dict.get(feature["CODICOMAR"], ""))
+            self.index.addFeature(feature)
+
+    def __len__(self):
+        return len(self.municipalities_dict)
+
+    def find(self, x, y):
+        """ Returns municipality and county of a point (on index EPSG) or (None, None) if it is outside all municipalities """
+        point = QgsPoint(x, y)
+        for fid in self.index.intersects(QgsRectangle(x, y, x, y)):
+            _geometry, engine, municipality, county = self.municipalities_dict[fid]
+            if engine.intersects(point):
+                return municipality, county
+        return None, None
+
+
 class HelpType:
     """ Definition of differents types of show pluggin help """
     local = 0
@@ -274,8 +327,22 @@ class OpenICGC(PluginBase):
     # Squared (superscript 2) unicode char
     SQUARE_CHAR = "\u00B2"
 
-    # Custom signal to know when plugin resources are loaded
-    resourcesLoadingFinished = pyqtSignal()
+    # Custom signal to know when a plugin resource is loaded (sends resource name)
+    resourceLoaded = pyqtSignal(str)
+    # Custom signal to receive search text suggestions from background queries (sends query id and results)
+    autocompleteReady = pyqtSignal(int, list)
+
+    # Delay after last keystroke to query search text suggestions (milliseconds)
+    AUTOCOMPLETE_DELAY = 150
+
+    # Online resources needed by each toolbar menu id (loaded on demand when the menu is shown)
+    MENU_RESOURCES_DICT = {
+        "background_maps": ["topographic", "dtm", "coast", "ndvi", "ortho", "photolib"],
+        "download": ["fme", "municipalities"],
+        "paint_styles": ["dtm"],
+        }
+    # Online resources whose discovery data is saved on the first resources snapshot
+    SNAPSHOT_RESOURCES_LIST = ["topographic", "dtm", "coast", "ndvi", "ortho", "photolib", "fme"]
 
     ###########################################################################
     # Plugin initialization
@@ -302,6 +369,23 @@ class OpenICGC(PluginBase):
         http_resources.log = self.log
         wms_resources.log = self.log
         fme_resources.log = self.log
+        cache_resources.log = self.log
+        session_resources.log = self.log
+        profiling_resources.log = self.log
+        snapshot_resources.log = self.log
+
+        # Configure persistent resources cache (on QGIS settings folder)
+        cache_resources.configure(
+            os.path.join(QgsApplication.qgisSettingsDirPath(), "cache", self.plugin_id),
+            int(self.get_setting_value("resources_cache_ttl_seconds", cache_resources.ttl_seconds)))
+        # Load newest resources snapshot (bundled with plugin or refreshed on user cache folder), then
+        # online resources are initialized with a local file read instead of network discovery
+        self.resources_snapshot_pathname = os.path.join(cache_resources.cache_path, "resources_snapshot.json")
+        self.use_resources_snapshot = self.get_setting_value("use_resources_snapshot", "true") == "true"
+        self.resources_snapshot_loaded = self.use_resources_snapshot \
+            and snapshot_resources.load([snapshot_resources.SNAPSHOT_PATHNAME, self.resources_snapshot_pathname])
+        # Share the same WMS capabilities repository (one download and parse per service) with plugin layer requests
+        self.layers.wms_capabilities_provider = wms_resources.get_wms_capabilities_layers
 
         ## Initialize default download variables
         self.download_type = "dt_area"
@@ -313,9 +397,22 @@ class OpenICGC(PluginBase):
 
         # We created a GeoFinder object that will allow us to perform spatial searches
         # and we configure it with our plugin logger
-        self.geofinder = GeoFinder(logger=self.log)
+        # (repeated queries are answered from a local responses cache persisted on plugin cache folder
+        # and common place names from an offline gazetteer, built by the user on plugin cache folder
+        # or bundled with the plugin: python -m geofinder3.gazetteer <file>)
+        gazetteer_pathnames_list = [pathname for pathname in [
+            os.path.join(cache_resources.cache_path, "gazetteer.sqlite"),
+            os.path.join(self.plugin_path, "data", "gazetteer.sqlite"),
+            ] if os.path.exists(pathname)]
+        gazetteer = Gazetteer(gazetteer_pathnames_list[0], logger=self.log) \
+            if gazetteer_pathnames_list and self.get_setting_value("use_gazetteer", "true") == "true" else None
+        self.geofinder = GeoFinder(logger=self.log, session=session_resources.get_session(),
+            cache=ResponseCache(db_pathname=os.path.join(cache_resources.cache_path, "geofinder_cache.sqlite")),
+            gazetteer=gazetteer)
         # Initialize reference to GeoFinderDialog
         self.geofinder_dialog = None
+        # Local municipalities index (loaded on first use)
+        self.municipalities_index = None
 
         # Initialize reference to PhotoSearchSelectionDialog
         self.photo_search_dialog = None
@@ -769,7 +866,12 @@ class OpenICGC(PluginBase):
         self.iface.layerTreeView().currentLayerChanged.disconnect(self.on_change_current_layer)
         self.iface.layerTreeView().clicked.disconnect(self.on_click_legend)
         self.combobox.activated.disconnect()
-        self.resourcesLoadingFinished.disconnect(self.reload_toolbar)
+        self.combobox.lineEdit().textEdited.disconnect(self.on_search_text_edited)
+        self.autocomplete_timer.stop()
+        self.autocomplete_timer.timeout.disconnect(self.on_autocomplete_timeout)
+        self.autocomplete_completer.activated[QModelIndex].disconnect(self.on_autocomplete_activated)
+        self.autocompleteReady.disconnect(self.on_autocomplete_ready)
+        self.resourceLoaded.disconnect(self.on_resource_loaded)
         photo_search_layer = self.layers.get_by_id(self.photo_search_layer_id)
         if photo_search_layer:
             photo_search_layer.selectionChanged.disconnect(self.on_change_photo_selection)
@@ -788,11 +890,19 @@ class OpenICGC(PluginBase):
         self.log.debug("Removed groups")
         # Remove GeoFinder dialog
         self.geofinder_dialog = None
+        # Stop geocoder queries thread pools
+        self.geofinder.shutdown()
+        # Close geocoder responses cache
+        self.geofinder.cache.close()
+        if self.geofinder.gazetteer:
+            self.geofinder.gazetteer.close()
         # Remove Download dialog
         self.download_dialog = None
         self.log.debug("Removed dialogs")
         # Unload fonts
         self.log.debug("Removed fonts: %s" % self.unload_fonts(self.font_id_list))
+        # Close shared HTTP connections
+        session_resources.close()
         # Log plugin unloaded
         self.log.info("Unload %s%s", self.metadata.get_name(), " Lite" if self.lite else "")
         # Parent PluginBase class release all GUI resources created with their functions
@@ -803,16 +913,18 @@ class OpenICGC(PluginBase):
         # Log plugin started
         t0 = datetime.datetime.now()
 
-        # Plugin registration in the plugin manager
-        self.gui.configure_plugin()
+        with profiling_resources.span("initGui", "gui"):
+            # Plugin registration in the plugin manager
+            self.gui.configure_plugin()
 
-        # Create toolbar without loaded resources
-        self.init_toolbar()
+            # Create toolbar without loaded resources
+            self.init_toolbar()
 
-        # Load async resources and update GUI via signal self.resourcesLoadingFinished
-        # connected with self.reload_toolbar (can't create QtObjects in a thread...)
-        self.resourcesLoadingFinished.connect(self.reload_toolbar)
-        self.run_async(self.init_resources, self.resourcesLoadingFinished)
+            # Register async resources, they will be loaded on demand when their menus are shown
+            # and update GUI via signal self.resourceLoaded connected with self.on_resource_loaded
+            # (can't create QtObjects in a thread...)
+            self.resourceLoaded.connect(self.on_resource_loaded)
+            self.init_async_resources(check_qgis_updates, check_icgc_updates)
         # Debug:
         # self.init_local_resources()
         # self.init_online_resources()
@@ -832,6 +944,70 @@ class OpenICGC(PluginBase):
         except Exception as e:
             self.log.error("Async initialization: %s" % e)
 
+    def init_async_resources(self, check_qgis_updates=True, check_icgc_updates=False):
+        """ Registers resources to load asynchronously. Local resources and updates are loaded
+            at start, online resources are loaded when their menus are shown (or at start if
+            setting "prefetch_online_resources" is enabled) """
+        # Each resource load is measured with a profiling span (see show_resources_profiling)
+        for name, callback in [
+                ("local", self.init_local_resources),
+                ("topographic", self.init_topographic_resources),
+                ("dtm", self.init_dtm_resources),
+                ("coast", self.init_coast_resources),
+                ("ndvi", self.init_ndvi_resources),
+                ("ortho", self.init_ortho_resources),
+                ("photolib", self.init_photolib_resources),
+                ("fme", self.init_fme_resources),
+                ("updates", lambda:self.init_update_resources(check_qgis_updates, check_icgc_updates)),
+                ]:
+            self.register_async_resource(name, self.get_profiled_callback(name, "resource", callback), self.resourceLoaded)
+        # Local municipalities index, used to know the municipality of downloads (without GUI update,
+        # the signal only wakes up processes waiting for it)
+        self.register_async_resource("municipalities",
+            self.get_profiled_callback("municipalities", "resource", self.init_municipalities_index), self.resourceLoaded)
+        # Resources snapshot is refreshed on background for next start, or saved when all online
+        # resources have been loaded if there is not any one (first run) (without GUI update)
+        if self.use_resources_snapshot:
+            self.register_async_resource("snapshot",
+                self.get_profiled_callback("snapshot", "resource", lambda:snapshot_resources.refresh(self.resources_snapshot_pathname)))
+
+        if self.resources_snapshot_loaded:
+            # With a snapshot online resources are loaded without network access, so we load all of them
+            self.load_async_resources()
+        elif self.get_setting_value("prefetch_online_resources", "false") == "true":
+            self.load_async_resources([name for name in self.async_resources_dict.keys() if name != "snapshot"])
+        else:
+            self.load_async_resources(["local", "updates"])
+
+    def get_profiled_callback(self, name, category, callback):
+        """ Returns callback wrapped with a profiling span """
+        def profiled_callback(*args):
+            with profiling_resources.span(name, category):
+                return callback(*args)
+        return profiled_callback
+
+    def on_resource_loaded(self, resource_name):
+        """ Updates toolbar when an async resource is loaded (municipalities index has not GUI) """
+        if resource_name != "municipalities":
+            self.update_toolbar()
+        # Without a resources snapshot (first run), it is saved from loaded data when all online resources are loaded
+        if self.use_resources_snapshot and not self.resources_snapshot_loaded \
+                and all([self.is_async_resource_loaded(name) for name in self.SNAPSHOT_RESOURCES_LIST]):
+            self.load_async_resource("snapshot")
+
+    def connect_menus_resources(self):
+        """ Connects toolbar menus with the load of their online resources on demand """
+        for menu_id, resources_list in self.MENU_RESOURCES_DICT.items():
+            action = self.gui.find_action(menu_id)
+            if not action:
+                continue
+            # Toolbar menus are QToolButtons with a submenu, other menus are QActions with a submenu
+            menu = action.defaultWidget().menu() if type(action) is QWidgetAction else action.menu()
+            # Menus kept by incremental toolbar updates are already connected
+            if menu and not menu.property("load_resources") and not all([self.is_async_resource_loaded(name) for name in resources_list]):
+                menu.aboutToShow.connect(lambda resources_list=resources_list:self.load_async_resources(resources_list))
+                menu.setProperty("load_resources", True)
+
     def init_local_resources(self, empty=False):
         """ Local resources initialization with real or empty values """
         if empty:
@@ -958,78 +1134,102 @@ class OpenICGC(PluginBase):
 
         else:
             self.log.info("Initializing online resources")
+            self.init_topographic_resources()
+            self.init_dtm_resources()
+            self.init_coast_resources()
+            self.init_ndvi_resources()
+            self.init_ortho_resources()
+            self.init_photolib_resources()
+            self.init_fme_resources()
+            self.init_update_resources(check_qgis_updates, check_icgc_updates)
+
+    def init_topographic_resources(self):
+        """ Topographic online resources initialization """
+        # Gets available Topo5k files to simulate WMS-T service
+        self.topo5k_time_series_list = [(time_year, "/vsicurl/%s" % url) for time_year, url in get_topographic_5k()]
+        # Get availabre topo LTR layers
+        self.topo_ltr_layers = get_topo_ltr_layers()
+
+    def init_dtm_resources(self):
+        """ DTMs online resources initialization """
+        # Gets available DTMs
+        self.dtm_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("met", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
+        self.height_highlighting_url = self.dtm_list[0][1] if self.dtm_list else None
+        # Gets available DTMs with buildings
+        self.dtmb_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("ed", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
+        # Gets available Surface models
+        self.sm_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("ms", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
+        # Gets available Orientation models
+        self.om_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("mo", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
+
+    def init_coast_resources(self):
+        """ Coast online resources initialization """
+        # Gets available Coast
+        self.coastline_url, self.coastline_list = get_coastlines()
+        self.coastline_time_series_list = [(coastline_date_tag, coastline_layer) for coastline_layer, _coastline_name,  coastline_date_tag in self.coastline_list]
+        self.coastline_current_time, self.coastline_current_layer = self.coastline_time_series_list[-1] if self.coastline_time_series_list else ("", "")
+        self.coast_ortho_url, self.coast_ortho_list = get_coast_orthos()
+        self.coast_ortho_time_series_list = [(coast_ortho_date_tag, coast_ortho_layer) for coast_ortho_layer, _coast_ortho_name, _coast_ortho_color_type, coast_ortho_date_tag in self.coast_ortho_list]
+        self.coast_ortho_current_time, self.coast_ortho_current_layer = self.coast_ortho_time_series_list[-1] if self.coast_ortho_time_series_list else ("", "")
+
+    def init_ndvi_resources(self):
+        """ NDVI online resources initialization """
+        # Gets available NDVI files to simulate WMS-T service
+        self.ndvi_time_series_list = [(time_year, "/vsicurl/%s" % url) for time_year, url in get_ndvis()]
+        self.ndvi_current_time = self.ndvi_time_series_list[-1][0] if self.ndvi_time_series_list else None
+
+    def init_ortho_resources(self):
+        """ Ortho online resources initialization """
+        # Gets all ortho data (except satellite)
+        self.ortho_wms_url, historic_ortho_list = get_full_ortho()
+        self.ortho_color_time_series_list = [(str(year), layer_id) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortofoto" and color != "irc"]
+        self.ortho_color_year = self.ortho_color_time_series_list[-1][0] if self.ortho_color_time_series_list else None
+        self.ortho_infrared_time_series_list = [(str(year), layer_id) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortofoto" and color == "irc"]
+        self.ortho_infrared_year = self.ortho_infrared_time_series_list[-1][0] if self.ortho_infrared_time_series_list else None
+        self.ortosuperexp_color_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "superexpedita" and color != "irc"]
+        self.ortosuperexp_color_year, self.ortosuperexp_color_layer_id, ortosuperexp_color_layer_name = self.ortosuperexp_color_list[-1] if self.ortosuperexp_color_list else (None, None, None)
+        self.ortosuperexp_infrared_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "superexpedita" and color == "irc"]
+        self.ortosuperexp_infrared_year, self.ortosuperexp_infrared_layer_id, ortosuperexp_infrared_layer_name = self.ortosuperexp_infrared_list[-1] if self.ortosuperexp_infrared_list else (None, None, None)
+        self.ortoxpres_color_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortoxpres" and color != "irc"]
+        self.ortoxpres_color_year, self.ortoxpres_color_layer_id, ortoxpres_color_layer_name = self.ortoxpres_color_list[-1] if self.ortoxpres_color_list else (None, None, None)
+        self.ortoxpres_infrared_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortoxpres" and color == "irc"]
+        self.ortoxpres_infrared_year, self.ortoxpres_infrared_layer_id, ortoxpres_infrared_layer_name = self.ortoxpres_infrared_list[-1] if self.ortoxpres_infrared_list else (None, None, None)
+        historic_lidar_ortho_list = get_lidar_ortho()
+        self.lidar_ortho_color_time_series_list = [(year, "/vsicurl/%s" % url) for year, url, color in historic_lidar_ortho_list if color == "rgb"]
+        self.lidar_ortho_color_year = self.lidar_ortho_color_time_series_list[-1][0] if self.lidar_ortho_color_time_series_list else None
+        self.lidar_ortho_infrared_time_series_list = [(year, "/vsicurl/%s" % url) for year, url, color in historic_lidar_ortho_list if color == "irc"]
+        self.lidar_ortho_infrared_year = self.lidar_ortho_infrared_time_series_list[0][0] if self.lidar_ortho_infrared_time_series_list else None
+        self.ortho_local_wms_url, historic_ortho_local_list = get_full_local_ortho()
+        self.ortho_color_local_time_series_list = [(str(year), layer_id) for layer_id, layer_name, color, year in historic_ortho_local_list if color == "rgb"]
+        self.ortho_color_local_year, self.ortho_color_local_current_layer = self.ortho_color_local_time_series_list[-1] if self.ortho_color_local_time_series_list else (None, None)
+        self.ortho_infrared_local_time_series_list = [(str(year), layer_id) for layer_id, layer_name, color, year in historic_ortho_local_list if color == "irc"]
+        self.ortho_infrared_local_year, self.ortho_infrared_local_current_layer = self.ortho_infrared_local_time_series_list[-1] if self.ortho_infrared_local_time_series_list else (None, None)
+
+    def init_photolib_resources(self):
+        """ Photolib online resources initialization """
+        # Gets anaglyph photograms. Last year can not have full photograms coverage, we select previous year as default
+        t0 = datetime.datetime.now()
+        self.photolib_wms_url = PHOTOLIB_WMS
+        _photolib_time_series_list, self.photolib_current_time = self.layers.get_wms_t_time_series(self.photolib_wms_url, "photo_central")
+        self.photolib_current_time = str(int(self.photolib_current_time) - 1) if self.photolib_current_time else self.photolib_current_time
+        t1 = datetime.datetime.now()
+        self.log.info("Photolib current time: %s (%s)" % (self.photolib_current_time, t1-t0))
 
-            # Gets available Topo5k files to simulate WMS-T service
-            self.topo5k_time_series_list = [(time_year, "/vsicurl/%s" % url) for time_year, url in get_topographic_5k()]
-            # Get availabre topo LTR layers
-            self.topo_ltr_layers = get_topo_ltr_layers()
-
-            # Gets available DTMs
-            self.dtm_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("met", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
-            self.height_highlighting_url = self.dtm_list[0][1] if self.dtm_list else None
-            # Gets available DTMs with buildings
-            self.dtmb_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("ed", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
-            # Gets available Surface models
-            self.sm_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("ms", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
-            # Gets available Orientation models
-            self.om_list = [(name, "/vsicurl/%s" % url) for name, url in get_dtms("mo", json_not_tiff=False, remove_prefix=True, sort_by_key=True)]
-
-            # Gets available Coast
-            self.coastline_url, self.coastline_list = get_coastlines()
-            self.coastline_time_series_list = [(coastline_date_tag, coastline_layer) for coastline_layer, _coastline_name,  coastline_date_tag in self.coastline_list]
-            self.coastline_current_time, self.coastline_current_layer = self.coastline_time_series_list[-1] if self.coastline_time_series_list else ("", "")
-            self.coast_ortho_url, self.coast_ortho_list = get_coast_orthos()
-            self.coast_ortho_time_series_list = [(coast_ortho_date_tag, coast_ortho_layer) for coast_ortho_layer, _coast_ortho_name, _coast_ortho_color_type, coast_ortho_date_tag in self.coast_ortho_list]
-            self.coast_ortho_current_time, self.coast_ortho_current_layer = self.coast_ortho_time_series_list[-1] if self.coast_ortho_time_series_list else ("", "")
-
-            # Gets available NDVI files to simulate WMS-T service
-            self.ndvi_time_series_list = [(time_year, "/vsicurl/%s" % url) for time_year, url in get_ndvis()]
-            self.ndvi_current_time = self.ndvi_time_series_list[-1][0] if self.ndvi_time_series_list else None
-
-            # Gets all ortho data (except satellite)
-            self.ortho_wms_url, historic_ortho_list = get_full_ortho()
-            self.ortho_color_time_series_list = [(str(year), layer_id) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortofoto" and color != "irc"]
-            self.ortho_color_year = self.ortho_color_time_series_list[-1][0] if self.ortho_color_time_series_list else None
-            self.ortho_infrared_time_series_list = [(str(year), layer_id) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortofoto" and color == "irc"]
-            self.ortho_infrared_year = self.ortho_infrared_time_series_list[-1][0] if self.ortho_infrared_time_series_list else None
-            self.ortosuperexp_color_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "superexpedita" and color != "irc"]
-            self.ortosuperexp_color_year, self.ortosuperexp_color_layer_id, ortosuperexp_color_layer_name = self.ortosuperexp_color_list[-1] if self.ortosuperexp_color_list else (None, None, None)
-            self.ortosuperexp_infrared_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "superexpedita" and color == "irc"]
-            self.ortosuperexp_infrared_year, self.ortosuperexp_infrared_layer_id, ortosuperexp_infrared_layer_name = self.ortosuperexp_infrared_list[-1] if self.ortosuperexp_infrared_list else (None, None, None)
-            self.ortoxpres_color_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortoxpres" and color != "irc"]
-            self.ortoxpres_color_year, self.ortoxpres_color_layer_id, ortoxpres_color_layer_name = self.ortoxpres_color_list[-1] if self.ortoxpres_color_list else (None, None, None)
-            self.ortoxpres_infrared_list = [(str(year), layer_id, layer_name) for layer_id, layer_name, ortho_type, color, year in historic_ortho_list if ortho_type == "ortoxpres" and color == "irc"]
-            self.ortoxpres_infrared_year, self.ortoxpres_infrared_layer_id, ortoxpres_infrared_layer_name = self.ortoxpres_infrared_list[-1] if self.ortoxpres_infrared_list else (None, None, None)
-            historic_lidar_ortho_list = get_lidar_ortho()
-            self.lidar_ortho_color_time_series_list = [(year, "/vsicurl/%s" % url) for year, url, color in historic_lidar_ortho_list if color == "rgb"]
-            self.lidar_ortho_color_year = self.lidar_ortho_color_time_series_list[-1][0] if self.lidar_ortho_color_time_series_list else None
-            self.lidar_ortho_infrared_time_series_list = [(year, "/vsicurl/%s" % url) for year, url, color in historic_lidar_ortho_list if color == "irc"]
-            self.lidar_ortho_infrared_year = self.lidar_ortho_infrared_time_series_list[0][0] if self.lidar_ortho_infrared_time_series_list else None
-            self.ortho_local_wms_url, historic_ortho_local_list = get_full_local_ortho()
-            self.ortho_color_local_time_series_list = [(str(year), layer_id) for layer_id, layer_name, color, year in historic_ortho_local_list if color == "rgb"]
-            self.ortho_color_local_year, self.ortho_color_local_current_layer = self.ortho_color_local_time_series_list[-1] if self.ortho_color_local_time_series_list else (None, None)
-            self.ortho_infrared_local_time_series_list = [(str(year), layer_id) for layer_id, layer_name, color, year in historic_ortho_local_list if color == "irc"]
-            self.ortho_infrared_local_year, self.ortho_infrared_local_current_layer = self.ortho_infrared_local_time_series_list[-1] if self.ortho_infrared_local_time_series_list else (None, None)
-
-            # Gets anaglyph photograms. Last year can not have full photograms coverage, we select previous year as default
-            t0 = datetime.datetime.now()
-            self.photolib_wms_url = PHOTOLIB_WMS
-            _photolib_time_series_list, self.photolib_current_time = self.layers.get_wms_t_time_series(self.photolib_wms_url, "photo_central")
-            self.photolib_current_time = str(int(self.photolib_current_time) - 1) if self.photolib_current_time else self.photolib_current_time
-            t1 = datetime.datetime.now()
-            self.log.info("Photolib current time: %s (%s)" % (self.photolib_current_time, t1-t0))
-
-            # Gets available download source data
-            self.log.info("Initializing FME downloads")
-            self.fme_services_list = get_services()
+    def init_fme_resources(self):
+        """ FME downloads online resources initialization """
+        # Gets available download source data
+        self.log.info("Initializing FME downloads")
+        self.fme_services_list = get_services()
 
-            # Check plugin update
-            t0 = datetime.datetime.now()
-            self.new_icgc_plugin_version = self.check_plugin_update() if check_icgc_updates else None
-            self.new_qgis_plugin_version = self.metadata.get_qgis_new_version_available() if check_qgis_updates and not self.lite else None
-            self.new_plugin_version = self.new_qgis_plugin_version or self.new_icgc_plugin_version
-            t1 = datetime.datetime.now()
-            self.log.info("Plugin updates: %s (%s)" % (self.new_plugin_version, t1-t0))
+    def init_update_resources(self, check_qgis_updates=True, check_icgc_updates=False):
+        """ Plugin updates online resources initialization """
+        # Check plugin update
+        t0 = datetime.datetime.now()
+        self.new_icgc_plugin_version = self.check_plugin_update() if check_icgc_updates else None
+        self.new_qgis_plugin_version = self.metadata.get_qgis_new_version_available() if check_qgis_updates and not self.lite else None
+        self.new_plugin_version = self.new_qgis_plugin_version or self.new_icgc_plugin_version
+        t1 = datetime.datetime.now()
+        self.log.info("Plugin updates: %s (%s)" % (self.new_plugin_version, t1-t0))
 
     def reload_toolbar(self):
         """ Reload QGIS toolbar for plugin when resources are loaded """
@@ -1042,6 +1242,16 @@ class OpenICGC(PluginBase):
         t1 = datetime.datetime.now()
         self.log.info("Full GUI initialization (%s)" % (t1-self.t0))
 
+    def update_toolbar(self):
+        """ Updates QGIS toolbar for plugin in place when resources are loaded (only changed entries are rebuilt) """
+        t0 = datetime.datetime.now()
+        with profiling_resources.span("update_toolbar", "gui"):
+            changes_count = self.gui.update_GUI(self.toolbar, self.get_toolbar_entries())
+            # New menus need to load their online resources on demand too
+            self.connect_menus_resources()
+        t1 = datetime.datetime.now()
+        self.log.info("Update toolbar: %s changes (%s)" % (changes_count, t1-t0))
+
     def init_toolbar(self):
         """ Creates QGIS toolbar for plugin """
 
@@ -1056,7 +1266,55 @@ class OpenICGC(PluginBase):
         self.combobox.setMaxVisibleItems(20)
         self.combobox.activated.connect(self.run) # Press intro and select combo value
 
+        # Suggest place names as you type: queries are sent after a pause in the typing (debounce)
+        # on background and only the results of the last text are shown
+        self.autocomplete_query_id = 0
+        self.autocomplete_future = None
+        self.autocomplete_dict_list = []
+        self.autocomplete_timer = QTimer()
+        self.autocomplete_timer.setSingleShot(True)
+        self.autocomplete_timer.setInterval(self.AUTOCOMPLETE_DELAY)
+        self.autocomplete_timer.timeout.connect(self.on_autocomplete_timeout)
+        self.autocomplete_model = QStringListModel()
+        self.autocomplete_completer = QCompleter(self.autocomplete_model, self.combobox)
+        self.autocomplete_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.autocomplete_completer.setMaxVisibleItems(self.geofinder.autocomplete_size)
+        self.autocomplete_completer.activated[QModelIndex].connect(self.on_autocomplete_activated)
+        self.combobox.setCompleter(self.autocomplete_completer)
+        self.combobox.lineEdit().textEdited.connect(self.on_search_text_edited)
+        self.autocompleteReady.connect(self.on_autocomplete_ready)
+
         # Add new toolbar with plugin options (using pluginbase functions)
+        self.toolbar = self.gui.configure_toolbar(self.tr("Open ICGC Toolbar") + (" lite" if self.lite else ""),
+            self.get_toolbar_entries())
+
+        # Check debug button if debug_mode
+        if self.debug_mode:
+            self.gui.set_check_item("enable_debug_log")
+
+        # Load online resources of each menu on demand
+        self.connect_menus_resources()
+
+        # Get a reference to any actions to an easy update
+        self.download_action = self.gui.find_action("download").defaultWidget().defaultAction() if self.gui.find_action("download") else None  # it is a toolbar menu, it has a subaction...
+        self.time_series_action = self.gui.find_action("time_series")
+        self.geopackage_style_action = self.gui.find_action("geopackage_style")
+        self.photo_search_action = self.gui.find_action("photo_search").defaultWidget().defaultAction() if self.gui.find_action("photo_search") else None
+        self.photo_search_2_action = self.gui.find_action("photo_search_2")
+        self.photo_download_action = self.gui.find_action("photo")
+        self.geocoder_search_action = self.gui.find_action("geocoder_search")
+
+        # Add a tool to download map areas
+        self.tool_subscene = QgsMapToolSubScene(self.iface.mapCanvas())
+
+        # Add a tool to search photograms in photo library (set action to manage check/uncheck tools)
+        self.tool_photo_search = QgsMapToolPhotoSearch(self.iface.mapCanvas(), self.search_photos, self.photo_search_action)
+
+        # Add a tool to search photograms in photo library (set action to manage check/uncheck tools)
+        self.tool_geocoder_search = QgsMapToolPhotoSearch(self.iface.mapCanvas(), lambda x, y:self.find(None, x, y), self.geocoder_search_action)
+
+    def get_toolbar_entries(self):
+        """ Returns plugin toolbar entries (see GuiBase.insert_at_GUI) with current loaded resources """
         style = self.iface.mainWindow().style()
         base_map_callback = lambda layer_name: self.zoom_to_cat_when_empty(self.layers.add_wms_layer( \
             self.BASE_MAP_DICT[layer_name][0], \
@@ -1064,12 +1322,16 @@ class OpenICGC(PluginBase):
             [layer_name], None, "image/png", 25831, self.request_referrer_param, \
             self.BACKGROUND_MAP_GROUP_NAME, only_one_map_on_group=False, set_current=True))
         self.default_map_callback = lambda _checked=False: base_map_callback("topografic") # Used on find call and  layer button
-        self.toolbar = self.gui.configure_toolbar(self.tr("Open ICGC Toolbar") + (" lite" if self.lite else ""), [
+        toolbar_entries_list = [
             self.tr("Find"), # Label text
             self.combobox, # Editable combobox
             (self.tr("Find place names and addresses"),
                 self.run, # GeoFinder
-                "map.png"), # Action button
+                "map.png", True, False, "geofinder", [ # Action button
+                (self.tr("Find place names and addresses"), self.run, "map.png"),
+                "---",
+                (self.tr("Add municipality and county to point layer features"), self.reverse_geocode_layer, "geocoder.png"),
+                ]),
             (self.tr("Find on point"), self.enable_search_geocoder, "geocoder.png", True, True, "geocoder_search"),
             "---",
             (self.tr("Background maps"),
@@ -1796,7 +2058,7 @@ class OpenICGC(PluginBase):
                     ])
             ] if not self.lite else []) + [
             (self.tr("Paint styles for selected layers"), None,
-                "style.png", [
+                "style.png", True, False, "paint_styles", [
                 (self.tr("Transparence"),
                     lambda _checked:self.tools.show_transparency_dialog(self.tr("Transparence"), self.iface.mapCanvas().currentLayer()) if type(self.iface.mapCanvas().currentLayer()) in [QgsRasterLayer, QgsVectorLayer] else None,
                     "transparency.png"),
@@ -1876,19 +2138,28 @@ class OpenICGC(PluginBase):
                 (self.tr("QGIS version warnings"),
                     self.show_qgis_version_warnings,
                     style.standardIcon(QStyle.SP_MessageBoxWarning)),
-            ]))
+            ])
 
         # Add plugin reload and test buttons (debug purpose)
         if not self.lite:
             if self.debug_mode or self.test_list:
-                self.gui.add_to_toolbar(self.toolbar, ["---"])
+                toolbar_entries_list += ["---"]
             if self.debug_mode:
-                self.gui.add_to_toolbar(self.toolbar, [
+                toolbar_entries_list += [
                     (self.tr("Reload Open ICGC"), lambda _checked:self.reload_plugin(),
                         "python.png"),
-                    ])
+                    (self.tr("Resources profiling"), lambda _checked:self.show_resources_profiling(),
+                        "python.png", [
+                            (self.tr("Show resources profiling"), lambda _checked:self.show_resources_profiling(),
+                                "python.png"),
+                            (self.tr("Export resources profiling (JSON)"), lambda _checked:self.export_resources_profiling(),
+                                "python.png"),
+                            (self.tr("Export resources profiling (Chrome trace)"), lambda _checked:self.export_resources_profiling(chrome_trace=True),
+                                "python.png"),
+                        ]),
+                    ]
             if self.test_list:
-                self.gui.add_to_toolbar(self.toolbar, [
+                toolbar_entries_list += [
                     (self.tr("Unit tests"),
                         lambda _checked:self.debug.show_test_plugin(self.tr("Unit tests")),
                         "flask.png", [
@@ -1897,29 +2168,8 @@ class OpenICGC(PluginBase):
                                 "flask.png")
                             for test_name in self.debug.get_test_names()
                         ]),
-                    ])
-
-        # Check debug button if debug_mode
-        if self.debug_mode:
-            self.gui.set_check_item("enable_debug_log")
-
-        # Get a reference to any actions to an easy update
-        self.download_action = self.gui.find_action("download").defaultWidget().defaultAction() if self.gui.find_action("download") else None  # it is a toolbar menu, it has a subaction...
-        self.time_series_action = self.gui.find_action("time_series")
-        self.geopackage_style_action = self.gui.find_action("geopackage_style")
-        self.photo_search_action = self.gui.find_action("photo_search").defaultWidget().defaultAction() if self.gui.find_action("photo_search") else None
-        self.photo_search_2_action = self.gui.find_action("photo_search_2")
-        self.photo_download_action = self.gui.find_action("photo")
-        self.geocoder_search_action = self.gui.find_action("geocoder_search")
-
-        # Add a tool to download map areas
-        self.tool_subscene = QgsMapToolSubScene(self.iface.mapCanvas())
-
-        # Add a tool to search photograms in photo library (set action to manage check/uncheck tools)
-        self.tool_photo_search = QgsMapToolPhotoSearch(self.iface.mapCanvas(), self.search_photos, self.photo_search_action)
-
-        # Add a tool to search photograms in photo library (set action to manage check/uncheck tools)
-        self.tool_geocoder_search = QgsMapToolPhotoSearch(self.iface.mapCanvas(), lambda x, y:self.find(None, x, y), self.geocoder_search_action)
+                    ]
+        return toolbar_entries_list
 
     def get_catalonia_limits(self, filename, buffer=0, segments=10):
         """ Gets Catalonia limits from geojson resource file
@@ -2209,7 +2459,13 @@ class OpenICGC(PluginBase):
     def run(self, _checked=False): # I add checked param, because the mapping of the signal triggered passes a parameter
         """ Basic plugin call, which reads the text of the combobox and the search for the different web services available """
         search_text = self.combobox.currentText()
+        # Discard pending suggestions, the full search is done
+        self.cancel_autocomplete()
         self.find(search_text)
+        self.add_last_search(search_text)
+
+    def add_last_search(self, search_text):
+        """ Sets search text on top of combobox and saves last searches """
         # Set search text on top of combobox
         pos = self.combobox.findText(search_text)
         if pos != 0:
@@ -2220,6 +2476,59 @@ class OpenICGC(PluginBase):
         searches_list = [self.combobox.itemText(i) for i in range(self.combobox.count())][:self.combobox.maxVisibleItems()]
         self.set_setting_value("last_searches", searches_list)
 
+    def on_search_text_edited(self, _text):
+        """ Restarts suggestions timer on each keystroke (the query is sent when user stops typing) """
+        self.autocomplete_timer.start()
+
+    def cancel_autocomplete(self):
+        """ Cancels pending suggestions queries (running queries results will be ignored) """
+        self.autocomplete_timer.stop()
+        self.autocomplete_query_id += 1
+        if self.autocomplete_future:
+            self.autocomplete_future.cancel()
+            self.autocomplete_future = None
+
+    def on_autocomplete_timeout(self):
+        """ Queries search text suggestions on background, cancelling previous texts queries """
+        search_text = self.combobox.currentText()
+        self.cancel_autocomplete()
+        if len(search_text.strip()) < self.geofinder.autocomplete_min_chars:
+            self.autocomplete_completer.popup().hide()
+            return
+        query_id = self.autocomplete_query_id
+        # Repeated prefixes are answered from geofinder cache without network access
+        self.autocomplete_future = self.geofinder.get_executor().submit(
+            lambda: self.autocompleteReady.emit(query_id, self.geofinder.autocomplete(search_text)))
+
+    def on_autocomplete_ready(self, query_id, dict_list):
+        """ Shows search text suggestions received from background (only if they are of the last text) """
+        if query_id != self.autocomplete_query_id:
+            return
+        self.autocomplete_future = None
+        self.autocomplete_dict_list = dict_list
+        self.autocomplete_model.setStringList([("%s (%s)" % (data_dict['nom'], data_dict['nomMunicipi'])) \
+            if data_dict['nomMunicipi'] and data_dict['nomMunicipi'] not in data_dict['nom'] else data_dict['nom'] \
+            for data_dict in dict_list])
+        if dict_list and self.combobox.lineEdit().hasFocus():
+            self.autocomplete_completer.complete()
+        else:
+            self.autocomplete_completer.popup().hide()
+
+    def on_autocomplete_activated(self, index):
+        """ Centers the map on the selected suggestion without doing a full search """
+        if index.row() >= len(self.autocomplete_dict_list):
+            return
+        site_dict = self.autocomplete_dict_list[index.row()]
+        self.cancel_autocomplete()
+        self.combobox.setEditText(site_dict['nom'])
+        # Check loaded map. If we have not maps, we load default map
+        if not self.iface.mapCanvas().layers():
+            self.default_map_callback()
+        # Use the scale configured on the search dialog (None keeps current scale)
+        scale = self.geofinder_dialog.get_scale() if self.geofinder_dialog else 5000
+        self.set_map_point(site_dict['x'], site_dict['y'], site_dict['epsg'], scale)
+        self.add_last_search(site_dict['nom'])
+
     def add_wms_t_layer(self, layer_name, url, layer_id, time, style, image_format, time_series_list=None, time_series_regex=None, epsg=None, extra_tags="", group_name="", group_pos=None, only_one_map_on_group=False, only_one_visible_map_on_group=True, collapsed=True, visible=True, transparency=None, saturation=None, resampling_bilinear=False, resampling_cubic=False, color_default_expansion=False, set_current=False, use_qgis_time_controller=False):
         """ Add WMS-T layer and enable timeseries dialog """
         # Add WMS-T
@@ -2673,9 +2982,10 @@ class OpenICGC(PluginBase):
                         if os.path.splitext(f)[1] == ext]
                     local_filename = local_filename_list[0] if local_filename_list else None
                 else:
-                    # We suppose that compressed file contains a QLR file, this process uncompress downloaded file
+                    # We suppose that compressed file contains a QLR file, its layers are read directly
+                    # from the downloaded file (/vsizip/) without uncompress it
                     download_layer = self.layers.add_remote_layer_definition_file(url, local_filename,
-                        group_name=self.DOWNLOAD_GROUP_NAME, group_pos=0,
+                        group_name=self.DOWNLOAD_GROUP_NAME, group_pos=0, unzip=False,
                         select_folder_text=self.tr("Select download folder"),
                         title=self.tr("Downloading ..."), cancel_button_text=self.tr("Cancel"), time_info=self.tr("Elapsed %s"))
                     if not download_layer:
@@ -3104,6 +3414,29 @@ In versions of QGIS lower than 3.4.0 geopackage files may not load correctly.
 Update your version of qgis if possible.""") % Qgis.QGIS_VERSION,
             self.tr("QGIS version warnings"), LogInfoDialog.mode_warning, width=1000, height=250)
 
+    def show_resources_profiling(self):
+        """ Shows resources profiling table (load times, bytes and cache use per resource) on an information dialog
+            and writes it to plugin log """
+        report = profiling_resources.get_report_table(self.tr("Resources profiling"))
+        if self.debug.timestamps:
+            report += "\n\n" + self.debug.get_timestamps_info()
+        self.log.info("%s", report)
+        dialog = LogInfoDialog(report, self.tr("Resources profiling"), LogInfoDialog.mode_info,
+            save_button_text=self.tr("Save"), copy_clipboard_button_text=self.tr("Copy to clipboard"),
+            autoshow=False, width=1000, height=500)
+        # Report table columns require a fixed width font
+        dialog.plainTextEdit.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        dialog.do_modal()
+
+    def export_resources_profiling(self, chrome_trace=False):
+        """ Exports resources profiling as JSON or Chrome trace format (chrome://tracing, Perfetto) """
+        default_pathname = os.path.join(self.get_download_folder() or "", "%s_profiling%s.json" % (self.plugin_id, ".trace" if chrome_trace else ""))
+        pathname, _filter = QFileDialog.getSaveFileName(
+            self.iface.mainWindow(), self.tr("Resources profiling"), default_pathname, self.tr("JSON file (*.json)"))
+        if not pathname:
+            return None
+        return profiling_resources.to_chrome_trace(pathname) if chrome_trace else profiling_resources.to_json(pathname)
+
     def show_help_file(self, basename):
         """ Show local HTML help file """
         super().show_help(path="docs", basename=basename)
@@ -3147,7 +3480,7 @@ Update your version of qgis if possible.""") % Qgis.QGIS_VERSION,
             remote_url = found.group(1)
             # Read remote help file metadata tag "last-modified"
             try:
-                remote_data = requests.get(remote_url, verify=True, timeout=timeout).text
+                remote_data = session_resources.get_session().get(remote_url, verify=True, timeout=timeout).text
             except:
                 fin = None
             if not fin:
@@ -3174,7 +3507,7 @@ Update your version of qgis if possible.""") % Qgis.QGIS_VERSION,
         # Copy image files of all help files (witout repetitions)
         for local_image_pathname, remote_image_url in sync_images_dict.items():
             try:
-                remote_image_data = requests.get(remote_image_url, verify=True,
+                remote_image_data = session_resources.get_session().get(remote_image_url, verify=True,
                     timeout=timeout).content
             except:
                 fin = None
@@ -3206,7 +3539,7 @@ Update your version of qgis if possible.""") % Qgis.QGIS_VERSION,
         else:
             # Download plugin to gets version
             try:
-                remote_data = requests.get(remote_url, verify=True, \
+                remote_data = session_resources.get_session().get(remote_url, verify=True, \
                     timeout=timeout).text
             except Exception as e:
                 remote_data = None
@@ -3659,8 +3992,171 @@ Update your version of qgis if possible.""") % Qgis.QGIS_VERSION,
             QMessageBox.warning(self.iface.mainWindow(), title, self.tr("Error saving PDF file"))
         return status_ok
 
+    def init_municipalities_index(self):
+        """ Loads local municipalities index from ICGC delimitations (async resource "municipalities") """
+        delimitations_dict = {name: dict(scale_list) for name, scale_list, _style_file in self.delimitations_list}
+        municipalities_index = MunicipalitiesIndex(
+            delimitations_dict["municipis"][50000], delimitations_dict["comarques"][1000000])
+        self.municipalities_index = municipalities_index
+        self.log.info("Municipalities index loaded: %s municipalities", len(municipalities_index))
+
+    def get_municipalities_index(self):
+        """ Returns local municipalities index or None if it is not loaded yet
+            (then it is loaded on background, the download menu also starts its load) """
+        if not self.load_async_resource("municipalities"):
+            return None
+        return self.municipalities_index
+
+    def wait_async_resource(self, name, progress=None):
+        """ Waits (processing events) until an async resource that is loading ends its load,
+            or until progress dialog is canceled. Returns False if canceled """
+        loop = QEventLoop()
+        on_loaded = lambda resource_name: loop.quit() if resource_name == name else None
+        self.resourceLoaded.connect(on_loaded)
+        if progress:
+            progress.dlg.canceled.connect(loop.quit)
+        # Resource signal is emitted after its status change, so if it is still loading we will receive it
+        if self.is_async_resource_loading(name):
+            loop.exec_()
+        self.resourceLoaded.disconnect(on_loaded)
+        return not (progress and progress.was_canceled())
+
+    def reverse_geocode_layer(self, _checked=False, layer=None, grid_size=10, batch_size=1000, max_workers=2):
+        """ Adds municipality and county fields to all features of a point layer (current layer by default).
+            Points are grouped on a grid of grid_size meters (first point of each cell is resolved),
+            resolved with local municipalities polygons and only points outside them are sent to the
+            geocoder (on its own pool of max_workers threads, to not block geofinder searches).
+            Points that can not be transformed keep their attributes empty.
+            Attributes are written in batches of batch_size features """
+        title = self.tr("Municipality and county")
+        if not layer:
+            layer = self.iface.mapCanvas().currentLayer()
+        if type(layer) is not QgsVectorLayer or layer.geometryType() != QgsWkbTypes.PointGeometry:
+            QMessageBox.warning(self.iface.mainWindow(), title, self.tr("You must select a point layer"))
+            return False
+        provider = layer.dataProvider()
+        if not layer.isEditable() and not (provider.capabilities() & QgsVectorDataProvider.ChangeAttributeValues):
+            QMessageBox.warning(self.iface.mainWindow(), title, self.tr("Layer attributes can not be modified"))
+            return False
+
+        t0 = datetime.datetime.now()
+        with ProgressDialog(self.tr("Loading municipalities ..."), 0, title, self.tr("Cancel"), autoclose=False,
+                time_info=self.tr("Elapsed %s. Remaining %s"), parent=self.iface.mainWindow()) as progress:
+            # Wait for local municipalities index (loaded on background)
+            municipalities_index = self.get_municipalities_index()
+            if not municipalities_index:
+                if not self.wait_async_resource("municipalities", progress):
+                    return False
+                municipalities_index = self.get_municipalities_index()
+            epsg = municipalities_index.epsg if municipalities_index else 25831
+
+            # Get features points and transform them all at once to municipalities EPSG
+            progress.set_label(self.tr("Reading points ..."))
+            fids_list, points_list = [], []
+            for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+                geometry = feature.geometry()
+                if geometry and not geometry.isEmpty():
+                    point = geometry.centroid().asPoint()
+                    fids_list.append(feature.id())
+                    points_list.append((point.x(), point.y()))
+            points_list = self.crs.transform_points(points_list, self.layers.get_epsg(layer), epsg)
+
+            # Group near points on grid cells (each cell is resolved only once, with its first point)
+            # Points that can not be transformed have not cell
+            keys_list = [(round(point[0] / grid_size), round(point[1] / grid_size)) if point else None \
+                for point in points_list]
+            cells_dict = {}
+            for key, point in zip(keys_list, points_list):
+                if key:
+                    cells_dict.setdefault(key, point)
+            progress.set_label(self.tr("Searching municipalities ..."))
+            progress.set_steps(len(cells_dict))
+            results_dict = dict.fromkeys(cells_dict, (None, None))
+            if municipalities_index:
+                for i, (key, (x, y)) in enumerate(cells_dict.items()):
+                    results_dict[key] = municipalities_index.find(x, y)
+                    if i % batch_size == 0:
+                        progress.set_value(i)
+                        if progress.was_canceled():
+                            return False
+            # Points outside local municipalities are resolved by the geocoder
+            remote_keys_list = [key for key, (municipality, _county) in results_dict.items() if municipality is None]
+            resolved_count = len(results_dict) - len(remote_keys_list)
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                futures_dict = {executor.submit(self.geofinder.find_point_coordinate_icgc,
+                    *cells_dict[key], epsg, layers="topo1,topo2", search_radious_km=None, size=1): key \
+                    for key in remote_keys_list}
+                pending_set = set(futures_dict)
+                errors_count = 0
+                while pending_set:
+                    done_set, pending_set = wait(pending_set, timeout=0.1, return_when=FIRST_COMPLETED)
+                    for future in done_set:
+                        try:
+                            found_dict_list = future.result()
+                        except Exception as e:
+                            self.log.warning("Reverse geocoding error: %s", e)
+                            found_dict_list = []
+                            errors_count += 1
+                        results_dict[futures_dict[future]] = (found_dict_list[0]['nomMunicipi'], found_dict_list[0]['nomComarca']) \
+                            if found_dict_list else ("", "")
+                    resolved_count += len(done_set)
+                    progress.set_value(resolved_count)
+                    if progress.was_canceled():
+                        for future in pending_set:
+                            future.cancel()
+                        return False
+            finally:
+                executor.shutdown(wait=False)
+
+            # Add fields if required
+            progress.set_label(self.tr("Writing attributes ..."))
+            new_fields_list = [QgsField(field_name, QVariant.String) for field_name in ("municipi", "comarca") \
+                if layer.fields().indexOf(field_name) < 0]
+            if new_fields_list:
+                if layer.isEditable():
+                    for field in new_fields_list:
+                        layer.addAttribute(field)
+                else:
+                    provider.addAttributes(new_fields_list)
+                    layer.updateFields()
+            municipality_index = layer.fields().indexOf("municipi")
+            county_index = layer.fields().indexOf("comarca")
+
+            # Write attributes in batches (on edit buffer if layer is on edit mode)
+            if layer.isEditable():
+                layer.beginEditCommand(title)
+            for start in range(0, len(fids_list), batch_size):
+                changes_dict = {fid: dict(zip((municipality_index, county_index), results_dict[key])) \
+                    for fid, key in zip(fids_list[start:start + batch_size], keys_list[start:start + batch_size]) if key}
+                if layer.isEditable():
+                    for fid, values_dict in changes_dict.items():
+                        layer.changeAttributeValues(fid, values_dict)
+                else:
+                    provider.changeAttributeValues(changes_dict)
+            if layer.isEditable():
+                layer.endEditCommand()
+            else:
+                layer.triggerRepaint()
+            progress.set_value(len(cells_dict))
+        t1 = datetime.datetime.now()
+
+        self.log.info("Reverse geocoded layer %s: %s points (%s not transformed), %s cells, %s geocoder queries, %s errors (%s)",
+            layer.name(), len(fids_list), keys_list.count(None), len(results_dict), len(remote_keys_list), errors_count, t1-t0)
+        message = self.tr("%s points updated (%s locations, %s resolved by the geocoder)") % (
+            len(fids_list), len(results_dict), len(remote_keys_list))
+        self.iface.messageBar().pushMessage(title, message, level=Qgis.Warning if errors_count else Qgis.Info, duration=10)
+        return True
+
     def get_municipality_and_county(self, x, y, epsg):
-        """ Return coodinates municipality and county """
+        """ Return coodinates municipality and county (from local municipalities polygons,
+            only points outside them are sent to the geocoder) """
+        municipalities_index = self.get_municipalities_index()
+        if municipalities_index:
+            index_x, index_y = self.crs.transform_point(x, y, epsg, municipalities_index.epsg)
+            municipality, county = municipalities_index.find(index_x, index_y)
+            if municipality is not None:
+                return municipality, county
         try:
             found_dict_list = self.geofinder.find_point_coordinate_icgc(x, y, epsg, \
                 layers="topo1,topo2", search_radious_km=None, size=1)
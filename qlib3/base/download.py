@@ -13,23 +13,52 @@ bars
 """
 
 from PyQt5 import QtNetwork
-from PyQt5.QtCore import QUrl, QTimer
+from PyQt5.QtCore import QUrl, QTimer, QEventLoop
 from PyQt5.QtWidgets import QApplication
 
 import os
+import re
+import json
+import time
 from importlib import reload
 
 from . import progressdialog
 reload(progressdialog)
 from .progressdialog import ProgressDialog
 
+# Configure internal library logger (Default is dummy logger)
+import logging
+log = logging.getLogger('dummy')
+log.addHandler(logging.NullHandler())
+
 
 class DownloadManager(object):
-    """ Classe per gestionar la descàrregar de fitxers via HTTP
+    """ Classe per gestionar la descàrregar de fitxers via HTTP.
+        Les dades es guarden en un arxiu .part (amb la informació de la descàrrega en un arxiu .part.json)
+        que es reprèn amb peticions HTTP Range si es perd la connexió o es torna a descarregar el mateix fitxer
         ---
-        Class to manage the download of files via HTTP
+        Class to manage the download of files via HTTP.
+        Data is saved on a .part file (with download information on a .part.json file)
+        that is resumed with HTTP Range requests if connection is lost or the same file is downloaded again
         """
 
+    # Reintents de les descàrregues interrompudes i espera del primer reintent (es dobla a cada reintent)
+    max_retries = 3
+    retry_delay_ms = 2000
+    # Temps màxim sense rebre dades abans de considerar perduda la connexió (Qt >= 5.15)
+    transfer_timeout_ms = 60000
+    # Estats HTTP que es poden reintentar (a més dels errors de xarxa i els 5xx)
+    retry_http_status_list = [408, 416, 429]
+    # Màxim de descàrregues simultànies per servidor de les descàrregues de llistes de fitxers
+    # (QNetworkAccessManager obre fins a 6 connexions per servidor)
+    max_host_downloads = 4
+    # Dades que pot acumular cada resposta i mida mínima de cada escriptura a disc (es llegeixen blocs grans
+    # per evitar molts objectes Python i escriptures petites a velocitats altes)
+    read_buffer_size = 8 * 1024 * 1024
+    write_chunk_size = 1024 * 1024
+    # Interval mínim entre actualitzacions del diàleg de progrés (segons)
+    progress_interval = 0.1
+
     def __init__(self):
         """ Inicialització del gestor de descàrregues i diccionari de peticions
             ---
@@ -42,7 +71,8 @@ class DownloadManager(object):
         self.timer.setInterval(1000)
         self.timer.timeout.connect(self.__refresh_progressbar_time__)
 
-        self.queries_dict = {}
+        self.queries_dict = {} # remote_file: query dict (see __start__)
+        self.groups_list = [] # Descàrregues de llistes de fitxers en curs (see download_files)
 
     def download(self, remote_file, local_pathname, synchronous=True, callback=None, title="Downloading ...", cancel_button_text="Cancel", time_info="Elapsed %s"):
         """ Descarrega un fitxer remote, opcionalment es pot indicar:
@@ -59,26 +89,16 @@ class DownloadManager(object):
             - cancel_button_text: progress dialog cancel button text
             - time_info: time information text, for example: "Elapsed %s"
             """
-        # Reservem recursos per la descàrrega i els guadem en un diccionari
-        local_file = open(local_pathname, "wb+")
-        progress = ProgressDialog(os.path.basename(local_pathname), 0, title=title, cancel_button_text=cancel_button_text, time_info=time_info)
-        self.queries_dict[remote_file] = [None, progress, local_file, callback, True, None, None] # 4:running, 5:status_ok, 6:error_msg
-
         # Realitzem la petició de descàrraga al servidor
-        reply = self.manager.get(QtNetwork.QNetworkRequest(QUrl(remote_file)))
-        reply.readyRead.connect(lambda:self.__download_ready__(reply, local_file))
-        reply.downloadProgress.connect(lambda read, total, progress=progress: self.__download_progress__(read, total, progress))
-
-        # Guardem la petició de descàrrega al diccionari de gestió de descàrregues
-        self.queries_dict[remote_file][0] = reply
-        # Inicialitzem el refresc del temps de les progressbar
-        self.timer.start()
+        progress = ProgressDialog(os.path.basename(local_pathname), 0, title=title, cancel_button_text=cancel_button_text, time_info=time_info)
+        self.__start__(remote_file, local_pathname, callback, progress)
 
-        # Si la descàrrega és síncrona, esperem a que acabi
+        # Si la descàrrega és síncrona, esperem a que acabi en un bucle d'events local
+        # (no consumeix CPU, __finish__ el desperta quan acaba la descàrrega, també si es cancel·la)
         if synchronous:
-            while self.is_downloading(remote_file):
-                if progress.was_canceled():
-                    reply.abort()
+            if self.is_downloading(remote_file):
+                self.queries_dict[remote_file]["loop"] = QEventLoop()
+                self.queries_dict[remote_file]["loop"].exec_()
             # Recuperem com ha acabat el procés
             status_ok, error_msg = self.get_status(remote_file)
             # Netejem el diccionari de descàrregues
@@ -87,67 +107,468 @@ class DownloadManager(object):
             if not status_ok:
                 raise Exception(error_msg)
 
-    def __download_ready__(self, reply, local_file):
+    def download_files(self, files_list, callback=None, max_host_downloads=None, title="Downloading ...", cancel_button_text="Cancel", time_info="Elapsed %s", raise_errors=False):
+        """ Descarrega una llista de fitxers remots en paral·lel i espera a que acabin, amb un únic diàleg de progrés.
+            - files_list: llista de [(remote_file, local_pathname), ...] o [(remote_file, local_pathname, priority), ...]
+              (es descarreguen primer els de prioritat més baixa)
+            - callback: funció a executar al acabar cada descàrrega (se li passa el fitxer remot i el path
+              del fitxer descarregat o None si ha fallat)
+            - max_host_downloads: màxim de descàrregues simultànies per servidor (per defecte max_host_downloads)
+            - title, cancel_button_text, time_info: veure download
+            - raise_errors: en acabar totes les descàrregues, llença una excepció amb els errors de cada fitxer
+              (descàrregues o callbacks fallats) si n'hi ha
+            Retorna: llista de paths descarregats (o None si ha fallat) en l'ordre de files_list
+            ---
+            Downloads a list of remote files in parallel and waits for them, with a single progress dialog.
+            - files_list: list of [(remote_file, local_pathname), ...] or [(remote_file, local_pathname, priority), ...]
+              (lowest priority files are downloaded first)
+            - callback: function to execute when each download finish (function receives remote file and
+              downloaded file pathname or None if it failed)
+            - max_host_downloads: max simultaneous downloads by server (default max_host_downloads)
+            - title, cancel_button_text, time_info: see download
+            - raise_errors: when all downloads are finished, raises an exception with the errors of each file
+              (failed downloads or callbacks) if any
+            Returns: list of downloaded pathnames (or None if it failed) in files_list order
+            """
+        # Fitxers a descarregar (sense repetits) ordenats per prioritat
+        files_dict = {}
+        for file_info in files_list:
+            files_dict.setdefault(file_info[0], file_info)
+        group = {
+            "pending": sorted(files_dict.values(), key=lambda file_info: file_info[2] if len(file_info) > 2 else 0),
+            "results": {}, # remote_file: local_pathname o None
+            "errors": {}, # remote_file: missatge d'error de la descàrrega o del callback
+            "count": len(files_dict),
+            "callback": callback,
+            "max_host_downloads": max_host_downloads or self.max_host_downloads,
+            "canceled": False,
+            "progress": ProgressDialog(os.path.basename(files_list[0][1]) if files_list else "", len(files_dict),
+                title=title, cancel_button_text=cancel_button_text, time_info=time_info),
+            "loop": QEventLoop(),
+            }
+        group["progress"].dlg.canceled.connect(lambda: self.__cancel_group__(group))
+        self.groups_list.append(group)
+        self.timer.start()
+
+        # Iniciem les primeres descàrregues i esperem (cada descàrrega finalitzada inicia les pendents)
+        self.__schedule__(group)
+        if len(group["results"]) < group["count"]:
+            group["loop"].exec_()
+
+        # Alliberem recursos
+        self.groups_list.remove(group)
+        group["progress"].close()
+        self.check_stop_timer()
+        for remote_file in files_dict.keys():
+            if remote_file in self.queries_dict and not self.is_downloading(remote_file):
+                self.remove(remote_file)
+        if group["canceled"]:
+            raise Exception("Operation canceled")
+        if raise_errors and group["errors"]:
+            raise Exception("\n".join("%s: %s" % (remote_file, error_msg) for remote_file, error_msg in group["errors"].items()))
+        return [group["results"].get(file_info[0]) for file_info in files_list]
+
+    def __schedule__(self, group):
+        """ Inicia les descàrregues pendents d'una llista de fitxers respectant el màxim de descàrregues per servidor
+            ---
+            Starts pending downloads of a files list respecting max downloads by server
+            """
+        for file_info in list(group["pending"]):
+            # Una descàrrega que acaba a l'iniciar-se pot haver iniciat ja les següents
+            if file_info not in group["pending"]:
+                continue
+            remote_file, local_pathname = file_info[:2]
+            if self.get_host_downloads(QUrl(remote_file).host()) < group["max_host_downloads"]:
+                group["pending"].remove(file_info)
+                self.__start__(remote_file, local_pathname, group=group)
+
+    def __group_download_finished__(self, group, remote_file):
+        """ Registra una descàrrega finalitzada d'una llista de fitxers, n'inicia de noves i
+            desperta l'espera quan han acabat totes
+            ---
+            Registers a finished download of a files list, starts new ones and
+            wakes up the wait when all of them are finished
+            """
+        query = self.queries_dict[remote_file]
+        local_pathname = query["local_pathname"] if query["status_ok"] else None
+        group["results"][remote_file] = local_pathname
+        if not query["status_ok"] and not group["canceled"]:
+            group["errors"][remote_file] = query["error_msg"]
+        if not group["canceled"]:
+            # Iniciem les descàrregues pendents abans de processar el fitxer
+            self.__schedule__(group)
+            group["progress"].set_label(os.path.basename(query["local_pathname"]))
+            group["progress"].set_value(len(group["results"]))
+            # Processem el fitxer mentre es descarreguen els altres
+            # (estem dins d'un event de Qt, un error no pot aturar l'espera de la llista)
+            if group["callback"]:
+                try:
+                    group["callback"](remote_file, local_pathname)
+                except Exception as e:
+                    log.warning("Download callback error (%s): %s", e, remote_file)
+                    group["errors"][remote_file] = str(e)
+        if len(group["results"]) == group["count"]:
+            group["loop"].quit()
+
+    def __cancel_group__(self, group):
+        """ Cancel·la les descàrregues d'una llista de fitxers
+            ---
+            Cancels downloads of a files list
+            """
+        group["canceled"] = True
+        for file_info in group["pending"]:
+            group["results"][file_info[0]] = None
+        group["pending"] = []
+        for remote_file, query in list(self.queries_dict.items()):
+            if query["group"] is group:
+                self.cancel(remote_file)
+        if len(group["results"]) == group["count"]:
+            group["loop"].quit()
+
+    def get_host_downloads(self, host):
+        """ Retorna el nombre de descàrregues en curs d'un servidor
+            ---
+            Returns number of running downloads of a server
+            """
+        return len([query for query in self.queries_dict.values() if query["running"] and query["host"] == host])
+
+    def __start__(self, remote_file, local_pathname, callback=None, progress=None, group=None):
+        """ Registra i inicia una descàrrega, amb un diàleg de progrés propi o formant part d'una llista de fitxers
+            ---
+            Registers and starts a download, with its own progress dialog or as part of a files list
+            """
+        # Reservem recursos per la descàrrega i els guadem en un diccionari
+        self.queries_dict[remote_file] = {
+            "reply": None,
+            "progress": progress,
+            "group": group,
+            "host": QUrl(remote_file).host(),
+            "local_pathname": local_pathname,
+            "local_file": None,
+            "callback": callback,
+            "running": True,
+            "status_ok": None,
+            "error_msg": None,
+            "offset": 0, # Bytes ja descarregats a l'arxiu .part al fer la petició
+            "size": None, # Mida total del fitxer (si el servidor la informa)
+            "validator": None, # ETag o Last-Modified del fitxer (per reprendre amb If-Range)
+            "retries": 0,
+            "canceled": False,
+            "error_data": None, # Informe d'error del servidor
+            "loop": None, # Bucle d'events de les descàrregues síncrones
+            "progress_time": 0, # Instant de l'última actualització del diàleg de progrés
+            }
+        # Cancel·lar el diàleg avorta la petició (la finalització es gestiona a __download_finished__)
+        if progress:
+            progress.dlg.canceled.connect(lambda: self.cancel(remote_file))
+        # Inicialitzem el refresc del temps de les progressbar
+        self.timer.start()
+
+        self.__request__(remote_file)
+
+    @staticmethod
+    def get_part_info(local_pathname):
+        """ Retorna la informació d'una descàrrega parcial: {"url", "size", "validator"} o {} si no n'hi ha
+            ---
+            Returns partial download information: {"url", "size", "validator"} or {} if it not exists
+            """
+        try:
+            with open(local_pathname + ".part.json", "r", encoding="utf-8") as info_file:
+                return json.load(info_file)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def get_resume_info(cls, local_pathname, remote_file):
+        """ Retorna la informació per reprendre la descàrrega d'un fitxer remot: (offset, size, validator)
+            (offset 0 si no hi ha una descàrrega parcial del mateix fitxer remot)
+            ---
+            Returns information to resume the download of a remote file: (offset, size, validator)
+            (offset 0 if there is not a partial download of the same remote file)
+            """
+        part_pathname = local_pathname + ".part"
+        part_info_dict = cls.get_part_info(local_pathname)
+        offset = os.path.getsize(part_pathname) if os.path.exists(part_pathname) and part_info_dict.get("url") == remote_file else 0
+        if not offset:
+            return 0, None, None
+        return offset, part_info_dict.get("size"), part_info_dict.get("validator")
+
+    @staticmethod
+    def parse_content_range(content_range):
+        """ Analitza una capçalera Content-Range d'una resposta parcial (bytes <inici>-<final>/<total o *>)
+            Retorna: (inici, total o None si és desconegut) o None si no és vàlida
+            ---
+            Parses a Content-Range header of a partial response (bytes <start>-<end>/<total or *>)
+            Returns: (start, total or None if it is unknown) or None if it is not valid
+            """
+        match = re.match(r"bytes\s+(\d+)-\d+/(\d+|\*)", content_range)
+        if not match:
+            return None
+        return int(match.group(1)), int(match.group(2)) if match.group(2) != "*" else None
+
+    @staticmethod
+    def remove_part(local_pathname):
+        """ Esborra els arxius d'una descàrrega parcial
+            ---
+            Removes partial download files
+            """
+        for pathname in (local_pathname + ".part", local_pathname + ".part.json"):
+            if os.path.exists(pathname):
+                os.remove(pathname)
+
+    def __request__(self, remote_file):
+        """ Fa la petició de descàrrega, reprenent-la des del final de l'arxiu .part si és del mateix fitxer remot
+            ---
+            Makes the download request, resuming it from the end of .part file if it is of the same remote file
+            """
+        query = self.queries_dict.get(remote_file)
+        if not query or query["canceled"]:
+            return
+        local_pathname = query["local_pathname"]
+        part_pathname = local_pathname + ".part"
+        offset, query["size"], query["validator"] = self.get_resume_info(local_pathname, remote_file)
+        query["offset"] = offset
+        query["error_data"] = None
+        try:
+            query["local_file"] = open(part_pathname, "ab" if offset else "wb")
+        except OSError as e:
+            # Aquesta funció s'executa des d'events (reintents), finalitzem amb error per no bloquejar l'espera
+            self.__finish__(remote_file, False, str(e))
+            return
+
+        # Si l'arxiu parcial ja és complet no cal descarregar res
+        if offset and offset == query["size"]:
+            log.info("Download already completed: %s", local_pathname)
+            self.__finish__(remote_file, True, None)
+            return
+
+        request = QtNetwork.QNetworkRequest(QUrl(remote_file))
+        if offset:
+            log.info("Resuming download from byte %s: %s", offset, remote_file)
+            request.setRawHeader(b"Range", b"bytes=%d-" % offset)
+            # Si el fitxer ha canviat el servidor el retornarà sencer
+            if query["validator"]:
+                request.setRawHeader(b"If-Range", query["validator"].encode())
+        if hasattr(request, "setTransferTimeout"):
+            request.setTransferTimeout(self.transfer_timeout_ms)
+        reply = self.manager.get(request)
+        reply.setReadBufferSize(self.read_buffer_size)
+        reply.setProperty("download_key", remote_file)
+        reply.metaDataChanged.connect(lambda: self.__download_headers__(reply, query))
+        reply.readyRead.connect(lambda: self.__download_ready__(reply, query))
+        reply.downloadProgress.connect(lambda read, total: self.__download_progress__(read, total, query))
+        # Guardem la petició de descàrrega al diccionari de gestió de descàrregues
+        query["reply"] = reply
+
+    def __download_headers__(self, reply, query):
+        """ Event de capçaleres rebudes, que comprova si el servidor reprèn la descàrrega i guarda la informació
+            de la descàrrega parcial
+            ---
+            Headers received event, that checks if server resumes the download and saves partial download information
+            """
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if status == 206:
+            content_range = self.parse_content_range(bytes(reply.rawHeader(b"Content-Range")).decode())
+            if not content_range or content_range[0] != query["offset"]:
+                # Resposta parcial que no continua l'arxiu, tornarem a començar
+                query["error_data"] = bytearray()
+                query["offset"] = -1
+                reply.abort()
+                return
+            size = content_range[1]
+        elif status == 200:
+            # El servidor no suporta Range o el fitxer ha canviat, comencem de nou
+            if query["offset"]:
+                log.info("Server returns full file, restarting download: %s", query["local_pathname"])
+                query["local_file"].seek(0)
+                query["local_file"].truncate()
+                query["offset"] = 0
+            size = reply.header(QtNetwork.QNetworkRequest.ContentLengthHeader)
+        else:
+            # Resposta d'error, les dades són un informe del servidor
+            query["error_data"] = bytearray()
+            return
+        if reply.rawHeader(b"Content-Encoding"):
+            # Les dades comprimides en la transferència no es poden reprendre ni comprovar
+            if os.path.exists(query["local_pathname"] + ".part.json"):
+                os.remove(query["local_pathname"] + ".part.json")
+            query["size"] = None
+            return
+        validator = bytes(reply.rawHeader(b"ETag") or reply.rawHeader(b"Last-Modified")).decode() or None
+        query["size"] = size
+        query["validator"] = validator
+        with open(query["local_pathname"] + ".part.json", "w", encoding="utf-8") as info_file:
+            json.dump({"url": reply.property("download_key"), "size": size, "validator": validator}, info_file)
+
+    def __download_ready__(self, reply, query, flush=False):
         """ Event de dades disponibles que llegeix i escriu les dades en el fitxer de sortida
+            en blocs de write_chunk_size (flush: escriu les dades pendents)
             ---
             Data ready event that read and write data in output file
+            in write_chunk_size blocks (flush: writes pending data)
             """
         ##print("Ready")
+        # Les dades queden al buffer de la resposta fins tenir un bloc sencer
+        if not flush and reply.bytesAvailable() < self.write_chunk_size:
+            return
+        # PyQt no permet llegir sobre un buffer reutilitzable (read(n) també crea un objecte nou),
+        # però llegint blocs sencers només fem una reserva de memòria per bloc
         data = reply.readAll()
-        local_file.write(data)
+        if query["error_data"] is None:
+            query["local_file"].write(data)
+        else:
+            query["error_data"] += bytes(data)
 
-    def __download_progress__(self, read, total, progress):
+    def __download_progress__(self, read, total, query):
         """ Event de lectura que actualitza la barra de progrés
             ---
             Read event that update progress bar
             """
         #print("%s / %s" % (read, total))
-        progress.set_steps(total)
-        progress.set_value(read)
+        if not query["progress"]:
+            return
+        # Limitem el refresc del diàleg (cada actualització processa els events pendents)
+        now = time.perf_counter()
+        if now - query["progress_time"] < self.progress_interval and read != total:
+            return
+        query["progress_time"] = now
+        offset = max(0, query["offset"])
+        query["progress"].set_steps(offset + total if total > 0 else total)
+        query["progress"].set_value(offset + read)
 
     def __download_finished__(self, reply, debug=True):
-        """ Event de descàrrega finalitzada, que allibera recursos
+        """ Event de petició finalitzada, que reintenta la descàrrega si s'ha interromput o la finalitza
             ---
-            Download finished event that free resources
+            Request finished event, that retries the download if it has been interrupted or finishes it
             """
         ##print("Finished!")
-        download_key = reply.request().url().url()
-        _reply, progress, local_file, callback, running, status_ok, error_msg = self.queries_dict[download_key]
-        filename = local_file.name
-        status_ok = (reply.error() == QtNetwork.QNetworkReply.NoError)
+        download_key = reply.property("download_key")
+        query = self.queries_dict.get(download_key)
+        if not query or query["reply"] is not reply:
+            return
+        self.__download_ready__(reply, query, flush=True)
+        query["local_file"].close()
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        part_pathname = query["local_pathname"] + ".part"
+
+        # Obtenim com ha acabat la petició
+        if query["canceled"]:
+            self.__finish__(download_key, False, reply.errorString(), debug)
+            return
+        if reply.error() == QtNetwork.QNetworkReply.NoError:
+            # Comprovem que tenim el fitxer sencer
+            part_size = os.path.getsize(part_pathname)
+            if query["size"] is None or part_size == query["size"]:
+                self.__finish__(download_key, True, None, debug)
+                return
+            error_msg = "Incomplete download %s of %s bytes" % (part_size, query["size"])
+            retry = True
+        else:
+            error_msg = reply.errorString()
+            # Errors de xarxa (amb o sense capçaleres rebudes) o errors temporals del servidor
+            retry = status is None or status < 400 or status >= 500 or status in self.retry_http_status_list
+        # Si el rang no és vàlid descartem l'arxiu parcial
+        if status == 416 or query["offset"] < 0:
+            self.remove_part(query["local_pathname"])
+
+        # Reintentem la descàrrega (amb espera creixent) des d'on s'ha quedat
+        # (si la petició ha avançat, els reintents tornen a començar)
+        if os.path.exists(part_pathname) and os.path.getsize(part_pathname) > max(0, query["offset"]):
+            query["retries"] = 0
+        if retry and query["retries"] < self.max_retries:
+            query["retries"] += 1
+            delay_ms = self.retry_delay_ms * 2 ** (query["retries"] - 1)
+            log.warning("Download error (%s), retry %s/%s in %s ms: %s", error_msg, query["retries"], self.max_retries, delay_ms, download_key)
+            QTimer.singleShot(delay_ms, lambda: self.__request__(download_key))
+            return
+        self.__finish__(download_key, False, error_msg, debug)
+
+    def __finish__(self, remote_file, status_ok, error_msg, debug=True):
+        """ Finalitza la descàrrega i allibera recursos
+            ---
+            Finishes the download and free resources
+            """
+        query = self.queries_dict[remote_file]
+        local_pathname = query["local_pathname"]
+        filename = local_pathname
 
         # Alliberem recursos
-        local_file.close()
-        progress.close()
+        if query["local_file"]:
+            query["local_file"].close()
+        if query["progress"]:
+            query["progress"].close()
         self.check_stop_timer()
 
-        # Obtenim com ha acabat la descàrrega
-        if not status_ok:
-            error_msg = reply.errorString()
-            # Si és un error, ha quedat guardar un informe HTML en el fitxer que hem guardat
-            if os.path.getsize(filename) > 0:
-                os.rename(filename, filename + ".html")
-                filename += ".html"
-                if debug:
-                    os.startfile(filename) # $$$ Problemes fora de windows
-            # Si hem cancel·lat, el fitxer queda a 0 i no cal guardar-lo
-            elif os.path.exists(filename):
-                os.remove(filename)
-        elif callback:
-            callback(filename)
+        # Estem dins d'un event de Qt, qualsevol error (p.ex. arxiu bloquejat a Windows) ha de finalitzar
+        # la descàrrega amb error, si no l'espera de les descàrregues síncrones no acabaria mai
+        try:
+            if status_ok:
+                # L'arxiu parcial passa a ser el definitiu
+                os.replace(local_pathname + ".part", local_pathname)
+                self.remove_part(local_pathname)
+        except Exception as e:
+            status_ok, error_msg = False, str(e)
+        try:
+            if status_ok:
+                if query["callback"]:
+                    query["callback"](filename)
+            else:
+                log.warning("Download error (%s): %s", error_msg, remote_file)
+                # Si és un error del servidor, guardem el seu informe HTML
+                if query["error_data"]:
+                    filename += ".html"
+                    with open(filename, "wb") as error_file:
+                        error_file.write(query["error_data"])
+                    if debug and hasattr(os, "startfile"):
+                        os.startfile(filename) # $$$ Problemes fora de windows
+                # Si hem cancel·lat o no tenim dades no cal guardar l'arxiu parcial,
+                # si no es mantindrà per reprendre'l més endavant
+                if query["canceled"] or not self.get_part_info(local_pathname) \
+                        or not os.path.exists(local_pathname + ".part") or not os.path.getsize(local_pathname + ".part"):
+                    self.remove_part(local_pathname)
+        except Exception as e:
+            log.warning("Download finalization error (%s): %s", e, remote_file)
+            if status_ok:
+                status_ok, error_msg = False, str(e)
 
         # Canviem l'estat de la petició
-        self.queries_dict[download_key] = (reply, progress, local_file, callback, False, status_ok, error_msg)
+        query["running"] = False
+        query["status_ok"] = status_ok
+        query["error_msg"] = error_msg
+        if query["loop"]:
+            query["loop"].quit()
+        if query["group"]:
+            self.__group_download_finished__(query["group"], remote_file)
+
+    def cancel(self, remote_file):
+        """ Cancel·la una descàrrega
+            ---
+            Cancels a download
+            """
+        query = self.queries_dict.get(remote_file)
+        if not query or not query["running"]:
+            return
+        query["canceled"] = True
+        if query["reply"] and query["reply"].isRunning():
+            query["reply"].abort()
+        else:
+            # Esperant un reintent
+            self.__finish__(remote_file, False, "Operation canceled")
 
     def __refresh_progressbar_time__(self):
-        for reply, progress, local_file, callback, running, status_ok, error_msg in self.queries_dict.values():
-            if running and progress and progress.is_visible():
-                progress.update_time()
+        for query in self.queries_dict.values():
+            if query["running"] and query["progress"] and query["progress"].is_visible():
+                query["progress"].update_time()
+        for group in self.groups_list:
+            if group["progress"].is_visible():
+                group["progress"].update_time()
 
     def check_stop_timer(self):
-        for reply, progress, local_file, callback, running, status_ok, error_msg in self.queries_dict.values():
-            if running and progress and progress.is_visible():
+        for query in self.queries_dict.values():
+            if query["running"] and query["progress"] and query["progress"].is_visible():
                 return
+        if self.groups_list:
+            return
         self.timer.stop()
 
     def is_downloading(self, remote_file):
@@ -155,16 +576,15 @@ class DownloadManager(object):
             ---
             Return if remote file is downloading
             """
-        _reply, _progress, _local_file, _callback, running, _status_ok, _error_msg = self.queries_dict[remote_file]
-        return running
+        return self.queries_dict[remote_file]["running"]
 
     def get_status(self, remote_file):
         """ Retorna l'estat (booleà) del fitxer a descarregar i missatge d'error si hi ha
             ---
             Return remote file status (bool) and error message if exist
             """
-        _reply, _progress, _local_file, _callback, _running, status_ok, error_msg = self.queries_dict[remote_file]
-        return status_ok, error_msg
+        query = self.queries_dict[remote_file]
+        return query["status_ok"], query["error_msg"]
 
     def remove(self, remote_file):
         """ Esborrar el registre del fitxer descarregat del diccionari intern
@@ -178,7 +598,7 @@ class DownloadManager(object):
             ---
             Remove finished downloads from internal dictionary
             """
-        remove_list = [remote_file for remote_file, (_reply, _progress, _local_file, _callback, running, _status_ok, _error_msg) in self.queries_dict.items() if not running]
+        remove_list = [remote_file for remote_file, query in self.queries_dict.items() if not query["running"]]
         for remote_file in remove_list:
             self.remove(remote_file)
 
@@ -17,6 +17,8 @@ additional pre-programmed tools
 import os
 import sys
 import glob
+import math
+import posixpath
 import re
 import random
 import console
@@ -31,6 +33,8 @@ import zipfile
 import io
 import tempfile
 import shutil
+import difflib
+import collections
 import lxml.etree
 import requests
 from urllib.parse import quote, unquote
@@ -57,7 +61,7 @@ from qgis.core import QgsLayerTreeLayer, QgsLayerDefinition, QgsReadWriteContext
 from qgis.core import QgsRendererCategory, QgsCategorizedSymbolRenderer, QgsRendererRange, QgsGraduatedSymbolRenderer, QgsRenderContext, QgsRendererRangeLabelFormat
 from qgis.core import QgsSymbol, QgsMarkerSymbol, QgsFillSymbol, QgsBilinearRasterResampler, QgsCubicRasterResampler, QgsSimpleLineSymbolLayer
 from qgis.core import QgsEditorWidgetSetup, QgsPrintLayout, QgsSpatialIndex, QgsFeatureRequest, QgsMapLayer, QgsField, QgsVectorFileWriter
-from qgis.core import QgsLayoutExporter, QgsFields, Qgis, QgsExpression, QgsDateTimeRange
+from qgis.core import QgsLayoutExporter, QgsFields, Qgis, QgsExpression, QgsDateTimeRange, QgsCsException
 from qgis.utils import plugins, reloadPlugin, showPluginHelp
 
 from . import resources_rc
@@ -154,18 +158,21 @@ class AsyncWorker(QObject):
         - callback: procediment a executar
         - signal: opcional, signal a emetre a l'acabar
         - finished_callback(AsyncWorker): opcional, procediment a executar a l'acabar amb paràmetre AsyncWorker
+        - signal_params: opcional, tupla de paràmetres a enviar amb el signal
         ---
         Class to execute async processes and send signal to end
         Parameters:
         - callback: procedure to execute
         - signal: optional, signal to emit at end
         - finished_callback(AsyncWorker): opcional, procedure to execute at end wiht AsyncWorker paràmeter
+        - signal_params: optional, tuple of parameters to send with signal
         """
-    def __init__(self, callback, signal=None, finished_callback=None):
+    def __init__(self, callback, signal=None, finished_callback=None, signal_params=()):
         super().__init__()
         # Store function and signal to call
         self.callback = callback
         self.signal = signal
+        self.signal_params = signal_params
         self.finished_callback = finished_callback
         # Starts a thread to run async function
         self.thread = QThread()
@@ -178,7 +185,7 @@ class AsyncWorker(QObject):
         self.callback()
         # Execute signal
         if self.signal:
-            self.signal.emit()
+            self.signal.emit(*self.signal_params)
         # Execute finish_callback with self (AsyncWorker) paràmeter
         if self.finished_callback:
             self.finished_callback(self)
@@ -228,6 +235,7 @@ class GuiBase(object):
                 push_button.setFixedSize(QSize(icon_size, icon_size))
                 if button_callback:
                     push_button.released.connect(button_callback)
+                push_button.callback = button_callback # Per poder-lo substituir (veure GuiBase.update_GUI)
                 self.push_button_list.append(push_button)
 
             # Create layout with all elements defining margin and spacing
@@ -452,6 +460,8 @@ class GuiBase(object):
                     action.triggered.connect(callback)
                 if toggle_callback:
                     action.toggled.connect(toggle_callback)
+                # Guardem els callbacks per poder-los substituir (veure update_GUI)
+                action.callbacks = (callback, toggle_callback)
                 if not subentries_list:
                     # Menú "normal"
                     if ref_action:
@@ -485,6 +495,7 @@ class GuiBase(object):
                         button_action.setObjectName(id)
                     if toggle_callback:
                         button_action.toggled.connect(toggle_callback)
+                    button_action.callbacks = (callback, toggle_callback)
                     action = button_action
                 else:
                     # Submenú
@@ -538,6 +549,174 @@ class GuiBase(object):
             #Ens guardem els items de menu o toolbar, si no no apareix...
             self.actions.append((menu_or_toolbar, action))
 
+    def update_GUI(self, menu_or_toolbar, names_callbacks):
+        """ Actualitza in situ els items d'un menu o toolbar a partir d'una nova llista d'entrades. Veure funció: __parse_entry
+            Compara les entrades existents amb les noves i només esborra o insereix les que han canviat.
+            Les entrades iguals conserven els seus objectes Qt però se'ls actualitza callbacks, icona i estat
+            Retorna: nombre d'items esborrats + inserits
+            ---
+            Updates in place menu or toolbar items from a new entries list. See function: __parse_entry
+            Compares existing entries with new ones and only removes or inserts changed entries.
+            Equal entries keep their Qt objects but their callbacks, icon and status are updated
+            Returns: count of removed + inserted items
+            """
+        # Ignorem les entrades a None (com a insert_at_GUI)
+        names_callbacks = [entry for entry in names_callbacks if entry is not None]
+        parsed_entries_list = [self.__parse_entry(entry) for entry in names_callbacks]
+        actions_list = menu_or_toolbar.actions()
+
+        # Comparem les claus de les accions existents amb les de les noves entrades
+        old_keys_list = [self.__get_action_key(action) for action in actions_list]
+        new_keys_list = [self.__get_entry_key(parsed_entry) for parsed_entry in parsed_entries_list]
+        matcher = difflib.SequenceMatcher(None, old_keys_list, new_keys_list, autojunk=False)
+
+        # Apliquem els canvis del final cap al principi perquè les posicions pendents continuïn sent vàlides
+        changes_count = 0
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == "equal":
+                for action, parsed_entry in zip(actions_list[i1:i2], parsed_entries_list[j1:j2]):
+                    changes_count += self.__update_action(action, parsed_entry)
+            else:
+                self.__remove_actions(menu_or_toolbar, actions_list[i1:i2])
+                self.insert_at_GUI(menu_or_toolbar, i1, names_callbacks[j1:j2])
+                changes_count += (i2 - i1) + (j2 - j1)
+        return changes_count
+
+    def update_submenu(self, id, names_callbacks):
+        """ Actualitza in situ els items d'un submenú a partir del seu id. Veure funció: update_GUI
+            Retorna: nombre d'items esborrats + inserits o None si no es troba el submenú
+            ---
+            Updates in place submenu items from its id. See function: update_GUI
+            Returns: count of removed + inserted items or None if submenu is not found
+            """
+        action = self.find_action(id)
+        submenu = self.__get_action_submenu(action) if action else None
+        if not submenu:
+            return None
+        return self.update_GUI(submenu, names_callbacks)
+
+    def __get_action_submenu(self, action):
+        """ Retorna el submenú d'una acció (els submenús de toolbar són QToolButtons amb menú) o None
+            ---
+            Returns action submenu (toolbar submenus are QToolButtons with menu) or None
+            """
+        widget = action.defaultWidget() if type(action) == QWidgetAction else None
+        return widget.menu() if type(widget) == QToolButton else action.menu()
+
+    def __get_action_key(self, action):
+        """ Retorna la clau de comparació d'una acció existent (equivalent a __get_entry_key)
+            ---
+            Returns comparison key of an existing action (equivalent to __get_entry_key)
+            """
+        if action.isSeparator():
+            return ("---",)
+        widget = action.defaultWidget() if type(action) == QWidgetAction else None
+        if type(widget) == QLabel:
+            return ("label", widget.text())
+        if type(widget) == QToolButton and widget.defaultAction():
+            return ("action", widget.defaultAction().text(), action.objectName(), True)
+        if type(widget) == self.MenuItemWidget:
+            return ("buttons", widget.text(), action.objectName(), len(widget.push_button_list))
+        if widget:
+            return ("control", id(widget))
+        return ("action", action.text(), action.objectName(), action.menu() is not None)
+
+    def __get_entry_key(self, parsed_entry):
+        """ Retorna la clau de comparació d'una entrada de menú ja parsejada (veure __parse_entry)
+            ---
+            Returns comparison key of a parsed menu entry (see __parse_entry)
+            """
+        eseparator, elabel, eaction, econtrol, name, _callback, _toggle_callback, _icon, _enabled, _checkable, entry_id, _tooltip, subentries_list, subentries_as_buttons = parsed_entry
+        if eseparator != None:
+            return ("---",)
+        if elabel != None:
+            return ("label", " " + elabel + " ")
+        if eaction != None:
+            return self.__get_action_key(eaction)
+        if econtrol != None:
+            return ("control", id(econtrol))
+        if subentries_list and subentries_as_buttons:
+            return ("buttons", name, entry_id or "", len(subentries_list))
+        return ("action", name, entry_id or "", bool(subentries_list))
+
+    def __replace_callback(self, signal, old_callback, new_callback):
+        """ Substitueix el callback connectat a un signal
+            ---
+            Replaces the callback connected to a signal
+            """
+        if old_callback:
+            try:
+                signal.disconnect(old_callback)
+            except TypeError:
+                pass
+        if new_callback:
+            signal.connect(new_callback)
+
+    def __update_action(self, action, parsed_entry):
+        """ Actualitza callbacks, icona, estat i submenú d'una acció existent equivalent a una entrada
+            Retorna: nombre d'items del submenú esborrats + inserits
+            ---
+            Updates callbacks, icon, status and submenu of an existing action equivalent to an entry
+            Returns: count of submenu removed + inserted items
+            """
+        eseparator, elabel, eaction, econtrol, _name, callback, toggle_callback, icon, enabled, _checkable, _id, tooltip, subentries_list, subentries_as_buttons = parsed_entry
+        if eseparator != None or elabel != None or eaction != None or econtrol != None:
+            return 0
+
+        # Menú amb botons a la dreta
+        widget = action.defaultWidget() if type(action) == QWidgetAction else None
+        if type(widget) == self.MenuItemWidget:
+            for push_button, parsed_subentry in zip(widget.push_button_list, [self.__parse_entry(subentry) for subentry in subentries_list]):
+                self.__replace_callback(push_button.released, push_button.callback, parsed_subentry[5])
+                push_button.callback = parsed_subentry[5]
+            self.__replace_callback(action.triggered, getattr(action, "callbacks", (None, None))[0], callback)
+            action.callbacks = (callback, toggle_callback)
+            return 0
+
+        # Els submenús de toolbar són QToolButtons amb una acció per defecte
+        default_action = widget.defaultAction() if type(widget) == QToolButton else action
+        old_callback, old_toggle_callback = getattr(default_action, "callbacks", (None, None))
+        self.__replace_callback(default_action.triggered, old_callback, callback)
+        self.__replace_callback(default_action.toggled, old_toggle_callback, toggle_callback)
+        default_action.callbacks = (callback, toggle_callback)
+        if icon:
+            default_action.setIcon(icon)
+        if tooltip:
+            default_action.setToolTip(tooltip)
+        default_action.setEnabled(enabled)
+        action.setEnabled(enabled)
+
+        # Actualitzem el submenú recursivament
+        submenu = self.__get_action_submenu(action)
+        if submenu and subentries_list:
+            return self.update_GUI(submenu, subentries_list)
+        return 0
+
+    def __remove_actions(self, menu_or_toolbar, actions_list):
+        """ Esborra accions d'un menu o toolbar i les desregistra, juntament amb els seus submenús
+            ---
+            Removes actions from a menu or toolbar and unregisters them, with their submenus
+            """
+        removed_actions_set = set()
+        removed_menus_set = set()
+        pending_list = [(menu_or_toolbar, action) for action in actions_list]
+        while pending_list:
+            parent, action = pending_list.pop()
+            parent.removeAction(action)
+            removed_actions_set.add(action)
+            widget = action.defaultWidget() if type(action) == QWidgetAction else None
+            if type(widget) == QToolButton and widget.defaultAction():
+                removed_actions_set.add(widget.defaultAction())
+            elif widget:
+                self.widget_actions_set.discard(widget)
+            submenu = self.__get_action_submenu(action)
+            if submenu:
+                removed_menus_set.add(submenu)
+                pending_list += [(submenu, subaction) for subaction in submenu.actions()]
+        # Desregistrem les accions i submenús esborrats
+        self.actions = [(control, action) for control, action in self.actions if action not in removed_actions_set]
+        self.menus = [menu for menu in self.menus if menu not in removed_menus_set]
+
     def __parse_entry(self, entry):
         """ Tipus de menús /toolbars acceptats, llistes de:
                 None o "---" o "" --> separador
@@ -1308,6 +1487,10 @@ class LayersBase(object):
 
         self.download_manager = DownloadManager()
 
+        # Repositori de capabilities WMS que cal injectar (per exemple resources3.wms.get_wms_capabilities_layers):
+        # funció (url, version, timeout_seconds, retries, nested_only) -> [(name, title, dimensions_dict, bbox_list, styles_list), ...]
+        self.wms_capabilities_provider = None
+
         # Configurem l'event de refresc de mapa perquè ens avisi
         self.map_refreshed = True
         self.iface.mapCanvas().mapCanvasRefreshed.connect(self.on_map_refreshed)
@@ -3422,17 +3605,17 @@ class LayersBase(object):
         qlr_data = None
         if is_zipped_file:
             if unzip:
-                # Descomprimim el zip
+                # Descomprimim el zip si conté algun QLR (si no el mantenim, pot contenir altres capes)
                 unzip_folder = os.path.splitext(qlr_pathname)[0]
                 with zipfile.ZipFile(qlr_pathname) as zip_file:
+                    pathnames_list = [compressed_file for compressed_file in zip_file.namelist() if os.path.splitext(compressed_file.lower())[1] == ".qlr"]
+                    if not pathnames_list:
+                        return False
                     zip_file.extractall(unzip_folder)
                 # Esborrem el zip
                 os.remove(qlr_pathname)
                 # Obtenim el qlr descomprimit (Si hi ha més d'un ens quedem el primer)
-                pathnames_list = [os.path.join(unzip_folder, filename) for filename in os.listdir(unzip_folder) if os.path.splitext(filename.lower())[1] == ".qlr"]
-                if not pathnames_list:
-                    return False
-                qlr_pathname = pathnames_list[0]
+                qlr_pathname = os.path.normpath(os.path.join(unzip_folder, pathnames_list[0]))
                 # Carreguem les capes del QLR a partir del fitxer QLR descomprimit
                 ##print("Arxiu QLR: %s" % (qlr_pathname))
                 status, error = QgsLayerDefinition().loadLayerDefinition(qlr_pathname, QgsProject.instance(), group)
@@ -3450,13 +3633,12 @@ class LayersBase(object):
                 if not qlr_data:
                     return False
 
-                # Modifiquem el QLR perquè apunti als fitxers que hi ha dins el ZIP
-                qlr_data = qlr_data.replace('./', '/vsizip/%s/' % qlr_pathname)
                 qlr_data = qlr_data.replace('\ufeff', '') # Elimina codificació BOM (en UTF8)
 
-                # Generem un document amb les capes del QLR a partir de les dades XML modificades
+                # Generem un document amb les capes del QLR i el modifiquem perquè apunti als fitxers que hi ha dins el ZIP
                 qlr_doc = QDomDocument()
                 qlr_doc.setContent(qlr_data)
+                self.set_qlr_zip_datasources(qlr_doc, qlr_pathname, pathnames_list[0])
                 context = QgsReadWriteContext()
 
                 # Carreguem el QLR
@@ -3479,6 +3661,51 @@ class LayersBase(object):
 
         return status
 
+    def set_qlr_zip_datasources(self, qlr_doc, zip_pathname, qlr_member):
+        """ Modifica els datasource relatius de fitxers (proveïdors ogr i gdal) d'un QLR que està dins d'un zip
+            perquè apuntin als fitxers del zip (/vsizip/). Els camins es resolen des de la carpeta del QLR dins el zip
+            i els que surten del zip es resolen des de la carpeta del zip. Retorna el nombre de datasources modificats
+            ---
+            Modifies relative file datasources (ogr and gdal providers) of a QLR that is inside a zip
+            to point to the zip files (/vsizip/). Paths are resolved from the QLR folder inside the zip
+            and the ones that go out of the zip are resolved from the zip folder. Returns the number of modified datasources
+            """
+        datasources_count = 0
+        datasources = qlr_doc.elementsByTagName("datasource")
+        for i in range(datasources.count()):
+            datasource = datasources.item(i).toElement()
+            provider = datasource.parentNode().firstChildElement("provider").text()
+            if provider not in ("ogr", "gdal"):
+                continue
+            new_datasource = self.get_qlr_zip_datasource(datasource.text(), zip_pathname, qlr_member)
+            if new_datasource is None:
+                continue
+            datasource.firstChild().setNodeValue(new_datasource)
+            datasources_count += 1
+        return datasources_count
+
+    @staticmethod
+    def get_qlr_zip_datasource(datasource, zip_pathname, qlr_member):
+        """ Retorna el datasource relatiu de fitxer d'un QLR que està dins d'un zip modificat perquè apunti
+            al fitxer del zip (/vsizip/), o None si no és un camí relatiu (absolut, URL o buit)
+            ---
+            Returns the relative file datasource of a QLR that is inside a zip modified to point
+            to the zip file (/vsizip/), or None if it is not a relative path (absolute, URL or empty)
+            """
+        qlr_folder = posixpath.dirname(qlr_member.replace("\\", "/"))
+        # Separem el camí de les opcions del proveïdor (p.ex: ./capa.shp|layername=capa)
+        path, separator, options = datasource.partition("|")
+        path = path.replace("\\", "/")
+        if not path or path.startswith("/") or re.match(r"^[a-zA-Z]:/", path) or "://" in path:
+            return None
+        member_path = posixpath.normpath(posixpath.join(qlr_folder, path))
+        if member_path == ".." or member_path.startswith("../"):
+            zip_folder = os.path.dirname(os.path.abspath(zip_pathname))
+            new_path = os.path.normpath(os.path.join(zip_folder, member_path))
+        else:
+            new_path = "/vsizip/%s/%s" % (zip_pathname, member_path)
+        return new_path + separator + options
+
     def add_raster_files(self, files_list, group_name=None, group_pos=None, epsg=None, ref_layer=None, min_scale=None, max_scale=None, no_data=None, layer_name=None, color_default_expansion=False, visible=True, expanded=False, transparency=None, saturation=None, resampling_bilinear=False, resampling_cubic=False, set_current=False, style_file=None, properties_dict_list=[], only_one_map_on_group=False, only_one_visible_map_on_group=True):
         """ ATENCIÓ, TÉ UNA REIMPLEMENTACIÓ A pluginicgcbase
             Afegeix una llista de capes raster a partir dels seus fitxers. Opcionament se li pot especificar:
@@ -3748,6 +3975,37 @@ class LayersBase(object):
 
         return local_pathname
 
+    def download_remote_files(self, remote_files_list, download_folder=None, callback=None, select_folder_text=None, title=None, cancel_button_text=None, time_info=None, raise_errors=False):
+        """ Descarrega fitxers via http en paral·lel en la carpeta especificada, amb un únic diàleg de progrés.
+            - callback: funció a executar al acabar cada descàrrega (se li passa el fitxer remot i el path
+              del fitxer descarregat o None si ha fallat), permet carregar cada fitxer mentre es descarreguen els altres
+            - raise_errors: llença una excepció amb els errors de cada fitxer en acabar totes les descàrregues
+            Retorna: llista de paths descarregats (o None si ha fallat) en l'ordre de remote_files_list
+            ---
+            Download http files in parallel in the specified folder, with a single progress dialog.
+            - callback: function to execute when each download finish (function receives remote file and
+              downloaded file pathname or None if it failed), allows to load each file while the others are downloading
+            - raise_errors: raises an exception with the errors of each file when all downloads are finished
+            Returns: list of downloaded pathnames (or None if it failed) in remote_files_list order
+            """
+        # Si no ens la especifiquem, obtenim la carpeta de descàrrega de la
+        # configuració del plugin
+        if not download_folder:
+            download_folder = self.get_download_path(select_folder_text)
+            if not download_folder:
+                return [None] * len(remote_files_list)
+
+        # Descarreguem els fitxers
+        params_dict = {}
+        if title:
+            params_dict["title"] = title
+        if cancel_button_text:
+            params_dict["cancel_button_text"] = cancel_button_text
+        if time_info:
+            params_dict["time_info"] = time_info
+        files_list = [(remote_file, os.path.join(download_folder, os.path.basename(remote_file))) for remote_file in remote_files_list]
+        return self.download_manager.download_files(files_list, callback, raise_errors=raise_errors, **params_dict)
+
     def add_remote_raster_file(self, remote_file, local_file=None, download_folder=None, group_name=None, group_pos=None, epsg=None, ref_layer=None, min_scale=None, max_scale=None, no_data=None, layer_name=None, color_default_expansion=False, visible=True, expanded=False, transparency=None, saturation=None, resampling_bilinear=False, resampling_cubic=False, set_current=False, style_file=None, properties_dict=None, only_one_map_on_group=False, only_one_visible_map_on_group=True, select_folder_text=None, title=None, cancel_button_text=None, time_info=None):
         """ Descarrega fitxers raster via http en la carpeta especificada i els obre a QGIS.
             Veure add_raster_files per opcions
@@ -3769,18 +4027,16 @@ class LayersBase(object):
             Download http raster files in the specified folder and open them to QGIS.
             See add_raster_files for options
             """
-        layers_list = []
-        for remote_file in remote_files_list:
-            # Descarreguem el fitxer si cal
-            local_pathname = self.download_remote_file(remote_file, None, download_folder, select_folder_text, title=title, cancel_button_text=cancel_button_text, time_info=time_info)
-            # Carreguem el fitxer
-            if local_pathname:
-                last_layer = self.add_raster_layer(layer_name, local_pathname, group_name, group_pos, epsg, ref_layer, min_scale, max_scale, no_data, color_default_expansion, visible, expanded, transparency, saturation, set_current, style_file, properties_dict_list, only_one_map_on_group, only_one_visible_map_on_group)
-            else:
-                last_layer = None
-            layers_list.append(last_layer)
-        # Retorna la última capa
-        return layers_list
+        # Descarreguem els fitxers en paral·lel i carreguem cada un quan acaba la seva descàrrega
+        # (si alguna descàrrega falla, es llença una excepció amb els errors un cop acabades totes)
+        layers_dict = {}
+        def on_downloaded(remote_file, local_pathname):
+            layers_dict[remote_file] = self.add_raster_layer(layer_name, local_pathname, group_name, group_pos, epsg, ref_layer, min_scale, max_scale, no_data, color_default_expansion, visible, expanded, transparency, saturation, \
+                set_current=set_current, style_file=style_file, properties_dict=properties_dict_list, only_one_map_on_group=only_one_map_on_group, only_one_visible_map_on_group=only_one_visible_map_on_group) \
+                if local_pathname else None
+        self.download_remote_files(remote_files_list, download_folder, on_downloaded, select_folder_text, title=title, cancel_button_text=cancel_button_text, time_info=time_info, raise_errors=True)
+        # Retorna les capes
+        return [layers_dict.get(remote_file) for remote_file in remote_files_list]
 
     def add_vector_files(self, files_list, group_name=None, group_pos=None, min_scale=None, max_scale=None, layer_name=None, visible=True, expanded=False, transparency=None, set_current=False, style_file=None, regex_styles_list=None, properties_dict_list=[], only_one_map_on_group=False, only_one_visible_map_on_group=True):
         """ Afegeix capes vectorials a partir d'una llista de fitxers. Opcionament se li pot especificar:
@@ -3903,8 +4159,10 @@ class LayersBase(object):
         if is_zipped_file:
             # Generem una llista amb tots els shapes dins el zip
             with zipfile.ZipFile(pathname) as zip_file:
-                pathnames_list = ["/vsizip/%s/%s" % (pathname, compressed_file) for compressed_file in zip_file.namelist() if os.path.splitext(compressed_file.lower())[1] == ".shp"]
-                styles_list = [compressed_file for compressed_file in zip_file.namelist() if os.path.splitext(compressed_file.lower())[1] == ".qml"]
+                # Llegim el directori del zip una sola vegada
+                compressed_files_list = zip_file.namelist()
+                pathnames_list = ["/vsizip/%s/%s" % (pathname, compressed_file) for compressed_file in compressed_files_list if os.path.splitext(compressed_file.lower())[1] == ".shp"]
+                styles_list = [compressed_file for compressed_file in compressed_files_list if os.path.splitext(compressed_file.lower())[1] == ".qml"]
                 styles_dict = {}
                 for compressed_file in styles_list:
                     with zip_file.open(compressed_file) as fin:
@@ -4054,18 +4312,15 @@ class LayersBase(object):
             Download http vector files in the specified folder and open them to QGIS.
             See add_vector_files for options
             """
-        layers_list = []
-        for remote_file in remote_files_list:
-            # Descarreguem el fitxer si cal
-            local_pathname = self.download_remote_file(remote_file, None, download_folder, select_folder_text, title=title, cancel_button_text=cancel_button_text, time_info=time_info)
-            # Carreguem el fitxer
-            if local_pathname:
-                last_layer = self.add_vector_files([local_pathname], group_name, group_pos, min_scale, max_scale, layer_name, visible, expanded, transparency, set_current, style_file, regex_styles_list, properties_dict_list, only_one_map_on_group, only_one_visible_map_on_group)
-            else:
-                last_layer = None
-            layers_list.append(last_layer)
-        # Retornem la última capa
-        return layers_list
+        # Descarreguem els fitxers en paral·lel i carreguem cada un quan acaba la seva descàrrega
+        # (si alguna descàrrega falla, es llença una excepció amb els errors un cop acabades totes)
+        layers_dict = {}
+        def on_downloaded(remote_file, local_pathname):
+            layers_dict[remote_file] = self.add_vector_files([local_pathname], group_name, group_pos, min_scale, max_scale, layer_name, visible, expanded, transparency, set_current, style_file, regex_styles_list, properties_dict_list, only_one_map_on_group, only_one_visible_map_on_group) \
+                if local_pathname else None
+        self.download_remote_files(remote_files_list, download_folder, on_downloaded, select_folder_text, title=title, cancel_button_text=cancel_button_text, time_info=time_info, raise_errors=True)
+        # Retornem les capes
+        return [layers_dict.get(remote_file) for remote_file in remote_files_list]
 
     def add_point_cloud_layer(self, name, pathname, group_name, group_pos, min_scale, max_scale, visible, expanded, transparency, set_current, style_file, regex_styles_list, properties_dict_list, only_one_map_on_group, only_one_visible_map_on_group):
         """ Afegeix una cape vectorial a partir d'un nom de capa i un fitxer. Opcionament se li pot especificar:
@@ -4231,18 +4486,15 @@ class LayersBase(object):
             Download http vector files in the specified folder and open them to QGIS.
             See add_point_cloud_files for options
             """
-        layers_list = []
-        for remote_file in remote_files_list:
-            # Descarreguem el fitxer si cal
-            local_pathname = self.download_remote_file(remote_file, None, download_folder, select_folder_text, title=title, cancel_button_text=cancel_button_text, time_info=time_info)
-            # Carreguem el fitxer
-            if local_pathname:
-                last_layer = self.add_point_cloud_files([local_pathname], group_name, group_pos, min_scale, max_scale, layer_name, visible, expanded, transparency, set_current, style_file, regex_styles_list, properties_dict_list, only_one_map_on_group, only_one_visible_map_on_group)
-            else:
-                last_layer = None
-            layers_list.append(last_layer)
-        # Retornem la última capa
-        return layers_list
+        # Descarreguem els fitxers en paral·lel i carreguem cada un quan acaba la seva descàrrega
+        # (si alguna descàrrega falla, es llença una excepció amb els errors un cop acabades totes)
+        layers_dict = {}
+        def on_downloaded(remote_file, local_pathname):
+            layers_dict[remote_file] = self.add_point_cloud_files([local_pathname], group_name, group_pos, min_scale, max_scale, layer_name, visible, expanded, transparency, set_current, style_file, regex_styles_list, properties_dict_list, only_one_map_on_group, only_one_visible_map_on_group) \
+                if local_pathname else None
+        self.download_remote_files(remote_files_list, download_folder, on_downloaded, select_folder_text, title=title, cancel_button_text=cancel_button_text, time_info=time_info, raise_errors=True)
+        # Retornem les capes
+        return [layers_dict.get(remote_file) for remote_file in remote_files_list]
 
     def add_wms_t_layer(self, layer_name, url, layer_id=None, default_time=None, style="default", image_format="image/png", time_series_list=None, time_series_regex=None, epsg=None, extra_tags="", group_name="", group_pos=None, only_one_map_on_group=False, only_one_visible_map_on_group=True, collapsed=True, visible=True, transparency=None, saturation=None, resampling_bilinear=False, resampling_cubic=False, color_default_expansion=False, set_current=False, use_qgis_time_controller=False):
         """ Afegeix una capa WMS-T a partir de la URL base i una capa amb informació temporal.
@@ -4384,6 +4636,24 @@ class LayersBase(object):
 
         return new_name
 
+    def get_wms_capabilities_layers(self, url, version="1.1.1", timeout_seconds=5, retries=3, nested_only=False):
+        """ Obté les capes d'un servidor WMS del repositori de capabilities injectat (wms_capabilities_provider)
+            - nested_only: exclou la capa arrel (només les capes de Capability/Layer//Layer)
+            Retorna: llista de tuples [(<name>, <title>, <dimensions_dict>, <bbox_list>, <styles_list>), ...]
+            - dimensions_dict: {<dimension_name>: (<values_text>, <default>)}
+            - bbox_list: [(<crs>, <min_x>, <min_y>, <max_x>, <max_y>), ...]
+            ---
+            Gets WMS server layers from the injected capabilities repository (wms_capabilities_provider)
+            - nested_only: excludes root layer (only Capability/Layer//Layer layers)
+            Returns: list of tuples [(<name>, <title>, <dimensions_dict>, <bbox_list>, <styles_list>), ...]
+            - dimensions_dict: {<dimension_name>: (<values_text>, <default>)}
+            - bbox_list: [(<crs>, <min_x>, <min_y>, <max_x>, <max_y>), ...]
+            """
+        if not self.wms_capabilities_provider:
+            self.parent.log.warning("WMS capabilities provider not available, URL: %s", url)
+            return []
+        return self.wms_capabilities_provider(url, version, timeout_seconds, retries, nested_only)
+
     def get_wms_t_time_series(self, url, layer_id, ts_regex=None, version="1.1.1", timeout_seconds=5, retries=3):
         """ Obté informació temporal d'una capa d'un servidor WMS-T o d'un grup de capes (via expresió regular)
             Retona:
@@ -4395,57 +4665,24 @@ class LayersBase(object):
             - list of tupes [(<name>, <layer_id>), ...]
             - string <default_time>
             """
-        time_series_list = []
-        default_time = None
-
-        # Llegim el capabilities del servei
-        is_question_mark = url.find("?") >= 0
-        capabilities_request = "%s%sREQUEST=GetCapabilities&SERVICE=WMS&VERSION=%s" % (url, "&" if is_question_mark else "?", version)
-        ##print("request", capabilities_request)
-        capabilities_xml = None
-        while retries:
-            try:
-                capabilities_xml = requests.get(capabilities_request, \
-                    verify=True, timeout=timeout_seconds).text
-                retries = 0
-            except socket.timeout:
-                retries -= 1
-                self.parent.log.warning("WMS-T URL: %s retries: %s", url, retries)
-            except Exception as e:
-                retries = 0
-                self.parent.log.exception("Error WMS-T: %s", e)
-        if not capabilities_xml:
+        # Obtenim les capes del servei (repositori de capabilities), només les de Capability/Layer//Layer
+        layers_list = self.get_wms_capabilities_layers(url, version, timeout_seconds, retries, nested_only=True)
+        if not layers_list:
             return [], None
-        ##print("xml", capabilities_xml)
 
         # Cerquem les capes amb el camp "Dimension" tipus "time" o "Dimension" + "Extent" tipus "time"
         time_series_list = []
         default_time = None
-        root = lxml.etree.fromstring(capabilities_xml.encode())
-        layers = root.find('Capability').find("Layer")
-        for layer in layers.findall('.//Layer'):
+        for name, _title, dimensions_dict, _bbox_list, _styles_list in layers_list:
             # Si tenim un identificador de capa, cerquem aquella capa i obtenim les seves marques temporals
             if layer_id:
-                if layer.find("Name").text != layer_id:
+                if name != layer_id:
                     continue
                 ##print("layer", layer_id)
 
-                dimension = layer.find("Dimension")
-                if dimension is None or dimension.get("name") != "time":
+                dimension_text, default_time = dimensions_dict.get("time", (None, None))
+                if not dimension_text:
                     continue
-                if dimension.text:
-                    #<Dimension name="time" units="ISO8601" default="2018-09" nearestValue="0">
-                    #2015-12,2016-03,2016-04,2016-05,2016-06,2016-07,2016-08,2016-09,2016-10,2016-11,2016-12,2017-01,2017-02,2017-03,2017-04,2017-05,2017-06,2017-07,2017-08,2017-09,2017-10,2017-11,2017-12,2018-01,2018-02,2018-03,2018-04,2018-05,2018-06,2018-07,2018-08,2018-09
-                    #</Dimension>
-                    dimension_text = dimension.text
-                    default_time = dimension.get("default")
-                else:
-                    #<Extent name="time" default="2018" nearestValue="0">#2015-12,...</Extent>
-                    extent = layer.find("Extent")
-                    if extent is None or extent.get("name") != "time" or not extent.text:
-                        continue
-                    dimension_text = extent.text
-                    default_time = extent.get("default")
                 ##print("Dimensions", layer_id, dimension_text, default_time)
 
                 # Recuperem les dimension (de tipus llista d1,d2... o de tipus rang d1/d2 o d1-d2)
@@ -4465,12 +4702,10 @@ class LayersBase(object):
 
             # Si ens passen una expressió regular, cerquem totes les capes que compleixin amb la expressió
             elif ts_regex:
-                layer_id = layer.find("Name").text
-                found = re.findall(ts_regex, layer_id)
+                found = re.findall(ts_regex, name)
                 if found:
                     time = "-".join(found[0]) if type(found[0]) is tuple else found[0]
-                    time_series_list.append((time, layer_id))
-                layer_id = None
+                    time_series_list.append((time, name))
 
         time_series_list.sort()
         return time_series_list, default_time
@@ -5719,14 +5954,39 @@ class CrsToolsBase(object):
         ---
         Class to manages coordinates systems
         """
+    # Mida de la cache LRU d'objectes transformació
+    transforms_cache_size = 32
+
     def __init__(self, parent):
         """ Inicialització de variables membre apuntant al pare a l'iface
+            i de la cache d'objectes transformació
             ---
             Initialization of member variables pointing to parent and iface
+            and transformation objects cache
             """
         self.parent = parent
         self.iface = parent.iface
 
+        # Cache LRU d'objectes transformació (crear-los és costós), key: (in_epsg, out_epsg)
+        self.transforms_dict = collections.OrderedDict()
+        # Si canvien les transformacions de datum del projecte, descartem la cache
+        QgsProject.instance().transformContextChanged.connect(self.clear_transforms_cache)
+
+    def remove(self):
+        """ Desmapeja l'event de canvi de context de transformació
+            ---
+            Unmaps transformation context change event
+            """
+        QgsProject.instance().transformContextChanged.disconnect(self.clear_transforms_cache)
+        self.clear_transforms_cache()
+
+    def clear_transforms_cache(self):
+        """ Esborra la cache d'objectes transformació
+            ---
+            Clears transformation objects cache
+            """
+        self.transforms_dict.clear()
+
     def format_epsg(self, text, asPrefixedText):
         """ Formateja un codi epsg text segons si volem prefix o no
             Retorna "EPSG:25831" o "25831" (string)
@@ -5775,7 +6035,15 @@ class CrsToolsBase(object):
             ---
             Obtains a transformation object from 2 epsg codes
             """
+        key = (self.format_epsg(str(in_epsg), True), self.format_epsg(str(out_epsg), True))
+        ct = self.transforms_dict.get(key)
+        if ct:
+            self.transforms_dict.move_to_end(key)
+            return ct
         ct = QgsCoordinateTransform(self.get_crs(in_epsg), self.get_crs(out_epsg), QgsProject.instance())
+        self.transforms_dict[key] = ct
+        if len(self.transforms_dict) > self.transforms_cache_size:
+            self.transforms_dict.popitem(last=False)
         return ct
 
     def transform_point(self, x, y, source_epsg, destination_epsg=None):
@@ -5795,6 +6063,44 @@ class CrsToolsBase(object):
         point = ct.transform(x, y)
         return point.x(), point.y()
 
+    def transform_points(self, points, source_epsg, destination_epsg=None):
+        """ Converteix una llista (o array NumPy N x 2) de coordenades x,y d'un epsg origen a un destí
+            en una sola crida (geometria multipunt), en cas de no especificar el destí,
+            s'utilitzarà el del projecte carregat
+            Retorna: llista de tuples [(x, y), ...] (None pels punts no finits o que no es poden transformar)
+            ---
+            Converts a list (or NumPy array N x 2) of x, y coordinates from an epsg source to a destination
+            in a single call (multipoint geometry), if the destination is not specified,
+            the project loaded will be used
+            Returns: list of tuples [(x, y), ...] (None for not finite points or points that can not be transformed)
+            """
+        if not destination_epsg:
+            destination_epsg = self.parent.project.get_epsg()
+        is_finite = lambda x, y: math.isfinite(x) and math.isfinite(y)
+        points_list = [(float(x), float(y)) if is_finite(float(x), float(y)) else None for x, y in points]
+        if int(source_epsg) == int(destination_epsg):
+            return points_list
+
+        # Transformem tots els punts vàlids de cop
+        ct = self.get_transform(source_epsg, destination_epsg)
+        valid_list = [i for i, point in enumerate(points_list) if point]
+        geometry = QgsGeometry.fromMultiPointXY([QgsPointXY(*points_list[i]) for i in valid_list])
+        try:
+            geometry.transform(ct)
+            transformed_list = [(point.x(), point.y()) for point in geometry.asMultiPoint()]
+        except QgsCsException:
+            # Si algun punt queda fora de l'àmbit de la projecció, els transformem un a un descartant els erronis
+            transformed_list = []
+            for i in valid_list:
+                try:
+                    point = ct.transform(*points_list[i])
+                    transformed_list.append((point.x(), point.y()))
+                except QgsCsException:
+                    transformed_list.append(None)
+        for i, point in zip(valid_list, transformed_list):
+            points_list[i] = point if point and is_finite(*point) else None
+        return points_list
+
     def transform_bounding_box(self, area, source_epsg, destination_epsg=None):
         """ Converteix l'àrea especificada d'un epsg origen a un destí,
             en cas de no especificar el destí, s'utilitzarà el del projecte carregat
@@ -6887,8 +7193,10 @@ class PluginBase(QObject):
         self.metadata = MetadataBase(self, plugin_pathname)
         self.translation = TranslationBase(self)
         self.log = PluginLogger(self)
+        download.log = self.log
 
         self.worker_list = [] # List of async processes runned
+        self.async_resources_dict = {} # Resources loaded on demand, name: [callback, signal, status]
 
         self.about_dlg = None
 
@@ -6905,6 +7213,7 @@ class PluginBase(QObject):
         self.layers = None
         self.legend = None
         self.composer = None
+        self.crs.remove()
         self.crs = None
         self.debug = None
         self.tools.remove()
@@ -6915,6 +7224,7 @@ class PluginBase(QObject):
         self.log.remove()
         self.log = None
         self.worker_list = []
+        self.async_resources_dict = {}
 
     def get_plugins_id(self):
         """ Retorna una llista amb els ids dels plugins carregats
@@ -7220,11 +7530,77 @@ class PluginBase(QObject):
             """
         return QFontDatabase.removeApplicationFont(font_id)
 
-    def run_async(self, callback, signal=None):
-        """ Executa un procés de manera asíncrona i opcionalment emet un signal
+    def run_async(self, callback, signal=None, signal_params=()):
+        """ Executa un procés de manera asíncrona i opcionalment emet un signal (amb paràmetres)
             ---
-            Execute a process asynchronously and optionally send a signal
+            Execute a process asynchronously and optionally send a signal (with parameters)
             """
         # Execute callback asynchronously and at end emit signal and remove
         # worker from worker_list
-        self.worker_list.append(AsyncWorker(callback, signal, self.worker_list.remove))
+        self.worker_list.append(AsyncWorker(callback, signal, self.worker_list.remove, signal_params))
+
+    def register_async_resource(self, name, callback, signal=None):
+        """ Registra un recurs que es carregarà asíncronament sota demanda (una sola vegada).
+            Al acabar la càrrega s'emet el signal amb el nom del recurs
+            ---
+            Registers a resource to be loaded asynchronously on demand (only once).
+            At end of loading the signal is emitted with the resource name
+            """
+        self.async_resources_dict[name] = [callback, signal, None]
+
+    def load_async_resource(self, name):
+        """ Carrega asíncronament un recurs registrat si no està carregat o carregant-se
+            Retorna: booleà, Cert si el recurs ja està carregat
+            ---
+            Loads asynchronously a registered resource if it is not loaded or loading
+            Returns: bool, True if resource is already loaded
+            """
+        if name not in self.async_resources_dict:
+            return False
+        callback, signal, status = self.async_resources_dict[name]
+        if status is None:
+            self.async_resources_dict[name][2] = "loading"
+            self.run_async(lambda:self.__load_async_resource(name, callback), signal, (name,))
+        return status == "loaded"
+
+    def __load_async_resource(self, name, callback):
+        """ Executa la càrrega d'un recurs (en el fil del AsyncWorker) i actualitza el seu estat.
+            Si hi ha error el recurs queda pendent de carregar i es reintentarà a la propera demanda
+            ---
+            Executes resource loading (on AsyncWorker thread) and updates its status.
+            On error the resource remains pending and it will be retried on next demand
+            """
+        t0 = datetime.datetime.now()
+        try:
+            callback()
+            self.async_resources_dict[name][2] = "loaded"
+        except Exception as e:
+            self.async_resources_dict[name][2] = None
+            self.log.error("Async resource %s: %s", name, e)
+        t1 = datetime.datetime.now()
+        self.log.info("Loaded async resource %s (%s)", name, t1-t0)
+
+    def load_async_resources(self, names_list=None):
+        """ Carrega asíncronament una llista de recursos registrats (per defecte tots)
+            Retorna: booleà, Cert si tots els recursos ja estan carregats
+            ---
+            Loads asynchronously a list of registered resources (all by default)
+            Returns: bool, True if all resources are already loaded
+            """
+        if names_list is None:
+            names_list = list(self.async_resources_dict.keys())
+        return all([self.load_async_resource(name) for name in names_list])
+
+    def is_async_resource_loaded(self, name):
+        """ Retorna si un recurs registrat està carregat
+            ---
+            Returns if a registered resource is loaded
+            """
+        return name in self.async_resources_dict and self.async_resources_dict[name][2] == "loaded"
+
+    def is_async_resource_loading(self, name):
+        """ Retorna si un recurs registrat s'està carregant
+            ---
+            Returns if a registered resource is loading
+            """
+        return name in self.async_resources_dict and self.async_resources_dict[name][2] == "loading"
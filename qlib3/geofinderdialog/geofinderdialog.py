@@ -11,13 +11,14 @@ of the spatial searches
 """
 
 import os
+import threading
 from importlib import reload
 
 # Import the PyQt and QGIS libraries
 from PyQt5 import uic
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon, QCursor
-from PyQt5.QtWidgets import QDialog, QAbstractItemView, QHeaderView, QTableWidgetItem, QApplication
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QDialog, QAbstractItemView, QHeaderView, QTableWidgetItem, QProgressBar
 
 # Initialize Qt resources from file resources_rc.py
 from . import resources_rc
@@ -30,6 +31,10 @@ class GeoFinderDialog(QDialog, ui_geofinder):
     """ Dialog class that allows to show the results of the spatial searches """
     test = False
 
+    # Signals to receive search results from background thread (search id, results[, error])
+    resultsFound = pyqtSignal(int, list)
+    searchFinished = pyqtSignal(int, list, object)
+
     # We prepare a toponym mapping with the icon to show
     TOPOICONS_DICT = {
         1:'town.png', 2:'town.png', #Cap municipi, municipi
@@ -60,6 +65,14 @@ class GeoFinderDialog(QDialog, ui_geofinder):
         self.geofinder_dict_list = geofinder_dict_list
         self.set_data(self.geofinder_dict_list)
 
+        # Background search status (results of old searches are ignored)
+        self.search_id = 0
+        self.search_error = None
+        self.search_future = None
+        self.search_cancel_event = None
+        self.resultsFound.connect(self.on_results_found)
+        self.searchFinished.connect(self.on_search_finished)
+
         # We show the dialog automatically if necessary
         self.status = False
         if auto_show:
@@ -103,12 +116,24 @@ class GeoFinderDialog(QDialog, ui_geofinder):
         # Initialize default create layer value
         self.checkBox_layer.setChecked(default_create_layer)
 
+        # Busy indicator shown while search is running on background
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, 0)
+        self.progressBar.setTextVisible(False)
+        self.progressBar.setMaximumWidth(120)
+        self.progressBar.setVisible(False)
+        self.horizontalLayout.insertWidget(1, self.progressBar)
+
     def set_test_mode(self, test=True):
         """ Activa el mode test que fa que el do_modal no esperi entrada de dades """
         self.test = test
         self.setModal(not test)
 
     def set_data(self, topodata_list):
+        # Keep selected item if it is on new data (results are updated as they arrive)
+        selected_index = self.get_current_index()
+        selected_data = self.geofinder_dict_list[selected_index] \
+            if selected_index is not None and selected_index < len(self.geofinder_dict_list) else None
         self.tableWidget.setSortingEnabled(False)
         self.tableWidget.setRowCount(len(topodata_list))
 
@@ -127,7 +152,13 @@ class GeoFinderDialog(QDialog, ui_geofinder):
         self.tableWidget.setSortingEnabled(True)
 
         if len(topodata_list) > 0:
-            self.tableWidget.selectRow(0)
+            selected_row = 0
+            if selected_data is not None:
+                for row in range(self.tableWidget.rowCount()):
+                    if topodata_list[self.tableWidget.item(row, 0).data(Qt.UserRole)] is selected_data:
+                        selected_row = row
+                        break
+            self.tableWidget.selectRow(selected_row)
 
     def do_modal(self):
         """ Show GeoFinder dialog and makes it modal """
@@ -139,6 +170,12 @@ class GeoFinderDialog(QDialog, ui_geofinder):
             self.status = self.exec_()
         return self.status
 
+    def get_current_index(self):
+        """ Return data index of current dialog row or None """
+        if self.tableWidget.currentRow() < 0 or not self.tableWidget.item(self.tableWidget.currentRow(), 0):
+            return None
+        return self.tableWidget.item(self.tableWidget.currentRow(), 0).data(Qt.UserRole)
+
     def get_selection_index(self):
         """ Return number of selected dialog row """
         if not self.status or self.tableWidget.currentRow() < 0:
@@ -146,19 +183,33 @@ class GeoFinderDialog(QDialog, ui_geofinder):
         return self.tableWidget.item(self.tableWidget.currentRow(), 0).data(Qt.UserRole)
 
     def find(self, text, default_epsg):
-        # Find text
-        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
-        try:
-            self.geofinder_dict_list = self.geofinder.find(text, default_epsg)
-        except Exception as e:
-            raise e
-        finally:
-            QApplication.restoreOverrideCursor()
+        """ Finds text on background and shows results as services answer (the dialog is shown
+            while searching and the user can select a result or cancel the search) """
+        # A new search cancels the previous one
+        self.cancel_search()
+        self.search_id += 1
+        self.search_error = None
+        self.geofinder_dict_list = []
+        self.set_data(self.geofinder_dict_list)
+        self.comboBox_scale.setEnabled(True)
+
+        if self.test:
+            # En mode test cerquem de manera síncrona
+            self.on_search_finished(self.search_id, self.geofinder.find(text, default_epsg), None)
+        else:
+            # Search runs on the geofinder thread pool and it can be cancelled with an event
+            self.set_searching(True)
+            self.search_cancel_event = threading.Event()
+            self.search_future = self.geofinder.get_executor().submit(self.run_search,
+                self.search_id, text, default_epsg, self.search_cancel_event)
 
         # We show the found places in a dialog
-        self.comboBox_scale.setEnabled(not self.geofinder.is_rectangle(self.geofinder_dict_list))
-        self.set_data(self.geofinder_dict_list)
-        if not self.do_modal():
+        status = self.do_modal()
+        # Closing the dialog cancels the pending search
+        self.cancel_search()
+        if self.search_error:
+            raise self.search_error
+        if not status:
             return False
         self.selected = self.get_selection_index()
         if self.selected < 0:
@@ -167,6 +218,54 @@ class GeoFinderDialog(QDialog, ui_geofinder):
 
         return True
 
+    def run_search(self, search_id, text, default_epsg, cancel_event=None):
+        """ Runs search on background thread sending results with signals """
+        try:
+            dict_list = self.geofinder.find(text, default_epsg,
+                partial_callback=lambda partial_list: self.resultsFound.emit(search_id, partial_list),
+                cancel_event=cancel_event)
+            error = None
+        except Exception as e:
+            dict_list, error = [], e
+        self.searchFinished.emit(search_id, dict_list, error)
+
+    def cancel_search(self):
+        """ Cancels current search: a not started search is discarded, a running search stops
+            waiting for services queries (their pending results will be ignored) """
+        self.search_id += 1
+        if self.search_future:
+            self.search_future.cancel()
+            self.search_future = None
+        if self.search_cancel_event:
+            self.search_cancel_event.set()
+            self.search_cancel_event = None
+        self.set_searching(False)
+
+    def set_searching(self, searching):
+        """ Shows / hides search progress """
+        self.progressBar.setVisible(searching)
+
+    def on_results_found(self, search_id, partial_list):
+        """ Adds partial results of current search """
+        if search_id != self.search_id:
+            return
+        self.set_data(self.geofinder_dict_list + partial_list)
+        self.geofinder_dict_list = self.geofinder_dict_list + partial_list
+
+    def on_search_finished(self, search_id, dict_list, error):
+        """ Shows final results of current search. If search fails without results the dialog is closed """
+        if search_id != self.search_id:
+            return
+        self.set_searching(False)
+        if error:
+            if not self.geofinder_dict_list:
+                self.search_error = error
+                self.reject()
+            return
+        self.comboBox_scale.setEnabled(not self.geofinder.is_rectangle(dict_list))
+        self.set_data(dict_list)
+        self.geofinder_dict_list = dict_list
+
     def is_rectangle(self):
         return self.geofinder.is_rectangle(self.geofinder_dict_list)
 
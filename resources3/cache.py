@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Module with functions to store ICGC resources responses in a persistent disk
+cache revalidated with ETag / Last-Modified HTTP headers
+
+                             -------------------
+        begin                : 2026-10-18
+*******************************************************************************
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from importlib import reload
+
+from . import session
+reload(session)
+from . import profiling
+reload(profiling)
+
+# Configure internal library logger (Default is dummy logger)
+import logging
+log = logging.getLogger('dummy')
+log.addHandler(logging.NullHandler())
+
+# Cache configuration (cache_path None disables the persistent cache)
+cache_path = None
+ttl_seconds = 12 * 3600
+
+# Lock to serialize cache files writes between threads
+cache_lock = threading.Lock()
+
+
+def configure(path, ttl=None):
+    """ Configura la carpeta de la cache persistent i el temps de validesa de les dades (segons)
+        ---
+        Configures persistent cache folder and data time to live (seconds)
+        """
+    global cache_path, ttl_seconds
+    if path and not os.path.exists(path):
+        os.makedirs(path)
+    cache_path = path
+    if ttl is not None:
+        ttl_seconds = ttl
+    log.debug("HTTP cache path: %s TTL: %ss", cache_path, ttl_seconds)
+
+def get_cache_pathname(url):
+    """ Retorna el nom de l'arxiu de cache associat a una URL
+        ---
+        Returns cache file pathname associated to a URL
+        """
+    return os.path.join(cache_path, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+def get_entry(url):
+    """ Retorna l'entrada de cache d'una URL: dict {url, content, encoding, etag, last_modified, timestamp} o None
+        (content són les dades originals en base64, encoding la codificació HTTP per obtenir-ne el text)
+        ---
+        Returns URL cache entry: dict {url, content, encoding, etag, last_modified, timestamp} or None
+        (content is the original data in base64, encoding is the HTTP encoding to get its text)
+        """
+    if not cache_path:
+        return None
+    pathname = get_cache_pathname(url)
+    if not os.path.exists(pathname):
+        return None
+    try:
+        with open(pathname, "r", encoding="utf-8") as cache_file:
+            entry_dict = json.load(cache_file)
+    except Exception as e:
+        log.warning("HTTP cache read error (%s), URL: %s", e, url)
+        return None
+    # Validem que no sigui una col·lisió de hash ni una entrada d'un format anterior (text descodificat)
+    return entry_dict if entry_dict.get("url") == url and "content" in entry_dict else None
+
+def get_entry_content(entry_dict):
+    """ Retorna les dades originals (bytes) d'una entrada de cache
+        ---
+        Returns original data (bytes) of a cache entry
+        """
+    return base64.b64decode(entry_dict["content"])
+
+def get_entry_text(entry_dict):
+    """ Retorna el text d'una entrada de cache (descodificat igual que requests.Response.text)
+        ---
+        Returns cache entry text (decoded like requests.Response.text)
+        """
+    return get_entry_content(entry_dict).decode(entry_dict.get("encoding") or "utf-8", errors="replace")
+
+def set_entry(url, content, encoding=None, etag=None, last_modified=None):
+    """ Guarda l'entrada de cache d'una URL a partir de les dades originals (bytes)
+        ---
+        Stores URL cache entry from original data (bytes)
+        """
+    if not cache_path:
+        return
+    entry_dict = {"url": url, "content": base64.b64encode(content).decode("ascii"), "encoding": encoding,
+        "etag": etag, "last_modified": last_modified, "timestamp": time.time()}
+    pathname = get_cache_pathname(url)
+    # Escrivim en un arxiu temporal i el reanomenem per evitar arxius a mitges
+    with cache_lock:
+        try:
+            with open(pathname + ".tmp", "w", encoding="utf-8") as cache_file:
+                json.dump(entry_dict, cache_file)
+            os.replace(pathname + ".tmp", pathname)
+        except Exception as e:
+            log.warning("HTTP cache write error (%s), URL: %s", e, url)
+
+def get_stale_entry(url):
+    """ Retorna l'entrada de cache d'una URL encara que estigui caducada (per treballar sense connexió)
+        ---
+        Returns URL cache entry even if it is expired (to work offline)
+        """
+    entry_dict = get_entry(url)
+    if entry_dict:
+        log.warning("HTTP cache serving stale data (%s), URL: %s",
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry_dict["timestamp"])), url)
+    return entry_dict
+
+def get_stale_data(url):
+    """ Retorna el text cachejat d'una URL encara que estigui caducat (per treballar sense connexió)
+        ---
+        Returns URL cached text even if it is expired (to work offline)
+        """
+    entry_dict = get_stale_entry(url)
+    return get_entry_text(entry_dict) if entry_dict else ""
+
+def get_stale_content(url):
+    """ Retorna les dades originals (bytes) cachejades d'una URL encara que estiguin caducades (per treballar sense connexió)
+        ---
+        Returns URL cached original data (bytes) even if it is expired (to work offline)
+        """
+    entry_dict = get_stale_entry(url)
+    return get_entry_content(entry_dict) if entry_dict else b""
+
+def get(url, timeout_seconds=10):
+    """ Obté el text d'una URL utilitzant la cache persistent. Si les dades no han caducat no es fa
+        cap petició, si no es revaliden amb una petició condicional (If-None-Match / If-Modified-Since)
+        Retorna: string. Propaga les excepcions de xarxa
+        ---
+        Gets URL text using the persistent cache. If data has not expired no request is sent,
+        else it is revalidated with a conditional request (If-None-Match / If-Modified-Since)
+        Returns: string. Raises network exceptions
+        """
+    entry_dict = get_entry(url)
+    if entry_dict and (time.time() - entry_dict["timestamp"]) < ttl_seconds:
+        log.debug("HTTP cache hit, URL: %s", url)
+        profiling.add_cache_access(True)
+        return get_entry_text(entry_dict)
+
+    # Preparem la petició condicional si tenim dades caducades
+    headers_dict = {}
+    if entry_dict and entry_dict.get("etag"):
+        headers_dict["If-None-Match"] = entry_dict["etag"]
+    if entry_dict and entry_dict.get("last_modified"):
+        headers_dict["If-Modified-Since"] = entry_dict["last_modified"]
+    response = session.get(url, headers=headers_dict, verify=True, timeout=timeout_seconds)
+
+    # Si no hi ha canvis renovem la data de l'entrada i retornem les dades cachejades
+    if response.status_code == 304 and entry_dict:
+        log.debug("HTTP cache revalidated, URL: %s", url)
+        profiling.add_cache_access(True)
+        set_entry(url, get_entry_content(entry_dict), entry_dict.get("encoding"), entry_dict.get("etag"), entry_dict.get("last_modified"))
+        return get_entry_text(entry_dict)
+
+    # Una pàgina d'error (5xx, proxy...) no substitueix les dades cachejades encara que estiguin caducades
+    if not response.ok and entry_dict:
+        log.warning("HTTP cache error response (%s), URL: %s", response.status_code, url)
+        return get_stale_data(url)
+
+    profiling.add_cache_access(False)
+    profiling.add_bytes(len(response.content))
+    response_data = response.text
+    if response.ok and response_data:
+        set_entry(url, response.content, response.encoding or response.apparent_encoding,
+            response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return response_data
+
+def iter_content(url, timeout_seconds=10, chunk_size=64*1024):
+    """ Obté el contingut d'una URL per blocs a mesura que arriben les dades, utilitzant la cache
+        persistent igual que get(). Sempre es retornen bytes sense descodificar (si les dades són a la cache
+        en un sol bloc), així els analitzadors XML obtenen la codificació de la capçalera XML.
+        Només es guarden a la cache les respostes llegides senceres
+        (si s'atura la iteració abans d'acabar no es guarda res). Propaga les excepcions de xarxa
+        ---
+        Gets URL content by chunks as data arrives, using the persistent cache like get().
+        Undecoded bytes are always returned (a single chunk if data is cached), so XML parsers get
+        the encoding from the XML header. Only fully read responses are stored in the cache
+        (if iteration is stopped before the end nothing is stored). Raises network exceptions
+        """
+    entry_dict = get_entry(url)
+    if entry_dict and (time.time() - entry_dict["timestamp"]) < ttl_seconds:
+        log.debug("HTTP cache hit, URL: %s", url)
+        profiling.add_cache_access(True)
+        yield get_entry_content(entry_dict)
+        return
+
+    # Preparem la petició condicional si tenim dades caducades
+    headers_dict = {}
+    if entry_dict and entry_dict.get("etag"):
+        headers_dict["If-None-Match"] = entry_dict["etag"]
+    if entry_dict and entry_dict.get("last_modified"):
+        headers_dict["If-Modified-Since"] = entry_dict["last_modified"]
+    response = session.get(url, headers=headers_dict, verify=True, timeout=timeout_seconds, stream=True)
+    try:
+        # Si no hi ha canvis renovem la data de l'entrada i retornem les dades cachejades
+        if response.status_code == 304 and entry_dict:
+            log.debug("HTTP cache revalidated, URL: %s", url)
+            profiling.add_cache_access(True)
+            content = get_entry_content(entry_dict)
+            set_entry(url, content, entry_dict.get("encoding"), entry_dict.get("etag"), entry_dict.get("last_modified"))
+            yield content
+            return
+
+        # Una pàgina d'error (5xx, proxy...) no substitueix les dades cachejades encara que estiguin caducades
+        if not response.ok and entry_dict:
+            log.warning("HTTP cache error response (%s), URL: %s", response.status_code, url)
+            yield get_stale_content(url)
+            return
+
+        profiling.add_cache_access(False)
+        chunks_list = []
+        for chunk in response.iter_content(chunk_size):
+            profiling.add_bytes(len(chunk))
+            chunks_list.append(chunk)
+            yield chunk
+        response_content = b"".join(chunks_list)
+        if response.ok and response_content:
+            set_entry(url, response_content, response.encoding, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    finally:
+        response.close()
+
+def clear():
+    """ Esborra tots els arxius de la cache persistent
+        ---
+        Removes all persistent cache files
+        """
+    if not cache_path or not os.path.exists(cache_path):
+        return
+    with cache_lock:
+        for filename in os.listdir(cache_path):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(cache_path, filename))
@@ -17,6 +17,8 @@ from importlib import reload
 
 from . import http
 reload(http)
+from . import profiling
+reload(profiling)
 from .http import get_historic_ortho_years, get_historic_local_ortho_years, get_coast_orthophoto_years
 from .http import get_coastline_years, get_coast_lidar_time, get_dtm_time
 
@@ -332,7 +334,9 @@ def get_services():
         """
     final_services_list = []
     t0 = datetime.datetime.now()
-    for id, name, min_side, max_query_area, min_px_side, max_px_area, gsd, time_list, download_list, default_filename, limits, url_pattern, ref_tuple in get_services_list():
+    with profiling.span("FME services", "fme"):
+        services_list = get_services_list()
+    for id, name, min_side, max_query_area, min_px_side, max_px_area, gsd, time_list, download_list, default_filename, limits, url_pattern, ref_tuple in services_list:
         # Si ens passen un time_list buit (no None) desactivem la entrada
         enabled = time_list is None or len(time_list) > 0
         # Injectem el path dels arxiu .qml
@@ -10,13 +10,19 @@ Module with functions to recover data to make WMS connections to ICGC resources
 *******************************************************************************
 """
 
-import requests
 import socket
 import re
 import os
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from importlib import reload
 
+from . import cache
+reload(cache)
+from . import profiling
+reload(profiling)
+
 # Configure internal library logger (Default is dummy logger)
 import logging
 reload(logging)
@@ -31,66 +37,186 @@ styles_path = os.path.join(os.path.dirname(__file__), "symbols")
 # *****************************************************************************
 # Auxiliar functions
 
-def get_http_dir(url, timeout_seconds=0.5, retries=3):
+def get_http_dir(url, timeout_seconds=0.5, retries=1):
     """ Obté el codi HTML d'una pàgina web amb fitxers
         Retorna: string
         ---
         Gets HTML code of web page with files
         Returns: string
         """
+    # ATENCIÓ! Els reintents amb espera ja els gestiona la sessió HTTP compartida (session.py)
     # Llegeixo la pàgina HTTP que informa dels arxius disponibles
     response_data = ""
     remaining_retries = retries
-    while remaining_retries:
-        try:
-            response_data = requests.get(url, verify=True, timeout=timeout_seconds).text
-            if response_data:
-                remaining_retries = 0
-        except socket.timeout:
-            remaining_retries -= 1
-            log.warning("HTTP resources timeout, retries: %s, URL: %s", retries, url)
-        except Exception as e:
-            remaining_retries -= 1
-            log.exception("HTTP resources error (%s), retries: %s, URL: %s", e, retries, url)
-    if not response_data:
-        log.error("HTTP resources error, exhausted retries")
+    with profiling.span(url, "http"):
+        while remaining_retries:
+            try:
+                response_data = cache.get(url, timeout_seconds)
+                if response_data:
+                    remaining_retries = 0
+            except socket.timeout:
+                remaining_retries -= 1
+                log.warning("HTTP resources timeout, retries: %s, URL: %s", retries, url)
+            except Exception as e:
+                remaining_retries -= 1
+                log.exception("HTTP resources error (%s), retries: %s, URL: %s", e, retries, url)
+        if not response_data:
+            log.error("HTTP resources error, exhausted retries")
+            # Si no tenim connexió, utilitzem les dades de la cache persistent encara que estiguin caducades
+            response_data = cache.get_stale_data(url)
     return response_data
 
 url_response_dict = {}
-def get_http_files(url, file_regex_pattern, replace_list=[]):
-    """ Obté una llista de fitxer d'una pàgina web a partir d'una expressió regular
-        Retorna: llista de resultats de la expressió regular
-        ---
-        Gets file list of web page from a regular expression
-        Returns: list of regex matches
+def get_http_dirs(url_list, max_workers=8):
+    """ Obté el codi HTML de diverses pàgines web amb fitxers en paral·lel i el guarda a la cache.
+        Les URLs repetides o ja cachejades només es descarreguen una vegada
+        Retorna: dict {url: string}
+        ---
+        Gets HTML code of several web pages with files in parallel and stores it in the cache.
+        Repeated or already cached URLs are downloaded only once
+        Returns: dict {url: string}
         """
     global url_response_dict
     t0 = datetime.datetime.now()
 
-    # Mirem si tenim la URL cachejada, si ja tenim les dades no cal fer res
+    # Eliminem URLs repetides (conservant l'ordre) i les que ja tenim cachejades o indexades (snapshot)
+    with http_index_lock:
+        pending_url_list = [url for url in dict.fromkeys(url_list) if not url_response_dict.get(url, None) and not http_index_dict.get(url, None)]
+    if pending_url_list:
+        # Descarreguem les carpetes pendents en un pool de threads limitat
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending_url_list)))) as executor:
+            for url, response_data in zip(pending_url_list, executor.map(get_http_dir, pending_url_list)):
+                if response_data:
+                    # Guardem el resultat a la cache
+                    url_response_dict[url] = response_data
+
+    t1 = datetime.datetime.now()
+    log.debug("HTTP resources dirs URLs: %s downloaded: %s (%s)", len(url_list), len(pending_url_list), t1-t0)
+    return {url: url_response_dict.get(url, "") for url in url_list}
+
+# Expressions regulars precompilades per indexar els llistats de carpetes HTTP
+http_href_regex = re.compile(r'<A HREF="[\/\w-]*?([^"\/]+)">')
+http_gsd_token_regex = re.compile(r"^\d+c?m$")
+http_pattern_gsd_regex = re.compile(r"-(\d+c?m)-")
+
+def parse_http_filename(filename):
+    """ Descomposa un nom d'arxiu de datacloud en parts: (stem, gsd, date, extension)
+        on stem són els tokens previs al GSD (producte, color, versió, regió...), gsd el primer
+        token de resolució (25cm, 1m, ...) i date els tokens numèrics finals (2020, 2020-2021, ...)
+        ---
+        Splits a datacloud filename in parts: (stem, gsd, date, extension)
+        where stem are the tokens before GSD (product, color, version, region...), gsd the first
+        resolution token (25cm, 1m, ...) and date the final numeric tokens (2020, 2020-2021, ...)
+        """
+    name, extension = os.path.splitext(filename)
+    tokens_list = name.split("-")
+    gsd_pos = next((pos for pos, token in enumerate(tokens_list) if http_gsd_token_regex.match(token)), None)
+    date_pos = len(tokens_list)
+    while date_pos > 0 and tokens_list[date_pos - 1].isdigit():
+        date_pos -= 1
+    stem_list = tokens_list[:gsd_pos if gsd_pos is not None else date_pos]
+    gsd = tokens_list[gsd_pos] if gsd_pos is not None else None
+    date = "-".join(tokens_list[date_pos:]) if date_pos < len(tokens_list) else None
+    return "-".join(stem_list), gsd, date, extension[1:]
+
+# Índex de carpetes HTTP compartit entre fils (càrrega asíncrona de recursos i snapshot): {url: index_dict}
+http_index_dict = {}
+http_index_lock = threading.Lock()
+def get_http_index(url):
+    """ Obté l'índex d'arxius d'una carpeta HTTP. El llistat HTML es parseja una sola vegada i
+        es guarda: {"files": [filename, ...], "parts": {filename: (stem, gsd, date, extension)},
+        "gsd": {gsd: [filename, ...]}, "queries": {(regex, replace_list): resultats}}
+        ---
+        Gets HTTP folder files index. HTML listing is parsed only once and it is stored:
+        {"files": [filename, ...], "parts": {filename: (stem, gsd, date, extension)},
+        "gsd": {gsd: [filename, ...]}, "queries": {(regex, replace_list): results}}
+        """
+    global http_index_dict
+    with http_index_lock:
+        index_dict = http_index_dict.get(url, None)
+    if index_dict:
+        return index_dict
+
+    # LLegeixo les dades HTML del directori HTTP
     response_data = url_response_dict.get(url, None)
-    if response_data:
-        cached = True
-    else:
-        cached = False
-        # LLegeixo les dades HTML del directori HTTP
+    if not response_data:
         response_data = get_http_dir(url)
         if response_data:
             # Guardem el resultat a la cache
             url_response_dict[url] = response_data
     if not response_data:
+        # No guardem l'índex buit per poder reintentar la descàrrega
+        return {"files": [], "parts": {}, "gsd": {}, "queries": {}}
+
+    # Indexem els arxius amb una sola passada sobre el codi HTML
+    return set_http_files(url, http_href_regex.findall(response_data))
+
+def set_http_files(url, files_list):
+    """ Indexa i guarda la llista d'arxius d'una carpeta HTTP (per exemple obtinguda d'un snapshot)
+        Retorna: l'índex de la carpeta, veure get_http_index
+        ---
+        Indexes and stores the files list of a HTTP folder (for example obtained from a snapshot)
+        Returns: folder index, see get_http_index
+        """
+    parts_dict = {filename: parse_http_filename(filename) for filename in files_list}
+    gsd_dict = {}
+    for filename in files_list:
+        for token in os.path.splitext(filename)[0].split("-"):
+            if http_gsd_token_regex.match(token):
+                gsd_dict.setdefault(token, []).append(filename)
+    index_dict = {"files": list(files_list), "parts": parts_dict, "gsd": gsd_dict, "queries": {}}
+    with http_index_lock:
+        http_index_dict[url] = index_dict
+    return index_dict
+
+def get_http_folders_files():
+    """ Retorna les llistes d'arxius de totes les carpetes HTTP indexades: {url: [filename, ...]}
+        ---
+        Returns files lists of all indexed HTTP folders: {url: [filename, ...]}
+        """
+    with http_index_lock:
+        return {url: index_dict["files"] for url, index_dict in http_index_dict.items() if index_dict["files"]}
+
+def get_http_files(url, file_regex_pattern, replace_list=[]):
+    """ Obté una llista de fitxer d'una pàgina web a partir d'una expressió regular
+        Retorna: llista de resultats de la expressió regular
+        ---
+        Gets file list of web page from a regular expression
+        Returns: list of regex matches
+        """
+    t0 = datetime.datetime.now()
+
+    # Mirem si ja hem resolt aquesta consulta sobre l'índex de la carpeta
+    index_dict = get_http_index(url)
+    query_key = (file_regex_pattern, tuple(replace_list))
+    with http_index_lock:
+        files_list = index_dict["queries"].get(query_key, None)
+    cached = files_list is not None
+    if not cached:
+        # Si l'expressió regular té un GSD literal (-25cm-) només cal revisar els arxius d'aquest GSD
+        gsd_match = http_pattern_gsd_regex.search(file_regex_pattern)
+        if gsd_match and "|" not in file_regex_pattern and "?" not in file_regex_pattern:
+            candidates_list = index_dict["gsd"].get(gsd_match.group(1), [])
+        else:
+            candidates_list = index_dict["files"]
+        # Obtinc la informació de fitxers a partir de la regex (equivalent a re.findall sobre l'HTML)
+        file_regex = re.compile(r"(?:%s)$" % file_regex_pattern)
         files_list = []
-    else:
-        # Reemplacem els textos indicats
-        for search, replace in replace_list:
-            response_data = response_data.replace(search, replace)
-        # Obtinc la informació de fitxers a partri de la regex
-        http_file_regex_pattern = r'<A HREF="[\/\w-]*%s">' % file_regex_pattern
-        files_list = re.findall(http_file_regex_pattern, response_data)
+        for filename in candidates_list:
+            # Reemplacem els textos indicats
+            for search, replace in replace_list:
+                filename = filename.replace(search, replace)
+            match = file_regex.search(filename)
+            if match:
+                groups = match.groups()
+                files_list.append(groups if len(groups) > 1 else groups[0] if groups else match.group(0))
+        if index_dict["files"]:
+            with http_index_lock:
+                index_dict["queries"][query_key] = files_list
 
     t1 = datetime.datetime.now()
     log.debug("HTTP resources files find URL: %s pattern: %s cached: %s, found: %s (%s)", url, file_regex_pattern, cached, len(files_list), t1-t0)
-    return files_list
+    return list(files_list)
 
 def get_products(urlbase_list, subproduct_separator="\n", subproduct_reverse=True):
     """ Obté les URLs dels arxius d'un producte de l'ICGC d'una carpeta que compleixin una expresió regular
@@ -102,6 +228,10 @@ def get_products(urlbase_list, subproduct_separator="\n", subproduct_reverse=Tru
         Params: [(folder, regex), ...]
         Returns: [product_name, product_url)]
         """
+    # Descarreguem totes les carpetes diferents en paral·lel, la resta de consultes
+    # de fitxers es resolen sobre la cache
+    get_http_dirs([urlbase for _product_name, urlbase, _http_file_pattern in urlbase_list])
+
     product_list = []
     for product_name, urlbase, http_file_pattern in urlbase_list:
         # Llegeixo la pàgina HTTP que informa dels arxius disponibles
@@ -687,3 +817,60 @@ def get_coast_lidar_time():
     """
     coast_lidar_list = get_coast_lidar()
     return sorted([time for time, url in coast_lidar_list])
+
+
+if __name__ == "__main__":
+    # Benchmark de descàrrega sèrie vs paral·lela de carpetes contra un servidor HTTP local
+    # que simula la latència de datacloud.icgc.cat (executar: python -m resources3.http [latència])
+    # ---
+    # Serial vs parallel folder discovery benchmark against a local HTTP server
+    # that simulates datacloud.icgc.cat latency (run: python -m resources3.http [latency])
+    import sys
+    import time
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    latency_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+
+    class DatacloudHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_seconds)
+            product = self.path.strip("/").split("/")[0]
+            html = "".join(['<A HREF="/%s/json_unzip/%s-v1r0-cat-%s-2020-2021.json">\n' % (product, product, gsd)
+                for gsd in ("25cm", "50cm", "1m", "2m", "5m")])
+            data = html.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DatacloudHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urlbase = "http://127.0.0.1:%s" % server.server_port
+
+    # Reutilitzem la llista de productes de get_dtms apuntant al servidor local
+    urlbase_list = [(product_name, url.replace("https://datacloud.icgc.cat/datacloud", urlbase), pattern)
+        for product_name, url, pattern in get_dtms.__defaults__[2]]
+    folders_count = len(set(url for _product_name, url, _pattern in urlbase_list))
+
+    url_response_dict.clear()
+    http_index_dict.clear()
+    t0 = time.perf_counter()
+    serial_count = 0
+    for _product_name, url, pattern in urlbase_list:
+        serial_count += len(get_http_files(url, pattern))
+    t1 = time.perf_counter()
+
+    url_response_dict.clear()
+    http_index_dict.clear()
+    t2 = time.perf_counter()
+    parallel_count = len(get_products(urlbase_list))
+    t3 = time.perf_counter()
+
+    server.shutdown()
+    print("Products: %s, folders: %s, latency: %.3fs" % (len(urlbase_list), folders_count, latency_seconds))
+    print("Serial:   %.3fs (%s files)" % (t1-t0, serial_count))
+    print("Parallel: %.3fs (%s files)" % (t3-t2, parallel_count))
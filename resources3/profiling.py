@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Module with functions to profile ICGC resources loading: named nested spans
+with wall and CPU time, bytes transferred and cache hits / misses, that can be
+shown as a text table or exported as JSON or Chrome trace format
+
+                             -------------------
+        begin                : 2026-10-18
+*******************************************************************************
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+
+# Configure internal library logger (Default is dummy logger)
+import logging
+log = logging.getLogger('dummy')
+log.addHandler(logging.NullHandler())
+
+# Profiling configuration (disabled profiling only costs a function call per span)
+enabled = True
+
+# Spans finalitzats: [{name, category, thread, depth, parent, start, wall, cpu, bytes, cache_hits, cache_misses}, ...]
+spans_list = []
+spans_lock = threading.Lock()
+# Pila de spans oberts per fil (per calcular l'aniuament)
+thread_data = threading.local()
+# Instant de referència dels temps relatius de l'informe
+origin_time = time.perf_counter()
+
+
+def configure(enable=None):
+    """ Activa / desactiva el profiling
+        ---
+        Enables / disables profiling
+        """
+    global enabled
+    if enable is not None:
+        enabled = enable
+
+def clear():
+    """ Esborra els spans registrats i reinicia l'instant de referència
+        ---
+        Clears registered spans and resets reference time
+        """
+    global origin_time
+    with spans_lock:
+        spans_list.clear()
+        origin_time = time.perf_counter()
+
+def get_current_span():
+    """ Retorna el span obert més intern del fil actual o None
+        ---
+        Returns innermost opened span of current thread or None
+        """
+    stack = getattr(thread_data, "stack", None)
+    return stack[-1] if stack else None
+
+@contextlib.contextmanager
+def span(name, category="", **args_dict):
+    """ Context per mesurar un bloc de codi. Els spans oberts dins un altre span del mateix fil
+        queden aniuats i els seus bytes i accessos a cache s'acumulen també al pare
+        Retorna (with): dict del span, es poden afegir valors a span["args"]
+        ---
+        Context to measure a code block. Spans opened inside another span of the same thread
+        are nested and their bytes and cache accesses are also accumulated on the parent
+        Returns (with): span dict, values can be added to span["args"]
+        """
+    if not enabled:
+        yield {"args": dict(args_dict)}
+        return
+    stack = getattr(thread_data, "stack", None)
+    if stack is None:
+        stack = thread_data.stack = []
+    parent = stack[-1] if stack else None
+    span_dict = {
+        "name": name,
+        "category": category,
+        "thread": threading.current_thread().name,
+        "thread_id": threading.get_ident(),
+        "depth": len(stack),
+        "parent": parent["name"] if parent else None,
+        "start": time.perf_counter() - origin_time,
+        "wall": None,
+        "cpu": None,
+        "bytes": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "args": dict(args_dict),
+        }
+    stack.append(span_dict)
+    t0 = time.perf_counter()
+    cpu0 = time.thread_time()
+    try:
+        yield span_dict
+    finally:
+        span_dict["cpu"] = time.thread_time() - cpu0
+        span_dict["wall"] = time.perf_counter() - t0
+        stack.pop()
+        # Acumulem els comptadors al pare
+        if parent:
+            parent["bytes"] += span_dict["bytes"]
+            parent["cache_hits"] += span_dict["cache_hits"]
+            parent["cache_misses"] += span_dict["cache_misses"]
+        with spans_lock:
+            spans_list.append(span_dict)
+
+def add_bytes(bytes_count):
+    """ Afegeix bytes transferits al span actual del fil (si n'hi ha)
+        ---
+        Adds transferred bytes to current thread span (if any)
+        """
+    current_span = get_current_span()
+    if current_span:
+        current_span["bytes"] += bytes_count
+
+def add_cache_access(hit):
+    """ Registra un accés a cache (encert o fallada) al span actual del fil (si n'hi ha)
+        ---
+        Registers a cache access (hit or miss) on current thread span (if any)
+        """
+    current_span = get_current_span()
+    if current_span:
+        current_span["cache_hits" if hit else "cache_misses"] += 1
+
+def get_spans():
+    """ Retorna una còpia dels spans finalitzats ordenats per instant d'inici
+        ---
+        Returns a copy of finished spans sorted by start time
+        """
+    with spans_lock:
+        return sorted([dict(span_dict) for span_dict in spans_list], key=lambda s: (s["thread_id"], s["start"]))
+
+def get_report_table(title="Resources profiling", min_wall_seconds=0):
+    """ Retorna un informe de text en forma de taula amb els spans aniuats per fil
+        ---
+        Returns a text report as a table with nested spans by thread
+        """
+    name_width = 64
+    header = "%-*s %10s %10s %10s %10s %6s %6s" % (name_width, "Span", "Start", "Wall", "CPU", "KB", "Hits", "Miss")
+    lines_list = [title, header, "-" * len(header)]
+    last_thread = None
+    for span_dict in get_spans():
+        if span_dict["wall"] < min_wall_seconds:
+            continue
+        if span_dict["thread"] != last_thread:
+            lines_list.append("[%s]" % span_dict["thread"])
+            last_thread = span_dict["thread"]
+        name = (("%s:%s" % (span_dict["category"], span_dict["name"])) if span_dict["category"] else span_dict["name"])
+        indent = "  " * span_dict["depth"]
+        # Retallem els noms llargs (URLs) pel principi, la part final és la més informativa
+        if len(indent) + len(name) > name_width:
+            name = "..." + name[len(indent) + len(name) - name_width + 3:]
+        lines_list.append("%-*s %9.3fs %9.3fs %9.3fs %10.1f %6d %6d" % (name_width, indent + name,
+            span_dict["start"], span_dict["wall"], span_dict["cpu"], span_dict["bytes"] / 1024.0,
+            span_dict["cache_hits"], span_dict["cache_misses"]))
+    return "\n".join(lines_list)
+
+def to_json(pathname=None):
+    """ Exporta els spans en format JSON. Si s'indica un arxiu l'escriu, si no retorna el text
+        ---
+        Exports spans in JSON format. If a file is indicated it writes it, else returns the text
+        """
+    json_text = json.dumps({"spans": get_spans()}, indent=2, default=str)
+    if not pathname:
+        return json_text
+    with open(pathname, "w", encoding="utf-8") as json_file:
+        json_file.write(json_text)
+    log.debug("Profiling JSON exported: %s", pathname)
+    return pathname
+
+def to_chrome_trace(pathname=None):
+    """ Exporta els spans en format "Trace Event" de Chrome (chrome://tracing, Perfetto).
+        Si s'indica un arxiu l'escriu, si no retorna el text
+        ---
+        Exports spans in Chrome "Trace Event" format (chrome://tracing, Perfetto).
+        If a file is indicated it writes it, else returns the text
+        """
+    pid = os.getpid()
+    events_list = []
+    threads_dict = {}
+    for span_dict in get_spans():
+        threads_dict[span_dict["thread_id"]] = span_dict["thread"]
+        args_dict = dict(span_dict["args"])
+        args_dict.update({"cpu_ms": round(span_dict["cpu"] * 1000, 3), "bytes": span_dict["bytes"],
+            "cache_hits": span_dict["cache_hits"], "cache_misses": span_dict["cache_misses"]})
+        events_list.append({"name": span_dict["name"], "cat": span_dict["category"] or "resources", "ph": "X",
+            "ts": round(span_dict["start"] * 1000000), "dur": round(span_dict["wall"] * 1000000),
+            "pid": pid, "tid": span_dict["thread_id"], "args": args_dict})
+    # Noms dels fils
+    events_list += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}}
+        for thread_id, thread_name in threads_dict.items()]
+    trace_text = json.dumps({"traceEvents": events_list, "displayTimeUnit": "ms"}, default=str)
+    if not pathname:
+        return trace_text
+    with open(pathname, "w", encoding="utf-8") as trace_file:
+        trace_file.write(trace_text)
+    log.debug("Profiling Chrome trace exported: %s", pathname)
+    return pathname
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Module with a shared HTTP session (connection pools per host, keep-alive,
+compression and retry policy) used by all network requests to ICGC resources
+
+                             -------------------
+        begin                : 2026-10-18
+*******************************************************************************
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configure internal library logger (Default is dummy logger)
+import logging
+log = logging.getLogger('dummy')
+log.addHandler(logging.NullHandler())
+
+# Session configuration
+retries = 2
+backoff_factor = 0.3
+retry_status_list = [500, 502, 503, 504]
+pool_connections = 10
+pool_maxsize = 10
+user_agent = None
+
+# Shared session (delayed initialization)
+session = None
+session_lock = threading.Lock()
+
+
+def configure(retries_count=None, backoff=None, max_connections=None, agent=None):
+    """ Configura la política de reintents, la mida dels pools de connexions i l'user agent
+        de la sessió compartida (es recrea la sessió si ja existia)
+        ---
+        Configures retry policy, connection pools size and user agent of the shared session
+        (session is recreated if it already exists)
+        """
+    global retries, backoff_factor, pool_maxsize, user_agent
+    if retries_count is not None:
+        retries = retries_count
+    if backoff is not None:
+        backoff_factor = backoff
+    if max_connections is not None:
+        pool_maxsize = max_connections
+    if agent is not None:
+        user_agent = agent
+    close()
+
+def get_session():
+    """ Retorna la sessió HTTP compartida, creant-la si cal
+        ---
+        Returns shared HTTP session, creating it if necessary
+        """
+    global session
+    with session_lock:
+        if not session:
+            # Reintents amb espera exponencial per errors de connexió, timeouts i errors de servidor
+            retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                backoff_factor=backoff_factor, status_forcelist=retry_status_list, raise_on_status=False)
+            # Un pool de connexions persistents (keep-alive) per cada host
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+            if user_agent:
+                session.headers.update({"User-Agent": user_agent})
+            log.debug("HTTP session created (retries: %s, backoff: %s, pool size: %s)", retries, backoff_factor, pool_maxsize)
+    return session
+
+def get(url, **params_dict):
+    """ Executa una petició GET amb la sessió compartida (mateixos paràmetres que requests.get)
+        ---
+        Executes a GET request with the shared session (same parameters as requests.get)
+        """
+    return get_session().get(url, **params_dict)
+
+def close():
+    """ Tanca la sessió compartida i allibera les connexions obertes
+        ---
+        Closes shared session and frees opened connections
+        """
+    global session
+    with session_lock:
+        if session:
+            session.close()
+            session = None
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Module with functions to build and load a snapshot catalog of ICGC resources
+(HTTP folders listings and WMS / WFS capabilities layers) that allows to initialize
+the resources with a local file read instead of network discovery
+
+                             -------------------
+        begin                : 2026-10-18
+*******************************************************************************
+"""
+
+import os
+import json
+import datetime
+from importlib import reload
+
+from . import http
+reload(http)
+from . import wms
+reload(wms)
+from . import wfs
+reload(wfs)
+from . import fme
+reload(fme)
+
+# Configure internal library logger (Default is dummy logger)
+import logging
+log = logging.getLogger('dummy')
+log.addHandler(logging.NullHandler())
+
+# Snapshot format version (snapshots with other versions are ignored)
+SNAPSHOT_VERSION = 1
+# Default snapshot bundled with the plugin
+SNAPSHOT_PATHNAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "resources_snapshot.json")
+# Extra WMS services to include in the snapshot: [(url, version), ...]
+SNAPSHOT_EXTRA_WMS_LIST = [
+    ("https://fototeca-connector.icgc.cat/", "1.1.1"), # Photolib WMS-T
+    ]
+
+# Loaded snapshot info: {"pathname", "created"} or None
+snapshot_info = None
+
+
+def get_discovery_functions_list():
+    """ Retorna la llista de funcions de descobriment de recursos que utilitza el plugin: [(name, function), ...]
+        ---
+        Returns the list of resources discovery functions used by the plugin: [(name, function), ...]
+        """
+    return [
+        ("dtms", http.get_dtms),
+        ("coastlines", http.get_coastlines),
+        ("coast_orthophotos", http.get_coast_orthophotos),
+        ("coast_lidar", http.get_coast_lidar),
+        ("sheets", http.get_sheets),
+        ("grids", http.get_grids),
+        ("delimitations", http.get_delimitations),
+        ("census_tracts", http.get_census_tracts),
+        ("decentralized_municipal_entities", http.get_decentralized_municipal_entities),
+        ("population_zones", http.get_population_zones),
+        ("ndvis", http.get_ndvis),
+        ("topographic_5k", http.get_topographic_5k),
+        ("historic_ortho", http.get_historic_ortho_dict),
+        ("historic_local_ortho", http.get_historic_local_ortho_dict),
+        ("lidar_ortho", http.get_lidar_ortho),
+        ("wms_full_ortho", wms.get_full_ortho),
+        ("wms_full_local_ortho", wms.get_full_local_ortho),
+        ("wms_coastlines", wms.get_coastlines),
+        ("wms_coast_orthos", wms.get_coast_orthos),
+        ("wms_topo_ltr_layers", wms.get_topo_ltr_layers),
+        ("wfs_delimitations", wfs.get_delimitations),
+        ("fme_services", fme.get_services),
+        ] + [("wms_%s" % url, lambda url=url, version=version: wms.get_wms_capabilities_layers(url, version))
+            for url, version in SNAPSHOT_EXTRA_WMS_LIST]
+
+def get_catalog():
+    """ Retorna el catàleg de les dades de recursos carregades en memòria:
+        {"version", "created", "http": {url: [filename, ...]}, "wms": [[url, version, layers_list, root_name], ...],
+        "wfs": [[url, version, feature_types_list], ...]}
+        ---
+        Returns the catalog of resources data loaded in memory:
+        {"version", "created", "http": {url: [filename, ...]}, "wms": [[url, version, layers_list, root_name], ...],
+        "wfs": [[url, version, feature_types_list], ...]}
+        """
+    # Els repositoris es poden estar omplint des d'altres fils, els llegim protegits pels seus locks
+    with wms.wms_capabilities_lock:
+        wms_list = [[url, version, layers_list, wms.wms_capabilities_roots_dict.get((url, version))]
+            for (url, version), layers_list in wms.wms_capabilities_dict.items()]
+    with wfs.wfs_capabilities_lock:
+        wfs_list = [[url, version, feature_types_list] for (url, version), feature_types_list in wfs.wfs_capabilities_dict.items()]
+    return {
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "http": http.get_http_folders_files(),
+        "wms": wms_list,
+        "wfs": wfs_list,
+        }
+
+def save(catalog_dict, pathname):
+    """ Guarda un catàleg en un arxiu JSON compacte (via arxiu temporal per evitar arxius a mitges)
+        ---
+        Saves a catalog on a compact JSON file (via temporal file to avoid partial files)
+        """
+    folder = os.path.dirname(pathname)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(pathname + ".tmp", "w", encoding="utf-8") as snapshot_file:
+        json.dump(catalog_dict, snapshot_file, ensure_ascii=False, separators=(",", ":"))
+    os.replace(pathname + ".tmp", pathname)
+    log.info("Resources snapshot saved: %s (HTTP folders: %s, WMS services: %s, WFS services: %s)",
+        pathname, len(catalog_dict["http"]), len(catalog_dict["wms"]), len(catalog_dict["wfs"]))
+
+def build(pathname=SNAPSHOT_PATHNAME, save_on_errors=True):
+    """ Executa totes les funcions de descobriment de recursos i guarda el catàleg resultant
+        (si save_on_errors és fals, no es guarda si alguna funció de descobriment falla)
+        Retorna: dict catàleg
+        ---
+        Executes all resources discovery functions and saves the resulting catalog
+        (if save_on_errors is false, it is not saved if any discovery function fails)
+        Returns: catalog dict
+        """
+    global snapshot_info
+    t0 = datetime.datetime.now()
+    errors_count = 0
+    for name, function in get_discovery_functions_list():
+        try:
+            function()
+        except Exception as e:
+            errors_count += 1
+            log.exception("Resources snapshot discovery error %s: %s", name, e)
+    catalog_dict = get_catalog()
+    # Les funcions de descobriment no fallen sense connexió, però no obtenen cap carpeta
+    if not catalog_dict["http"]:
+        errors_count += 1
+    if pathname:
+        if errors_count and not save_on_errors:
+            log.warning("Resources snapshot build errors: %s, snapshot not saved", errors_count)
+        else:
+            save(catalog_dict, pathname)
+            snapshot_info = {"pathname": pathname, "created": catalog_dict["created"]}
+    t1 = datetime.datetime.now()
+    log.info("Resources snapshot built (%s)", t1-t0)
+    return catalog_dict
+
+def read(pathname):
+    """ Llegeix un arxiu de catàleg. Retorna el dict del catàleg o None si no existeix o no és vàlid
+        ---
+        Reads a catalog file. Returns catalog dict or None if it not exists or it is not valid
+        """
+    if not pathname or not os.path.exists(pathname):
+        return None
+    try:
+        with open(pathname, "r", encoding="utf-8") as snapshot_file:
+            catalog_dict = json.load(snapshot_file)
+    except Exception as e:
+        log.warning("Resources snapshot read error (%s): %s", e, pathname)
+        return None
+    if catalog_dict.get("version") != SNAPSHOT_VERSION:
+        log.warning("Resources snapshot version %s not supported: %s", catalog_dict.get("version"), pathname)
+        return None
+    return catalog_dict
+
+def load(pathnames_list):
+    """ Carrega en memòria el catàleg més recent d'una llista d'arxius (per exemple el distribuït
+        amb el plugin i el refrescat per l'usuari). Les funcions de descobriment utilitzaran aquestes dades
+        sense accedir a la xarxa. Retorna True si s'ha carregat algun catàleg
+        ---
+        Loads in memory the newest catalog of a files list (for example the one distributed with the
+        plugin and the one refreshed by the user). Discovery functions will use these data without
+        network access. Returns True if any catalog is loaded
+        """
+    global snapshot_info
+    t0 = datetime.datetime.now()
+    catalogs_list = [(catalog_dict["created"], pathname, catalog_dict) for pathname, catalog_dict in \
+        [(pathname, read(pathname)) for pathname in pathnames_list] if catalog_dict]
+    if not catalogs_list:
+        return False
+    created, pathname, catalog_dict = max(catalogs_list, key=lambda c: c[0])
+
+    for url, files_list in catalog_dict["http"].items():
+        http.set_http_files(url, files_list)
+    for url, version, layers_list, *root_name in catalog_dict["wms"]:
+        # JSON no té tuples, restaurem el format de get_wms_layer_info
+        wms.set_wms_capabilities_layers(url, version, [(name, title,
+            {dimension: tuple(values) for dimension, values in dimensions_dict.items()},
+            [tuple(bbox) for bbox in bbox_list], styles_list)
+            for name, title, dimensions_dict, bbox_list, styles_list in layers_list], (root_name + [None])[0])
+    for url, version, feature_types_list in catalog_dict.get("wfs", []):
+        wfs.set_wfs_capabilities_feature_types(url, version, [(name, title, default_crs, [tuple(bbox) for bbox in bbox_list])
+            for name, title, default_crs, bbox_list in feature_types_list])
+    snapshot_info = {"pathname": pathname, "created": created}
+    t1 = datetime.datetime.now()
+    log.info("Resources snapshot loaded: %s created: %s (HTTP folders: %s, WMS services: %s, WFS services: %s) (%s)",
+        pathname, created, len(catalog_dict["http"]), len(catalog_dict["wms"]), len(catalog_dict.get("wfs", [])), t1-t0)
+    return True
+
+def refresh(pathname):
+    """ Torna a descarregar les carpetes HTTP i capabilities WMS / WFS del catàleg carregat, actualitza
+        les dades en memòria i guarda el nou catàleg (pensat per executar-se en segon pla).
+        Si no hi ha cap catàleg carregat (primera execució) guarda com a primer catàleg les dades que
+        ja han carregat els recursos (cal cridar-la quan han acabat de carregar-se, no torna a descobrir res).
+        Les dades ja derivades en memòria s'actualitzaran en el proper inici
+        ---
+        Downloads again HTTP folders and WMS / WFS capabilities of the loaded catalog, updates memory data
+        and saves the new catalog (intended to run on background).
+        If there is not any loaded catalog (first run) it saves as first catalog the data already loaded
+        by resources (it must be called when they have been loaded, it does not discover anything again).
+        Memory derived data will be updated on next start
+        """
+    global snapshot_info
+    if not snapshot_info:
+        catalog_dict = get_catalog()
+        # Si no tenim connexió no guardem un catàleg buit, es tornarà a intentar en el proper inici
+        if not catalog_dict["http"]:
+            log.warning("Resources snapshot without HTTP folders, snapshot not saved")
+            return False
+        save(catalog_dict, pathname)
+        snapshot_info = {"pathname": pathname, "created": catalog_dict["created"]}
+        return True
+    t0 = datetime.datetime.now()
+    catalog_dict = get_catalog()
+    errors_count = 0
+    for url in catalog_dict["http"].keys():
+        response_data = http.get_http_dir(url)
+        if response_data:
+            http.set_http_files(url, http.http_href_regex.findall(response_data))
+        else:
+            errors_count += 1
+    for url, version, _layers_list, _root_name in catalog_dict["wms"]:
+        layers_list, root_name = wms.read_wms_capabilities_layers(url, version)
+        if layers_list:
+            wms.set_wms_capabilities_layers(url, version, layers_list, root_name)
+        else:
+            errors_count += 1
+    for url, version, _feature_types_list in catalog_dict["wfs"]:
+        feature_types_list = list(wfs.iter_wfs_capabilities_feature_types(url, version))
+        if feature_types_list:
+            wfs.set_wfs_capabilities_feature_types(url, version, feature_types_list)
+        else:
+            errors_count += 1
+    # Si no tenim connexió mantenim el catàleg anterior
+    if errors_count:
+        log.warning("Resources snapshot refresh errors: %s, snapshot not saved", errors_count)
+        return False
+    save(get_catalog(), pathname)
+    t1 = datetime.datetime.now()
+    log.info("Resources snapshot refreshed: %s (%s)", pathname, t1-t0)
+    return True
+
+
+if __name__ == "__main__":
+    # Eina de generació del snapshot de recursos per distribuir amb el plugin
+    # (executar: python -m resources3.snapshot [arxiu])
+    # ---
+    # Resources snapshot build tool to distribute with the plugin
+    # (run: python -m resources3.snapshot [file])
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    log = logging.getLogger()
+    http.log = wms.log = wfs.log = fme.log = log
+    build(sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATHNAME)
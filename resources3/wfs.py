@@ -15,7 +15,14 @@ import re
 import os
 import datetime
 import logging
-import requests
+import threading
+import lxml.etree
+from importlib import reload
+
+from . import cache
+reload(cache)
+from . import profiling
+reload(profiling)
 
 # Configure internal library logger (Default is dummy logger)
 log = logging.getLogger('dummy')
@@ -41,17 +48,22 @@ order_dict = {
     "provincies": 6,
     "catalunya": 7
     }
+# Repositori de capabilities WFS compartit: {(url, version): [(name, title, default_crs, bbox_list), ...]}
+wfs_capabilities_dict = {}
+wfs_capabilities_lock = threading.Lock()
 
 
-def get_wfs_capabilities(url, version="2.0.0", timeout_seconds=10, retries=3):
+def get_wfs_capabilities(url, version="2.0.0", timeout_seconds=10, retries=1):
     """ Obté el text del capabilities d'un servei WFS
         ---
         Gets capabilities text from WFS service
         """
+    # ATENCIÓ! Els reintents amb espera ja els gestiona la sessió HTTP compartida (session.py)
     capabilities_url = "%s?REQUEST=GetCapabilities&SERVICE=WFS&VERSION=%s" % (url, version)
+    response_data = ""
     while retries:
         try:
-            response_data = requests.get(capabilities_url, verify=True, timeout=timeout_seconds).text
+            response_data = cache.get(capabilities_url, timeout_seconds)
             retries = 0
         except socket.timeout:
             retries -= 1
@@ -61,16 +73,147 @@ def get_wfs_capabilities(url, version="2.0.0", timeout_seconds=10, retries=3):
             log.exception("WFS resources error (%s), retries: %s, URL: %s", retries, e, capabilities_url)
     if not response_data:
         log.error("WFS resources error, exhausted retries")
+        # Si no tenim connexió, utilitzem les dades de la cache persistent encara que estiguin caducades
+        response_data = cache.get_stale_data(capabilities_url)
     return response_data
 
+def iter_wfs_capabilities_data(capabilities_url, timeout_seconds=10, retries=1):
+    """ Obté el capabilities d'un servei WFS per blocs a mesura que arriben les dades
+        ---
+        Gets capabilities from WFS service by chunks as data arrives
+        """
+    # ATENCIÓ! Els reintents amb espera ja els gestiona la sessió HTTP compartida (session.py)
+    while retries:
+        data_yielded = False
+        try:
+            for chunk in cache.iter_content(capabilities_url, timeout_seconds):
+                data_yielded = True
+                yield chunk
+            return
+        except socket.timeout:
+            retries -= 1
+            log.warning("WFS resources timeout, retries: %s, URL: %s", retries, capabilities_url)
+        except Exception as e:
+            # Si ja hem retornat dades no podem reintentar sense duplicar-les
+            retries = 0 if data_yielded else retries - 1
+            log.exception("WFS resources error (%s), retries: %s, URL: %s", e, retries, capabilities_url)
+        if data_yielded:
+            return
+    log.error("WFS resources error, exhausted retries")
+    # Si no tenim connexió, utilitzem les dades de la cache persistent encara que estiguin caducades
+    response_data = cache.get_stale_content(capabilities_url)
+    if response_data:
+        yield response_data
+
+def get_wfs_feature_type_info(feature_type):
+    """ Extreu la informació d'un element FeatureType d'un capabilities WFS
+        Retorna: (name, title, default_crs, bbox_list)
+        - bbox_list: [(crs, min_x, min_y, max_x, max_y), ...] (WGS84BoundingBox)
+        ---
+        Extracts info of a WFS capabilities FeatureType element
+        Returns: (name, title, default_crs, bbox_list)
+        - bbox_list: [(crs, min_x, min_y, max_x, max_y), ...] (WGS84BoundingBox)
+        """
+    name, title, default_crs = None, None, None
+    bbox_list = []
+    for child in feature_type:
+        tag = child.tag.rsplit("}", 1)[-1] if isinstance(child.tag, str) else None
+        if tag == "Name":
+            name = (child.text or "").strip()
+        elif tag == "Title":
+            title = (child.text or "").strip()
+        elif tag in ("DefaultCRS", "DefaultSRS", "SRS"):
+            default_crs = (child.text or "").strip()
+        elif tag == "WGS84BoundingBox":
+            corners_dict = {corner.tag.rsplit("}", 1)[-1]: (corner.text or "").split() for corner in child if isinstance(corner.tag, str)}
+            try:
+                min_x, min_y = [float(value) for value in corners_dict["LowerCorner"]]
+                max_x, max_y = [float(value) for value in corners_dict["UpperCorner"]]
+                bbox_list.append(("EPSG:4326", min_x, min_y, max_x, max_y))
+            except (KeyError, ValueError):
+                pass
+    return name, title, default_crs, bbox_list
+
+def iter_wfs_capabilities_feature_types(url, version="2.0.0", names_list=None, timeout_seconds=10, retries=1):
+    """ Extreu els tipus d'entitat d'un capabilities WFS en streaming (lxml), a mesura que arriben les dades.
+        Els elements ja processats s'alliberen i si s'indica names_list només es retornen aquests tipus
+        i s'atura la lectura quan s'han trobat tots
+        Retorna (generador): (name, title, default_crs, bbox_list), veure get_wfs_feature_type_info
+        ---
+        Extracts feature types from WFS capabilities in streaming (lxml), as data arrives.
+        Processed elements are released and if names_list is indicated only these types are returned
+        and reading stops when all of them are found
+        Returns (generator): (name, title, default_crs, bbox_list), see get_wfs_feature_type_info
+        """
+    t0 = datetime.datetime.now()
+    capabilities_url = "%s?REQUEST=GetCapabilities&SERVICE=WFS&VERSION=%s" % (url, version)
+    pending_names_set = set(names_list) if names_list else None
+    feature_types_count = 0
+    parser = lxml.etree.XMLPullParser(events=("end",), resolve_entities=False)
+    try:
+        for chunk in iter_wfs_capabilities_data(capabilities_url, timeout_seconds, retries):
+            parser.feed(chunk)
+            for _event, element in parser.read_events():
+                if not isinstance(element.tag, str) or element.tag.rsplit("}", 1)[-1] != "FeatureType":
+                    continue
+                feature_type_info = get_wfs_feature_type_info(element)
+                element.clear(keep_tail=True)
+                if not feature_type_info[0]:
+                    continue
+                if pending_names_set is not None:
+                    if feature_type_info[0] not in pending_names_set:
+                        continue
+                    pending_names_set.discard(feature_type_info[0])
+                feature_types_count += 1
+                yield feature_type_info
+                if pending_names_set is not None and not pending_names_set:
+                    return
+    except lxml.etree.XMLSyntaxError as e:
+        log.warning("WFS resources capabilities parse error (%s), URL: %s", e, capabilities_url)
+    finally:
+        t1 = datetime.datetime.now()
+        log.debug("WFS resources feature types URL: %s found: %s (%s)", capabilities_url, feature_types_count, t1-t0)
+
+def get_wfs_capabilities_feature_types(url, version="2.0.0", timeout_seconds=10, retries=1):
+    """ Obté els tipus d'entitat d'un servei WFS del repositori de capabilities compartit
+        (el capabilities de cada (url, version) només es descarrega i s'analitza una vegada)
+        Retorna: [(name, title, default_crs, bbox_list), ...], veure get_wfs_feature_type_info
+        ---
+        Gets WFS service feature types from the shared capabilities repository
+        (capabilities of each (url, version) is downloaded and parsed only once)
+        Returns: [(name, title, default_crs, bbox_list), ...], see get_wfs_feature_type_info
+        """
+    key = (url, version)
+    with wfs_capabilities_lock:
+        feature_types_list = wfs_capabilities_dict.get(key)
+    if feature_types_list is None:
+        with profiling.span(url, "wfs", version=version):
+            feature_types_list = list(iter_wfs_capabilities_feature_types(url, version, timeout_seconds=timeout_seconds, retries=retries))
+        # Si no hem obtingut res no ho guardem per poder-ho reintentar més endavant
+        if feature_types_list:
+            set_wfs_capabilities_feature_types(url, version, feature_types_list)
+    return feature_types_list
+
+def set_wfs_capabilities_feature_types(url, version, feature_types_list):
+    """ Guarda els tipus d'entitat d'un servei WFS al repositori de capabilities compartit (per exemple obtinguts d'un snapshot)
+        ---
+        Stores WFS service feature types on the shared capabilities repository (for example obtained from a snapshot)
+        """
+    with wfs_capabilities_lock:
+        wfs_capabilities_dict[(url, version)] = feature_types_list
+
 def get_wfs_capabilities_info(url, reg_ex_filter):
-    """ Extreu informació del capabilies d'un WFS via expresions regulars
+    """ Extreu informació del capabilies d'un WFS via expresions regulars.
+        L'expressió regular s'aplica sobre el text "<wfs:Name>nom</wfs:Name>\n<wfs:Title>títol</wfs:Title>" de cada tipus d'entitat
         ---
         Extract info from WFS capabilities using regular expressions
+        The regular expression is applied over text "<wfs:Name>name</wfs:Name>\n<wfs:Title>title</wfs:Title>" of each feature type
         """
     t0 = datetime.datetime.now()
-    response_data = get_wfs_capabilities(url)
-    data_list = re.findall(reg_ex_filter, response_data)
+    regex = re.compile(reg_ex_filter)
+    data_list = []
+    for name, title, _default_crs, _bbox_list in get_wfs_capabilities_feature_types(url):
+        data_list += regex.findall("<wfs:Name>%s</wfs:Name>\n<wfs:Title>%s</wfs:Title>" % (name, title or ""))
     t1 = datetime.datetime.now()
     log.debug("WFS resources info URL: %s pattern: %s found: %s (%s)", url, reg_ex_filter, len(data_list), t1-t0)
     return data_list
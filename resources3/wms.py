@@ -14,22 +14,46 @@ import socket
 import re
 import datetime
 import logging
-import requests
+import threading
+import lxml.etree
+from importlib import reload
+
+from . import cache
+reload(cache)
+from . import profiling
+reload(profiling)
 
 # Configure internal library logger (Default is dummy logger)
 log = logging.getLogger('dummy')
 log.addHandler(logging.NullHandler())
 
+# Repositori de capabilities WMS compartit: {(url, version): [(name, title, dimensions_dict, bbox_list, styles_list), ...]}
+wms_capabilities_dict = {}
+# Nom de la capa arrel (capa de primer nivell de Capability) de cada servei WMS: {(url, version): name o None}
+wms_capabilities_roots_dict = {}
+# Locks per clau (url, version) per evitar descàrregues duplicades des de diferents fils
+wms_capabilities_locks_dict = {}
+wms_capabilities_lock = threading.Lock()
+
+
+def get_wms_capabilities_url(url, version="1.1.1"):
+    """ Retorna la URL de la petició GetCapabilities d'un servei WMS
+        ---
+        Returns GetCapabilities request URL of a WMS service
+        """
+    return "%s%sREQUEST=GetCapabilities&SERVICE=WMS&VERSION=%s" % (url, "&" if url.find("?") >= 0 else "?", version)
 
-def get_wms_capabilities(url, version="1.1.1", timeout_seconds=10, retries=3):
+def get_wms_capabilities(url, version="1.1.1", timeout_seconds=10, retries=1):
     """ Obté el text del capabilities d'un servei WMS
         ---
         Gets capabilities text from WMS service
         """
-    capabilities_url = "%s?REQUEST=GetCapabilities&SERVICE=WMS&VERSION=%s" % (url, version)
+    # ATENCIÓ! Els reintents amb espera ja els gestiona la sessió HTTP compartida (session.py)
+    capabilities_url = get_wms_capabilities_url(url, version)
+    response_data = ""
     while retries:
         try:
-            response_data = requests.get(capabilities_url, verify=True, timeout=timeout_seconds).text
+            response_data = cache.get(capabilities_url, timeout_seconds)
             retries = 0
         except socket.timeout:
             retries -= 1
@@ -39,16 +63,241 @@ def get_wms_capabilities(url, version="1.1.1", timeout_seconds=10, retries=3):
             log.exception("WMS resources error (%s), retries: %s, URL: %s", retries, e, capabilities_url)
     if not response_data:
         log.error("WMS resources error, exhausted retries")
+        # Si no tenim connexió, utilitzem les dades de la cache persistent encara que estiguin caducades
+        response_data = cache.get_stale_data(capabilities_url)
     return response_data
 
+def iter_wms_capabilities_data(capabilities_url, timeout_seconds=10, retries=1):
+    """ Obté el capabilities d'un servei WMS per blocs a mesura que arriben les dades
+        ---
+        Gets capabilities from WMS service by chunks as data arrives
+        """
+    # ATENCIÓ! Els reintents amb espera ja els gestiona la sessió HTTP compartida (session.py)
+    while retries:
+        data_yielded = False
+        try:
+            for chunk in cache.iter_content(capabilities_url, timeout_seconds):
+                data_yielded = True
+                yield chunk
+            return
+        except socket.timeout:
+            retries -= 1
+            log.warning("WMS resources timeout, retries: %s, URL: %s", retries, capabilities_url)
+        except Exception as e:
+            # Si ja hem retornat dades no podem reintentar sense duplicar-les
+            retries = 0 if data_yielded else retries - 1
+            log.exception("WMS resources error (%s), retries: %s, URL: %s", e, retries, capabilities_url)
+        if data_yielded:
+            return
+    log.error("WMS resources error, exhausted retries")
+    # Si no tenim connexió, utilitzem les dades de la cache persistent encara que estiguin caducades
+    response_data = cache.get_stale_content(capabilities_url)
+    if response_data:
+        yield response_data
+
+def get_xml_local_name(element):
+    """ Retorna el nom d'un tag XML sense namespace
+        ---
+        Returns XML tag name without namespace
+        """
+    return element.tag.rsplit("}", 1)[-1] if isinstance(element.tag, str) else None
+
+def get_wms_layer_info(layer):
+    """ Extreu la informació pròpia (fills directes) d'un element Layer d'un capabilities WMS
+        Retorna: (name, title, dimensions_dict, bbox_list, styles_list)
+        - dimensions_dict: {dimension_name: (values_text, default)} (Dimension 1.3.0 o Dimension + Extent 1.1.1)
+        - bbox_list: [(crs, min_x, min_y, max_x, max_y), ...]
+        - styles_list: [style_name, ...]
+        ---
+        Extracts own info (direct children) of a WMS capabilities Layer element
+        Returns: (name, title, dimensions_dict, bbox_list, styles_list)
+        - dimensions_dict: {dimension_name: (values_text, default)} (Dimension 1.3.0 or Dimension + Extent 1.1.1)
+        - bbox_list: [(crs, min_x, min_y, max_x, max_y), ...]
+        - styles_list: [style_name, ...]
+        """
+    name, title = None, None
+    dimensions_dict = {}
+    bbox_list = []
+    styles_list = []
+    for child in layer:
+        tag = get_xml_local_name(child)
+        if tag == "Name":
+            name = (child.text or "").strip()
+        elif tag == "Title":
+            title = (child.text or "").strip()
+        elif tag in ("Dimension", "Extent"):
+            # En WMS 1.1.1 els valors són a l'element Extent i en 1.3.0 a l'element Dimension
+            values_text, default = dimensions_dict.get(child.get("name"), ("", None))
+            dimensions_dict[child.get("name")] = ((child.text or "").strip() or values_text, child.get("default") or default)
+        elif tag == "BoundingBox":
+            try:
+                bbox_list.append((child.get("CRS") or child.get("SRS"),
+                    float(child.get("minx")), float(child.get("miny")), float(child.get("maxx")), float(child.get("maxy"))))
+            except (TypeError, ValueError):
+                pass
+        elif tag == "Style":
+            styles_list += [(style_child.text or "").strip() for style_child in child if get_xml_local_name(style_child) == "Name"]
+    return name, title, dimensions_dict, bbox_list, styles_list
+
+def iter_wms_capabilities_layers(url, version="1.1.1", timeout_seconds=10, retries=1, with_depth=False):
+    """ Extreu les capes d'un capabilities WMS en streaming (lxml), a mesura que arriben les dades,
+        en l'ordre del document (les capes pares abans que les seves filles).
+        Els elements ja processats s'alliberen
+        Retorna (generador): (name, title, dimensions_dict, bbox_list, styles_list), veure get_wms_layer_info
+        o (depth, (name, ...)) si with_depth (la capa arrel té profunditat 0)
+        ---
+        Extracts layers from WMS capabilities in streaming (lxml), as data arrives,
+        in document order (parent layers before their children).
+        Processed elements are released
+        Returns (generator): (name, title, dimensions_dict, bbox_list, styles_list), see get_wms_layer_info
+        or (depth, (name, ...)) if with_depth (root layer has depth 0)
+        """
+    t0 = datetime.datetime.now()
+    capabilities_url = get_wms_capabilities_url(url, version)
+    layers_count = 0
+    # Pila de capes obertes: [element, processada]
+    layers_stack = []
+    parser = lxml.etree.XMLPullParser(events=("start", "end"), resolve_entities=False)
+    try:
+        for chunk in iter_wms_capabilities_data(capabilities_url, timeout_seconds, retries):
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if get_xml_local_name(element) != "Layer":
+                    continue
+                # La informació pròpia d'una capa va abans de les capes filles, la processem quan
+                # comença la primera filla o quan acaba la capa (si no en té)
+                if layers_stack and not layers_stack[-1][1]:
+                    layers_stack[-1][1] = True
+                    layer_info = get_wms_layer_info(layers_stack[-1][0])
+                    if layer_info[0]:
+                        layers_count += 1
+                        yield (len(layers_stack) - 1, layer_info) if with_depth else layer_info
+                if event == "start":
+                    layers_stack.append([element, False])
+                    continue
+                layers_stack.pop()
+                # Alliberem la capa i els germans anteriors ja processats (capes o informació de la capa pare)
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+    except lxml.etree.XMLSyntaxError as e:
+        log.warning("WMS resources capabilities parse error (%s), URL: %s", e, capabilities_url)
+    finally:
+        t1 = datetime.datetime.now()
+        log.debug("WMS resources layers URL: %s found: %s (%s)", capabilities_url, layers_count, t1-t0)
+
+def read_wms_capabilities_layers(url, version="1.1.1", timeout_seconds=10, retries=1):
+    """ Descarrega i analitza les capes d'un servei WMS (sense utilitzar el repositori compartit)
+        Retorna: (layers_list, root_name), veure get_wms_capabilities_layers
+        ---
+        Downloads and parses the layers of a WMS service (without using the shared repository)
+        Returns: (layers_list, root_name), see get_wms_capabilities_layers
+        """
+    layers_list = []
+    root_name = None
+    for depth, layer_info in iter_wms_capabilities_layers(url, version, timeout_seconds, retries, with_depth=True):
+        if depth == 0:
+            root_name = layer_info[0]
+        layers_list.append(layer_info)
+    return layers_list, root_name
+
+def get_wms_capabilities_layers(url, version="1.1.1", timeout_seconds=10, retries=1, nested_only=False):
+    """ Obté les capes d'un servei WMS del repositori de capabilities compartit. El capabilities de cada
+        (url, version) només es descarrega i s'analitza una vegada, encara que es demani des de diferents fils.
+        Amb nested_only s'exclou la capa arrel (només les capes de Capability/Layer//Layer)
+        Retorna: [(name, title, dimensions_dict, bbox_list, styles_list), ...], veure get_wms_layer_info
+        ---
+        Gets WMS service layers from the shared capabilities repository. Capabilities of each (url, version)
+        is downloaded and parsed only once, even if it is requested from different threads.
+        With nested_only root layer is excluded (only Capability/Layer//Layer layers)
+        Returns: [(name, title, dimensions_dict, bbox_list, styles_list), ...], see get_wms_layer_info
+        """
+    key = (url, version)
+    with wms_capabilities_lock:
+        layers_list = wms_capabilities_dict.get(key)
+        key_lock = wms_capabilities_locks_dict.setdefault(key, threading.Lock())
+    if layers_list is None:
+        with key_lock:
+            # Si un altre fil ja ha llegit el capabilities mentre esperàvem, el reaprofitem
+            with wms_capabilities_lock:
+                layers_list = wms_capabilities_dict.get(key)
+            if layers_list is None:
+                with profiling.span(url, "wms", version=version) as span_dict:
+                    layers_list, root_name = read_wms_capabilities_layers(url, version, timeout_seconds, retries)
+                    span_dict["args"]["layers"] = len(layers_list)
+                # Si no hem obtingut res no ho guardem per poder-ho reintentar més endavant
+                if layers_list:
+                    set_wms_capabilities_layers(url, version, layers_list, root_name)
+    # La capa arrel (si té nom) és la primera en l'ordre del document
+    with wms_capabilities_lock:
+        root_name = wms_capabilities_roots_dict.get(key)
+    if nested_only and layers_list and root_name is not None:
+        return layers_list[1:]
+    return layers_list
+
+def set_wms_capabilities_layers(url, version, layers_list, root_name=None):
+    """ Guarda les capes d'un servei WMS al repositori de capabilities compartit (per exemple obtingudes d'un snapshot)
+        ---
+        Stores WMS service layers on the shared capabilities repository (for example obtained from a snapshot)
+        """
+    with wms_capabilities_lock:
+        wms_capabilities_dict[(url, version)] = layers_list
+        wms_capabilities_roots_dict[(url, version)] = root_name
+
+def get_wms_layer_names(url, version="1.1.1"):
+    """ Retorna la llista de noms de capa d'un servei WMS (repositori de capabilities compartit)
+        ---
+        Returns layer names list of a WMS service (shared capabilities repository)
+        """
+    return [name for name, _title, _dimensions_dict, _bbox_list, _styles_list in get_wms_capabilities_layers(url, version)]
+
+def get_wms_layer_dimension(url, layer_id, dimension_name="time", version="1.1.1"):
+    """ Retorna els valors i el valor per defecte d'una dimensió d'una capa WMS (repositori de capabilities compartit)
+        Retorna: (values_text, default) o (None, None) si no existeix
+        ---
+        Returns values and default value of a WMS layer dimension (shared capabilities repository)
+        Returns: (values_text, default) or (None, None) if not exists
+        """
+    for name, _title, dimensions_dict, _bbox_list, _styles_list in get_wms_capabilities_layers(url, version):
+        if name == layer_id:
+            return dimensions_dict.get(dimension_name, (None, None))
+    return None, None
+
+def get_wms_layer_styles(url, layer_id, version="1.1.1"):
+    """ Retorna la llista d'estils d'una capa WMS (repositori de capabilities compartit)
+        ---
+        Returns styles list of a WMS layer (shared capabilities repository)
+        """
+    for name, _title, _dimensions_dict, _bbox_list, styles_list in get_wms_capabilities_layers(url, version):
+        if name == layer_id:
+            return styles_list
+    return []
+
+def clear_wms_capabilities(url=None):
+    """ Esborra el repositori de capabilities compartit (tot o només les entrades d'una URL)
+        ---
+        Clears shared capabilities repository (all or only the entries of a URL)
+        """
+    with wms_capabilities_lock:
+        for key in list(wms_capabilities_dict.keys()):
+            if url is None or key[0] == url:
+                del wms_capabilities_dict[key]
+                wms_capabilities_roots_dict.pop(key, None)
+
 def get_wms_capabilities_info(url, reg_ex_filter):
-    """ Extreu informació del capabilies d'un WMS via expresions regulars
+    """ Extreu informació del capabilies d'un WMS via expresions regulars.
+        L'expressió regular s'aplica sobre el text "<Name>nom</Name>\n<Title>títol</Title>" de cada capa
+        amb nom, en l'ordre del document (el text ja no conté la resta del capabilities: servei, estils...)
         ---
-        Extract info from WMS capabilities using regular expressions
+        Extract info from WMS capabilities using regular expressions.
+        The regular expression is applied over text "<Name>name</Name>\n<Title>title</Title>" of each named layer,
+        in document order (text no longer contains the rest of capabilities: service, styles...)
         """
     t0 = datetime.datetime.now()
-    response_data = get_wms_capabilities(url)
-    data_list = re.findall(reg_ex_filter, response_data)
+    regex = re.compile(reg_ex_filter)
+    data_list = []
+    for name, title, _dimensions_dict, _bbox_list, _styles_list in get_wms_capabilities_layers(url):
+        data_list += regex.findall("<Name>%s</Name>\n<Title>%s</Title>" % (name, title or ""))
     t1 = datetime.datetime.now()
     log.debug("WMS resources info URL: %s pattern: %s found: %s (%s)", url, reg_ex_filter, len(data_list), t1-t0)
     return data_list
@@ -244,7 +493,7 @@ def get_historic_satelite_ortho(url="https://geoserveis.icgc.cat/icgc_sentinel2/
     return url, wms_ex_list
 
 def get_coastlines(url="https://geoserveis.icgc.cat/servei/catalunya/linia-costa/wms",
-    reg_ex_filter=r"<Name>(linia_costa_(.+))</Name>\s*<Title>\s*<\!\[CDATA\[\s*Línia de costa (.+)\s*\]\]>\s*</Title>"):
+    reg_ex_filter=r"<Name>(linia_costa_(.+))</Name>\s*<Title>\s*(?:<\!\[CDATA\[)?\s*Línia de costa (.+?)\s*(?:\]\]>)?\s*</Title>"):
     """ Obté la URL del servidor de linies de costa i la llista capes disponibles
         Retorna: URL, [(layer_id, layer_name, date_tag)]
         ---
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the resumable downloads helpers (qlib3.base.download.DownloadManager):
+partial download information, resume offsets and Content-Range headers
+*******************************************************************************
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from qlib3.base.download import DownloadManager
+except ImportError:
+    # DownloadManager requires PyQt5
+    DownloadManager = None
+
+
+REMOTE_FILE = "https://datacloud.icgc.cat/datacloud/test/gpkg_unzip/test.gpkg"
+
+
+@unittest.skipIf(DownloadManager is None, "PyQt5 is not available")
+class DownloadPartTest(unittest.TestCase):
+    """ Partial downloads information """
+
+    def setUp(self):
+        self.temp_path = tempfile.mkdtemp()
+        self.local_pathname = os.path.join(self.temp_path, "test.gpkg")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path, ignore_errors=True)
+
+    def write_part(self, data, part_info_dict=None, part_info_text=None):
+        with open(self.local_pathname + ".part", "wb") as part_file:
+            part_file.write(data)
+        if part_info_dict is not None or part_info_text is not None:
+            with open(self.local_pathname + ".part.json", "w", encoding="utf-8") as info_file:
+                info_file.write(part_info_text if part_info_text is not None else json.dumps(part_info_dict))
+
+    def test_get_part_info(self):
+        self.assertEqual(DownloadManager.get_part_info(self.local_pathname), {})
+        part_info_dict = {"url": REMOTE_FILE, "size": 1000, "validator": '"etag"'}
+        self.write_part(b"x" * 100, part_info_dict)
+        self.assertEqual(DownloadManager.get_part_info(self.local_pathname), part_info_dict)
+
+    def test_get_part_info_corrupted(self):
+        self.write_part(b"x" * 100, part_info_text='{"url": ')
+        self.assertEqual(DownloadManager.get_part_info(self.local_pathname), {})
+
+    def test_get_resume_info(self):
+        self.assertEqual(DownloadManager.get_resume_info(self.local_pathname, REMOTE_FILE), (0, None, None))
+        self.write_part(b"x" * 100, {"url": REMOTE_FILE, "size": 1000, "validator": '"etag"'})
+        self.assertEqual(DownloadManager.get_resume_info(self.local_pathname, REMOTE_FILE), (100, 1000, '"etag"'))
+
+    def test_get_resume_info_other_file(self):
+        # A partial download of other remote file (or without information) starts again
+        self.write_part(b"x" * 100, {"url": REMOTE_FILE + "?v=2", "size": 1000, "validator": None})
+        self.assertEqual(DownloadManager.get_resume_info(self.local_pathname, REMOTE_FILE), (0, None, None))
+        os.remove(self.local_pathname + ".part.json")
+        self.assertEqual(DownloadManager.get_resume_info(self.local_pathname, REMOTE_FILE), (0, None, None))
+
+    def test_get_resume_info_empty_part(self):
+        self.write_part(b"", {"url": REMOTE_FILE, "size": 1000, "validator": '"etag"'})
+        self.assertEqual(DownloadManager.get_resume_info(self.local_pathname, REMOTE_FILE), (0, None, None))
+
+    def test_remove_part(self):
+        self.write_part(b"x" * 100, {"url": REMOTE_FILE, "size": 1000, "validator": None})
+        DownloadManager.remove_part(self.local_pathname)
+        self.assertFalse(os.path.exists(self.local_pathname + ".part"))
+        self.assertFalse(os.path.exists(self.local_pathname + ".part.json"))
+        # Without partial download files it does nothing
+        DownloadManager.remove_part(self.local_pathname)
+
+
+@unittest.skipIf(DownloadManager is None, "PyQt5 is not available")
+class ContentRangeTest(unittest.TestCase):
+    """ Content-Range headers of partial responses """
+
+    def test_parse_content_range(self):
+        self.assertEqual(DownloadManager.parse_content_range("bytes 100-999/1000"), (100, 1000))
+        self.assertEqual(DownloadManager.parse_content_range("bytes 0-0/1"), (0, 1))
+        self.assertEqual(DownloadManager.parse_content_range("bytes  100-999/1000"), (100, 1000))
+
+    def test_parse_content_range_unknown_size(self):
+        self.assertEqual(DownloadManager.parse_content_range("bytes 100-999/*"), (100, None))
+
+    def test_parse_content_range_invalid(self):
+        for content_range in ["", "bytes */1000", "bytes 100/1000", "items 100-999/1000", "bytes=100-999/1000"]:
+            with self.subTest(content_range=content_range):
+                self.assertIsNone(DownloadManager.parse_content_range(content_range))
+
+
+if __name__ == "__main__":
+    unittest.main()
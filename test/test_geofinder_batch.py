@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the batch geocoding requests rate limiter
+(geofinder3.batch.RateLimiter)
+*******************************************************************************
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from geofinder3 import batch
+    from geofinder3.batch import RateLimiter
+except ImportError:
+    # Batch geocoding requires GDAL python bindings (osgeo)
+    batch = None
+
+
+class FakeClock(object):
+    """ Replaces time module of the rate limiter with a manual clock (sleep advances the clock) """
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps_list = []
+        self.lock = threading.Lock()
+    def monotonic(self):
+        with self.lock:
+            return self.now
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps_list.append(seconds)
+
+
+@unittest.skipIf(batch is None, "GDAL python bindings (osgeo) are not available")
+class RateLimiterTest(unittest.TestCase):
+    """ RateLimiter waits """
+
+    def setUp(self):
+        self.time_module = batch.time
+        self.clock = FakeClock()
+        batch.time = self.clock
+
+    def tearDown(self):
+        batch.time = self.time_module
+
+    def test_unlimited(self):
+        rate_limiter = RateLimiter(None)
+        for _i in range(100):
+            rate_limiter.wait()
+        self.assertEqual(self.clock.sleeps_list, [])
+
+    def test_interval(self):
+        rate_limiter = RateLimiter(10)
+        for _i in range(4):
+            rate_limiter.wait()
+        # First operation is not delayed, next ones are scheduled every 0.1 seconds
+        self.assertEqual([round(seconds, 6) for seconds in self.clock.sleeps_list], [0.1, 0.2, 0.3])
+
+    def test_idle_time(self):
+        rate_limiter = RateLimiter(10)
+        rate_limiter.wait()
+        # After an idle period operations are not delayed (idle time is not accumulated)
+        self.clock.now += 5
+        rate_limiter.wait()
+        self.clock.now += 0.05
+        rate_limiter.wait()
+        self.assertEqual([round(seconds, 6) for seconds in self.clock.sleeps_list], [0.05])
+
+    def test_threads(self):
+        rate_limiter = RateLimiter(100)
+        threads_list = [threading.Thread(target=rate_limiter.wait) for _i in range(20)]
+        for thread in threads_list:
+            thread.start()
+        for thread in threads_list:
+            thread.join()
+        # Each thread gets its own turn
+        self.assertEqual(sorted(round(seconds, 6) for seconds in self.clock.sleeps_list),
+            [round(i * 0.01, 6) for i in range(1, 20)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the geocoder responses cache (geofinder3.cache.ResponseCache):
+LRU discard, time to live, URL keys normalisation and SQLite persistence
+*******************************************************************************
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geofinder3 import cache
+from geofinder3.cache import ResponseCache
+
+
+class FakeClock(object):
+    """ Replaces time module of the cache with a manual clock """
+    def __init__(self, now=1000000.0):
+        self.now = now
+    def time(self):
+        return self.now
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """ ResponseCache memory and SQLite tiers """
+
+    def setUp(self):
+        self.time_module = cache.time
+        self.clock = FakeClock()
+        cache.time = self.clock
+        self.temp_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        cache.time = self.time_module
+        shutil.rmtree(self.temp_path, ignore_errors=True)
+
+    def test_get_set(self):
+        response_cache = ResponseCache()
+        self.assertIsNone(response_cache.get("https://eines.icgc.cat/geocodificador/cerca?text=Girona"))
+        response_cache.set("https://eines.icgc.cat/geocodificador/cerca?text=Girona", "response")
+        self.assertEqual(response_cache.get("https://eines.icgc.cat/geocodificador/cerca?text=Girona"), "response")
+        self.assertEqual((response_cache.hits, response_cache.misses), (1, 1))
+
+    def test_key_normalisation(self):
+        response_cache = ResponseCache()
+        response_cache.set("HTTPS://Eines.ICGC.cat/geocodificador/cerca?text=Girona&size=10", "response")
+        self.assertEqual(response_cache.get("https://eines.icgc.cat/geocodificador/cerca?size=10&text=Girona"), "response")
+        # Path and values are case sensitive
+        self.assertIsNone(response_cache.get("https://eines.icgc.cat/geocodificador/cerca?size=10&text=girona"))
+
+    def test_ttl(self):
+        response_cache = ResponseCache(ttl_seconds=60)
+        response_cache.set("https://a/1", "response")
+        self.clock.now += 59
+        self.assertEqual(response_cache.get("https://a/1"), "response")
+        self.clock.now += 1
+        self.assertIsNone(response_cache.get("https://a/1"))
+        self.assertNotIn(ResponseCache.get_key("https://a/1"), response_cache.entries_dict)
+
+    def test_lru(self):
+        response_cache = ResponseCache(max_entries=2)
+        response_cache.set("https://a/1", "1")
+        response_cache.set("https://a/2", "2")
+        # Reading an entry makes it the most recently used one
+        self.assertEqual(response_cache.get("https://a/1"), "1")
+        response_cache.set("https://a/3", "3")
+        self.assertIsNone(response_cache.get("https://a/2"))
+        self.assertEqual(response_cache.get("https://a/1"), "1")
+        self.assertEqual(response_cache.get("https://a/3"), "3")
+        self.assertEqual(len(response_cache.entries_dict), 2)
+
+    def test_persistence(self):
+        db_pathname = os.path.join(self.temp_path, "geofinder_cache.db")
+        response_cache = ResponseCache(ttl_seconds=60, db_pathname=db_pathname)
+        response_cache.set("https://a/1", "1")
+        self.clock.now += 30
+        response_cache.set("https://a/2", "2")
+        response_cache.close()
+
+        # A new session reads responses from SQLite tier
+        response_cache = ResponseCache(ttl_seconds=60, db_pathname=db_pathname)
+        self.assertEqual(response_cache.get("https://a/1"), "1")
+        response_cache.close()
+
+        # Expired responses are removed when the file is opened
+        self.clock.now += 45
+        response_cache = ResponseCache(ttl_seconds=60, db_pathname=db_pathname)
+        self.assertEqual(response_cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0], 1)
+        self.assertIsNone(response_cache.get("https://a/1"))
+        self.assertEqual(response_cache.get("https://a/2"), "2")
+        response_cache.close()
+
+    def test_clear(self):
+        db_pathname = os.path.join(self.temp_path, "geofinder_cache.db")
+        response_cache = ResponseCache(db_pathname=db_pathname)
+        response_cache.set("https://a/1", "1")
+        response_cache.clear()
+        self.assertIsNone(response_cache.get("https://a/1"))
+        self.assertEqual(response_cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0], 0)
+        response_cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
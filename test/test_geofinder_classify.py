@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the search query classifier (geofinder3.geofinder.GeoFinder.classify):
+one pass classification must detect the same query type and values as the chain
+of individual detection functions
+*******************************************************************************
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from geofinder3.geofinder import GeoFinder
+except ImportError:
+    # GeoFinder requires GDAL python bindings (osgeo)
+    GeoFinder = None
+
+
+TEXTS_LIST = [
+    # Place names
+    "Barcelona", "Sant Cugat del Vallès", "Coll de Nargó", "Pic de l'Estany", "", "   ",
+    # Rectangles
+    "420000 4580000 440000 4590000", "EPSG:25831 420000 4580000 440000 4590000",
+    "420000 4580000 440000 4590000 EPSG:25831", "2,1 41,3 2,2 41,4", "0 4580000 440000 4590000",
+    # Points
+    "420000 4580000", "EPSG:4326 2.1 41.3", "2.1 41.3 EPSG:4326", "420000,5 4580000,5", "-1.5 +41.3",
+    "420000 0", "1 2 3",
+    # Roads
+    "C32 km 10", "C-32, 10", "AP7 123", "N-II km 5", "c32 10",
+    # Addresses
+    "Barcelona, Aribau 86", "Aribau 86, Barcelona", "Barcelona, C/ Aribau nº 86",
+    "Barcelona, Avd. Diagonal nº 86", "Barcelona, C/ Aragó 1-5", "Aribau 86",
+    # Cadastral references
+    "9872023 VH5797S 0001 WX", "13 077 A 018 00039 0000 FP", "13077A018000390000FP", "13077A01800039",
+    "13077A0180003", "ABCDEFGHIJKLMN", "13077-018000390000",
+    # Others
+    "Escola 2", "Plaça 1 de Maig", "EPSG:25831", "1-5", "km 10",
+    ]
+
+
+def classify_by_chain(text):
+    """ Query type detection of the individual functions chain (detection order of find_data) """
+    west, north, east, south, epsg = GeoFinder.get_rectangle_coordinate(text)
+    if west and north and east and south:
+        return "rectangle", (west, north, east, south, epsg)
+    x, y, epsg = GeoFinder.get_point_coordinate(text)
+    if x and y:
+        return "point", (x, y, epsg)
+    road, km = GeoFinder.get_road(text)
+    if road and km:
+        return "road", (road, km)
+    municipality, address_type, name, number = GeoFinder.get_address(text)
+    if municipality and name and number:
+        return "address", (municipality, address_type, name, number)
+    cadastral_ref = GeoFinder.get_cadastral_ref(text)
+    if cadastral_ref:
+        return "cadastral_ref", (cadastral_ref,)
+    return "placename", (text,)
+
+
+@unittest.skipIf(GeoFinder is None, "GDAL python bindings (osgeo) are not available")
+class GeoFinderClassifyTest(unittest.TestCase):
+    """ GeoFinder.classify versus individual detection functions """
+
+    def test_equivalence(self):
+        for text in TEXTS_LIST:
+            with self.subTest(text=text):
+                query_type, values = GeoFinder.classify(text)
+                expected_type, expected_values = classify_by_chain(text)
+                self.assertEqual((query_type, tuple(values)), (expected_type, tuple(expected_values)))
+
+    def test_query_types(self):
+        for text, expected_type in [
+                ("Barcelona", "placename"),
+                ("420000 4580000 440000 4590000 EPSG:25831", "rectangle"),
+                ("EPSG:4326 2.1 41.3", "point"),
+                ("C-32, 10", "road"),
+                ("Barcelona, Aribau 86", "address"),
+                ("13077A018000390000FP", "cadastral_ref"),
+                ]:
+            with self.subTest(text=text):
+                self.assertEqual(GeoFinder.classify(text)[0], expected_type)
+
+    def test_values(self):
+        self.assertEqual(GeoFinder.classify("EPSG:4326 2,1 41,3"), ("point", (2.1, 41.3, 4326)))
+        self.assertEqual(GeoFinder.classify("C32 km 10"), ("road", ("C-32", "10")))
+        self.assertEqual(GeoFinder.classify("Girona"), ("placename", ("Girona",)))
+
+
+if __name__ == "__main__":
+    unittest.main()
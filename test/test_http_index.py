@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the datacloud folder listings index (resources3.http): file
+queries solved on the index must return the same results as the regular
+expression applied to the HTML listing
+*******************************************************************************
+"""
+
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resources3 import http
+
+
+FOLDER_URL = "https://datacloud.icgc.cat/datacloud/test/json_unzip"
+FILES_LIST = [
+    "model-elevacions-terreny-v1r0-catalunya-25cm-2020-2021.json",
+    "model-elevacions-terreny-v1r0-catalunya-25cm-2022-2023.json",
+    "model-elevacions-terreny-v1r0-catalunya-1m-2020-2021.json",
+    "model-elevacions-terreny-edificis-v1r0-catalunya-25cm-2020-2021.json",
+    "linia-costa-v1r0-2019-2020.gpkg",
+    "linia-costa-v1r0-2020-2021-est.gpkg",
+    "ndvi-v1r0-202001.tif",
+    "ndvi-v1r0-202002.tif",
+    "ortofoto-rgb-25cm-catalunya-2020.gpkg",
+    "ortofoto-irc-50cm-catalunya-2021.gpkg",
+    "orto-costa-rgb-25cm-2020-2021.gpkg",
+    "orto-costa-irc-25cm-2020-2021.gpkg",
+    "lidar-territorial-v1r0-ortofoto-rgb-15cm-2021-2023.gpkg",
+    "llegiu-me.txt",
+    ]
+PATTERNS_LIST = [
+    r"(model-elevacions-terreny-\w+-(\w+)-25cm-(\d+-\d+)\.json)",
+    r"(model-elevacions-terreny-\w+-(\w+)-1m-(\d+-\d+)\.json)",
+    r"(model-elevacions-terreny-edificis-\w+-\w+-25cm-(\d+-\d+)\.json)",
+    r"(linia-costa-v\d+r\d+-(\d+-\d+(?:-\w+)*)\.gpkg)",
+    r"(ndvi-v\d+r\d+-(\d+)\.tif)",
+    r"(ortofoto-(\w+)-(\d+)(c*m)-(\w+)-(\d{4})\.gpkg)",
+    r"(orto-costa-(?:rgb|irc)-\d+cm-(\d+-\d+(?:-\w+)*)\.gpkg)",
+    r"(lidar-territorial-v\d+r\d+-ortofoto-(rgb|irc)-\d+cm-([\d-]+)\.gpkg)",
+    r"(llegiu-me\.txt)",
+    r"(inexistent-\d+\.tif)",
+    ]
+
+
+def get_listing_html(files_list):
+    """ Returns a HTML folder listing like the datacloud server ones """
+    path = FOLDER_URL.split("datacloud.icgc.cat")[1]
+    return "<html><body>\n%s\n</body></html>" % "\n".join(
+        ['<A HREF="%s/%s">%s</A><br>' % (path, filename, filename) for filename in files_list])
+
+
+class HttpIndexTest(unittest.TestCase):
+    """ Index queries versus regular expressions over the HTML listing """
+
+    def setUp(self):
+        self.html = get_listing_html(FILES_LIST)
+        self.requested_list = []
+        self.get_http_dir = http.get_http_dir
+        http.get_http_dir = self.fake_get_http_dir
+        http.url_response_dict.clear()
+        http.http_index_dict.clear()
+
+    def tearDown(self):
+        http.get_http_dir = self.get_http_dir
+        http.url_response_dict.clear()
+        http.http_index_dict.clear()
+
+    def fake_get_http_dir(self, url, *args, **kwargs):
+        self.requested_list.append(url)
+        return self.html if url == FOLDER_URL else ""
+
+    def get_expected_files(self, file_regex_pattern, replace_list=[]):
+        """ Previous implementation: regular expression over the HTML listing """
+        html = self.html
+        for search, replace in replace_list:
+            html = html.replace(search, replace)
+        return re.findall(r'<A HREF="[\/\w-]*%s">' % file_regex_pattern, html)
+
+    def test_patterns(self):
+        for file_regex_pattern in PATTERNS_LIST:
+            with self.subTest(pattern=file_regex_pattern):
+                self.assertEqual(http.get_http_files(FOLDER_URL, file_regex_pattern),
+                    self.get_expected_files(file_regex_pattern))
+
+    def test_replace_list(self):
+        replace_list = [("-v1r0-", "-"), ("catalunya", "cat")]
+        file_regex_pattern = r"(model-elevacions-terreny-(\w+)-25cm-(\d+-\d+)\.json)"
+        self.assertEqual(http.get_http_files(FOLDER_URL, file_regex_pattern, replace_list),
+            self.get_expected_files(file_regex_pattern, replace_list))
+
+    def test_listing_downloaded_once(self):
+        for file_regex_pattern in PATTERNS_LIST:
+            http.get_http_files(FOLDER_URL, file_regex_pattern)
+        self.assertEqual(self.requested_list, [FOLDER_URL])
+
+    def test_memoised_query_copy(self):
+        file_regex_pattern = PATTERNS_LIST[0]
+        files_list = http.get_http_files(FOLDER_URL, file_regex_pattern)
+        files_list.append("modified")
+        self.assertEqual(http.get_http_files(FOLDER_URL, file_regex_pattern), self.get_expected_files(file_regex_pattern))
+
+    def test_gsd_index(self):
+        index_dict = http.get_http_index(FOLDER_URL)
+        self.assertEqual(index_dict["files"], FILES_LIST)
+        self.assertEqual(sorted(index_dict["gsd"]), ["15cm", "1m", "25cm", "50cm"])
+        self.assertEqual(len(index_dict["gsd"]["25cm"]), 6)
+
+    def test_empty_listing_not_indexed(self):
+        self.assertEqual(http.get_http_files(FOLDER_URL + "/error", PATTERNS_LIST[0]), [])
+        self.assertNotIn(FOLDER_URL + "/error", http.http_index_dict)
+        http.get_http_files(FOLDER_URL + "/error", PATTERNS_LIST[0])
+        self.assertEqual(self.requested_list, [FOLDER_URL + "/error"] * 2)
+
+    def test_parse_http_filename(self):
+        self.assertEqual(http.parse_http_filename("ortofoto-rgb-25cm-catalunya-2020.gpkg"),
+            ("ortofoto-rgb", "25cm", "2020", "gpkg"))
+        self.assertEqual(http.parse_http_filename("linia-costa-v1r0-2019-2020.gpkg"),
+            ("linia-costa-v1r0", None, "2019-2020", "gpkg"))
+        self.assertEqual(http.parse_http_filename("llegiu-me.txt"), ("llegiu-me", None, None, "txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the parallel products discovery (resources3.http.get_products):
+each different folder is downloaded only once and products are the same as
+querying the folders one by one
+*******************************************************************************
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resources3 import http
+
+
+URLBASE = "https://datacloud.icgc.cat/datacloud"
+FOLDERS_DICT = {
+    URLBASE + "/met/json_unzip": [
+        "model-elevacions-terreny-v1r0-catalunya-25cm-2020-2021.json",
+        "model-elevacions-terreny-v1r0-catalunya-25cm-2022-2023.json",
+        "model-elevacions-terreny-v1r0-catalunya-1m-2020-2021.json",
+        ],
+    URLBASE + "/ms/json_unzip": [
+        "model-superficies-v1r0-catalunya-25cm-2021-2022.json",
+        ],
+    URLBASE + "/mo/json_unzip": [
+        ],
+    }
+URLBASE_LIST = [
+    ("met25cm-", URLBASE + "/met/json_unzip", r"(model-elevacions-terreny-\w+-(\w+)-25cm-(\d+-\d+)\.json)"),
+    ("met1m-", URLBASE + "/met/json_unzip", r"(model-elevacions-terreny-\w+-(\w+)-1m-(\d+-\d+)\.json)"),
+    ("ms25cm-", URLBASE + "/ms/json_unzip", r"(model-superficies-\w+-(\w+)-25cm-(\d+-\d+)\.json)"),
+    ("mo25cm-", URLBASE + "/mo/json_unzip", r"(model-orientacions-\w+-\w+-25cm-(\d+-\d+)\.json)"),
+    ]
+
+
+class HttpProductsTest(unittest.TestCase):
+    """ Parallel folders download of get_products """
+
+    def setUp(self):
+        self.requested_list = []
+        self.threads_set = set()
+        self.lock = threading.Lock()
+        self.get_http_dir = http.get_http_dir
+        http.get_http_dir = self.fake_get_http_dir
+        http.url_response_dict.clear()
+        http.http_index_dict.clear()
+
+    def tearDown(self):
+        http.get_http_dir = self.get_http_dir
+        http.url_response_dict.clear()
+        http.http_index_dict.clear()
+
+    def fake_get_http_dir(self, url, *args, **kwargs):
+        with self.lock:
+            self.requested_list.append(url)
+            self.threads_set.add(threading.get_ident())
+        time.sleep(0.05)
+        path = url.split("datacloud.icgc.cat")[1]
+        return "\n".join(['<A HREF="%s/%s">%s</A><br>' % (path, filename, filename) for filename in FOLDERS_DICT.get(url, [])])
+
+    def test_products(self):
+        self.assertEqual(http.get_products(URLBASE_LIST), [
+            ("met25cm-2020-2021\ncatalunya", URLBASE + "/met/json_unzip/model-elevacions-terreny-v1r0-catalunya-25cm-2020-2021.json"),
+            ("met25cm-2022-2023\ncatalunya", URLBASE + "/met/json_unzip/model-elevacions-terreny-v1r0-catalunya-25cm-2022-2023.json"),
+            ("met1m-2020-2021\ncatalunya", URLBASE + "/met/json_unzip/model-elevacions-terreny-v1r0-catalunya-1m-2020-2021.json"),
+            ("ms25cm-2021-2022\ncatalunya", URLBASE + "/ms/json_unzip/model-superficies-v1r0-catalunya-25cm-2021-2022.json"),
+            ])
+
+    def test_products_equivalence(self):
+        products_list = http.get_products(URLBASE_LIST)
+        # Folders queried one by one (without the parallel prefetch)
+        http.url_response_dict.clear()
+        http.http_index_dict.clear()
+        get_http_dirs = http.get_http_dirs
+        http.get_http_dirs = lambda url_list, max_workers=8: {}
+        try:
+            self.assertEqual(http.get_products(URLBASE_LIST), products_list)
+        finally:
+            http.get_http_dirs = get_http_dirs
+
+    def test_folders_downloaded_once(self):
+        http.get_products(URLBASE_LIST)
+        # The empty folder has not data to cache and it is requested again by its files query
+        self.assertEqual(sorted(self.requested_list), sorted(list(FOLDERS_DICT.keys()) + [URLBASE + "/mo/json_unzip"]))
+        self.assertGreater(len(self.threads_set), 1)
+
+    def test_get_http_dirs(self):
+        url_list = [URLBASE + "/met/json_unzip", URLBASE + "/ms/json_unzip", URLBASE + "/met/json_unzip"]
+        response_dict = http.get_http_dirs(url_list)
+        self.assertEqual(sorted(response_dict), sorted(set(url_list)))
+        self.assertEqual(sorted(self.requested_list), sorted(set(url_list)))
+        # Cached folders are not downloaded again
+        http.get_http_dirs(url_list)
+        self.assertEqual(len(self.requested_list), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
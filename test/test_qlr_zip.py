@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+*******************************************************************************
+Unit tests of the QLR datasources inside zip files
+(qlib3.base.pluginbase.LayersBase.get_qlr_zip_datasource): relative paths point
+to the zip files and absolute paths and URLs are not modified
+*******************************************************************************
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from qlib3.base.pluginbase import LayersBase
+except ImportError:
+    # LayersBase requires QGIS python bindings
+    LayersBase = None
+
+
+ZIP_PATHNAME = os.path.join(os.path.abspath(os.sep), "data", "downloads", "layers.zip")
+
+
+@unittest.skipIf(LayersBase is None, "QGIS python bindings are not available")
+class QlrZipDatasourceTest(unittest.TestCase):
+    """ Relative datasources of a QLR inside a zip """
+
+    def test_relative_paths(self):
+        for datasource, qlr_member, expected in [
+                ("./layer.shp", "layers.qlr", "/vsizip/%s/layer.shp" % ZIP_PATHNAME),
+                ("layer.tif", "layers.qlr", "/vsizip/%s/layer.tif" % ZIP_PATHNAME),
+                ("./data/layer.shp", "qlr/layers.qlr", "/vsizip/%s/qlr/data/layer.shp" % ZIP_PATHNAME),
+                ("../data/layer.shp", "qlr/layers.qlr", "/vsizip/%s/data/layer.shp" % ZIP_PATHNAME),
+                (".\\data\\layer.shp", "qlr\\layers.qlr", "/vsizip/%s/qlr/data/layer.shp" % ZIP_PATHNAME),
+                ]:
+            with self.subTest(datasource=datasource, qlr_member=qlr_member):
+                self.assertEqual(LayersBase.get_qlr_zip_datasource(datasource, ZIP_PATHNAME, qlr_member), expected)
+
+    def test_provider_options(self):
+        self.assertEqual(LayersBase.get_qlr_zip_datasource("./layers.gpkg|layername=roads", ZIP_PATHNAME, "layers.qlr"),
+            "/vsizip/%s/layers.gpkg|layername=roads" % ZIP_PATHNAME)
+
+    def test_outside_zip(self):
+        # Paths that go out of the zip are resolved from the zip folder
+        zip_folder = os.path.dirname(ZIP_PATHNAME)
+        self.assertEqual(LayersBase.get_qlr_zip_datasource("../layer.shp", ZIP_PATHNAME, "layers.qlr"),
+            os.path.normpath(os.path.join(zip_folder, "..", "layer.shp")))
+        self.assertEqual(LayersBase.get_qlr_zip_datasource("../../layer.shp|layername=layer", ZIP_PATHNAME, "qlr/layers.qlr"),
+            os.path.normpath(os.path.join(zip_folder, "..", "layer.shp")) + "|layername=layer")
+
+    def test_not_relative(self):
+        for datasource in ["", "|layername=layer", "/data/layer.shp", "C:/data/layer.shp", "c:\\data\\layer.shp",
+                "https://datacloud.icgc.cat/layer.gpkg", "/vsicurl/https://datacloud.icgc.cat/layer.tif"]:
+            with self.subTest(datasource=datasource):
+                self.assertIsNone(LayersBase.get_qlr_zip_datasource(datasource, ZIP_PATHNAME, "layers.qlr"))
+
+
+if __name__ == "__main__":
+    unittest.main()